@@ -0,0 +1,147 @@
+#Part 4 (Extension)
+# Alert Queue & Pagination
+# alert_queue.py (Top-K and cursor-paginated access to scored alerts without sorting or shipping the full set).
+#==============================================================================================
+
+import numpy as np
+import pandas as pd
+
+
+def top_k(df, k, score_col='final_risk_score'):
+    """
+    The k highest-scoring rows, highest first. Uses np.partition (O(n)) and
+    only sorts the k winners, instead of a full sort_values over every row.
+    """
+    scores = np.nan_to_num(df[score_col].to_numpy(dtype=np.float64), nan=-np.inf)
+    k = min(k, len(scores))
+    if k == 0:
+        return df.iloc[:0]
+    kth = np.partition(-scores, k - 1)[k - 1]
+    # Everything strictly above the k-th score, then ties at that score by row
+    # position, so the result matches a stable descending sort exactly
+    above = np.flatnonzero(-scores < kth)
+    tied = np.flatnonzero(-scores == kth)[:k - len(above)]
+    winners = np.concatenate([above, tied])
+    winners = winners[np.lexsort((winners, -scores[winners]))]
+    return df.iloc[winners]
+
+
+class AlertQueue:
+    """
+    Part 4 Extension: Read-only alert queue over a scored DataFrame.
+
+    A descending score index is built once. Pages are then slices of it, and
+    filtered pages use per-filter position lists built on first use and cached.
+    The cursor is an opaque integer: pass back the `next_cursor` of the
+    previous page to continue where it stopped.
+    """
+
+    def __init__(self, df, score_col='final_risk_score', priority_col='priority_level',
+                 merchant_col=None, time_col=None):
+        self.df = df
+        self.score_col = score_col
+        self.priority_col = priority_col
+        self.merchant_col = merchant_col
+        self.time_col = time_col
+
+        scores = np.nan_to_num(df[score_col].to_numpy(dtype=np.float64), nan=-np.inf)
+        # Rows by descending score; stable so equal scores keep their input order
+        self._order = np.argsort(-scores, kind='stable')
+        self._times = (pd.to_datetime(df[time_col]).to_numpy()[self._order]
+                       if time_col is not None else None)
+        self._filter_cache = {}
+
+    def __len__(self):
+        return len(self._order)
+
+    def top_k(self, k):
+        """The k highest-scoring alerts (an O(k) slice of the index)."""
+        return self.df.iloc[self._order[:k]]
+
+    def _positions(self, priority=None, merchant=None):
+        """Positions in the score index matching the categorical filters (cached per filter)."""
+        key = (priority, merchant)
+        if key not in self._filter_cache:
+            mask = np.ones(len(self._order), dtype=bool)
+            if priority is not None:
+                mask &= np.asarray(self.df[self.priority_col], dtype=object)[self._order] == priority
+            if merchant is not None:
+                mask &= np.asarray(self.df[self.merchant_col], dtype=object)[self._order] == merchant
+            self._filter_cache[key] = np.flatnonzero(mask)
+        return self._filter_cache[key]
+
+    def count(self, priority=None, merchant=None):
+        """Number of alerts matching the categorical filters."""
+        if priority is None and merchant is None:
+            return len(self._order)
+        return len(self._positions(priority, merchant))
+
+    def page(self, limit=50, cursor=None, priority=None, merchant=None, start=None, end=None):
+        """
+        One page of alerts, highest score first, optionally filtered by
+        priority, merchant and an event-time range [start, end).
+        Returns (page_df, next_cursor); next_cursor is None on the last page.
+        """
+        if (start is not None or end is not None) and self._times is None:
+            raise ValueError("AlertQueue was built without time_col; cannot filter by date.")
+        cursor = cursor or 0
+
+        if priority is None and merchant is None:
+            candidates = None
+            i = cursor
+            total = len(self._order)
+        else:
+            candidates = self._positions(priority, merchant)
+            i = int(np.searchsorted(candidates, cursor))
+            total = len(candidates)
+
+        lo = np.datetime64(pd.Timestamp(start)) if start is not None else None
+        hi = np.datetime64(pd.Timestamp(end)) if end is not None else None
+
+        picked, found = [], 0
+        block = max(limit, 256)
+        while i < total and found < limit:
+            positions = (np.arange(i, min(i + block, total)) if candidates is None
+                         else candidates[i:i + block])
+            if lo is not None:
+                positions = positions[self._times[positions] >= lo]
+            if hi is not None:
+                positions = positions[self._times[positions] < hi]
+            picked.append(positions)
+            found += len(positions)
+            i += block
+
+        positions = np.concatenate(picked)[:limit] if picked else np.array([], dtype=np.int64)
+        # Exhausted if we stopped short of `limit` or there is nothing after the last hit
+        if len(positions) < limit:
+            next_cursor = None
+        else:
+            next_cursor = int(positions[-1]) + 1
+            remaining = (next_cursor < len(self._order)) if candidates is None \
+                else (np.searchsorted(candidates, next_cursor) < total)
+            next_cursor = next_cursor if remaining else None
+        return self.df.iloc[self._order[positions]], next_cursor
+
+
+# --- Local Testing ---
+if __name__ == "__main__":
+    rng = np.random.default_rng(7)
+    n = 1_000_000
+    alerts = pd.DataFrame({
+        'final_risk_score': rng.uniform(0, 100, n).round(2),
+        'priority_level': rng.choice(['🔴 CRITICAL', '🟠 HIGH', '🟡 MEDIUM', '🟢 LOW'], n),
+        'merchant': rng.choice(['Retail', 'Travel', 'Gaming'], n),
+        'event_time': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 30 * 86400, n), unit='s'),
+    })
+
+    print("Part 4 Extension - Top 5 alerts (partition, no full sort):")
+    print(top_k(alerts, 5))
+
+    queue = AlertQueue(alerts, merchant_col='merchant', time_col='event_time')
+    page, cursor = queue.page(limit=3, priority='🔴 CRITICAL', merchant='Travel')
+    print(f"\nFirst page of CRITICAL/Travel alerts ({queue.count('🔴 CRITICAL', 'Travel')} total):")
+    print(page)
+    page, cursor = queue.page(limit=3, cursor=cursor, priority='🔴 CRITICAL', merchant='Travel',
+                              start='2024-01-10', end='2024-01-11')
+    print("\nNext page, restricted to 10-Jan:")
+    print(page)
@@ -6,45 +6,59 @@
 
 import pandas as pd
 
+from schema import PRIORITY_DTYPE
+from scoring_kernels import ensemble_risk_components, priority_codes, risk_score_components
+
 class AlertPrioritizer:
     """
     Part 4: Alert Scoring and Prioritization System
     Combines different detection signals into a unified 'Risk Score' (0-100).
+
+    By default the signals are the Isolation Forest score and the Z-Score
+    flag. With weights ({column: weight}, e.g. from detectors.DetectorEnsemble)
+    the score is instead a weighted blend of 0-1 alert-strength columns,
+    one per detector, plus the same high-value boost.
     """
 
-    def calculate_priority(self, df):
+    def __init__(self, weights=None):
+        self.weights = dict(weights) if weights else None
+
+    def calculate_priority(self, df, sort=True):
         """
         Weights statistical and ML signals to create a final priority rank.
+        Pass sort=False when the caller reads alerts through alert_queue
+        (top_k / AlertQueue) and doesn't need the whole frame sorted.
         """
-        # 1. Start with the ML Anomaly Score (normalized to 0-50)
-        # Isolation Forest 'decision_function' gives lower scores to outliers
-        # We invert and scale it so 50 is high risk.
-        df['ml_component'] = (1 - df['anomaly_score']) * 25
-
-        # 2. Add the Statistical component (Z-Score)
-        # If it's a statistical outlier, we add 30 points to the risk
-        df['stat_component'] = df['stat_anomaly'] * 30
-
-        # 3. Add 'High Value' multiplier
-        # Any transaction over a certain threshold gets a 20 point boost
-        df['value_boost'] = df['amount'].apply(lambda x: 20 if x > 5000 else 0)
-
-        # 4. Final Risk Score Calculation (Max 100)
-        df['final_risk_score'] = df['ml_component'] + df['stat_component'] + df['value_boost']
-        
-        # Ensure the score does not exceed 100
-        df['final_risk_score'] = df['final_risk_score'].clip(0, 100)
+        if self.weights is not None:
+            df['ensemble_component'], df['value_boost'], df['final_risk_score'] = ensemble_risk_components(
+                df[list(self.weights)].to_numpy(dtype=float),
+                list(self.weights.values()),
+                df['amount'].to_numpy(),
+            )
+            return self._label(df, sort)
 
-        # 5. Prioritization Labeling
-        def assign_priority(score):
-            if score > 80: return "🔴 CRITICAL"
-            if score > 50: return "🟠 HIGH"
-            if score > 25: return "🟡 MEDIUM"
-            return "🟢 LOW"
+        # The arithmetic runs on plain NumPy arrays (see scoring_kernels.py):
+        # 1. ML Anomaly Score: Isolation Forest 'decision_function' gives lower
+        #    scores to outliers, so we invert and scale it (50 is high risk).
+        # 2. Statistical component: a Z-Score outlier adds 30 points.
+        # 3. 'High Value' multiplier: over 5000 gets a 20 point boost.
+        # 4. Final Risk Score, clipped to 0-100.
+        (df['ml_component'], df['stat_component'],
+         df['value_boost'], df['final_risk_score']) = risk_score_components(
+            df['anomaly_score'].to_numpy(),
+            df['stat_anomaly'].to_numpy(),
+            df['amount'].to_numpy(),
+        )
+        return self._label(df, sort)
 
-        df['priority_level'] = df['final_risk_score'].apply(assign_priority)
+    def _label(self, df, sort):
+        # 5. Prioritization Labeling (a 4-value categorical: one byte per row)
+        df['priority_level'] = pd.Categorical.from_codes(
+            priority_codes(df['final_risk_score'].to_numpy()), dtype=PRIORITY_DTYPE)
         
         # Sort the dataframe so the analyst sees CRITICAL alerts first
+        if not sort:
+            return df
         return df.sort_values(by='final_risk_score', ascending=False)
 
 # --- Local Testing ---
@@ -61,4 +75,10 @@ if __name__ == "__main__":
     prioritized_df = ranker.calculate_priority(df_alerts)
     
     print("Part 4 - Prioritized Alert Queue:")
-    print(prioritized_df[['amount', 'final_risk_score', 'priority_level']])
\ No newline at end of file
+    print(prioritized_df[['amount', 'final_risk_score', 'priority_level']])
+    # Weighted ensemble: per-detector alert strengths (0-1) instead of the fixed blend
+    df_alerts['risk_hbos'] = [0.0, 0.9, 0.1, 0.6]
+    df_alerts['risk_forest'] = [0.0, 1.0, 0.0, 0.3]
+    ensemble = AlertPrioritizer(weights={'risk_hbos': 1.0, 'risk_forest': 2.0}).calculate_priority(df_alerts)
+    print("\nPart 4 - Ensemble Alert Queue:")
+    print(ensemble[['amount', 'ensemble_component', 'final_risk_score', 'priority_level']])
@@ -5,6 +5,7 @@
 
 import streamlit as st
 import pandas as pd
+import os
 import plotly.express as px
 from datetime import datetime
 
@@ -12,56 +13,168 @@ from datetime import datetime
 from data_pipeline import run_data_pipeline # Part 1
 from stats_model import StatisticalDetector # Part 2
 from ml_model import MLPatternDetector     # Part 3
+from feature_transformer import DEMO_SPEC, FeatureTransformer
 from alert_scoring import AlertPrioritizer  # Part 4
 from case_manager import CaseManager        # Part 5
-from tracker import ModelTuner              # Part 6
+from tracker import FeedbackMetrics, ModelTuner  # Part 6
+from calibration import SLIDER_CONTAMINATIONS, ThresholdCalibrator, case_labels
+from data_cache import frame_hash
+import instrumentation
+from alert_queue import AlertQueue
+from rollups import downsample_for_plot
 
 # --- Page Configuration ---
 st.set_page_config(page_title="Zetheta Anomaly Surveillance", layout="wide")
 
+# Detection parameters. Everything below that depends on them is cached, keyed
+# on the input data's hash plus these values, so widget clicks only redraw views.
+# CONTAMINATION is the sensitivity slider's starting value.
+CONTAMINATION = 0.10
+Z_THRESHOLD = 2.5
+
+# Number of top-risk transactions offered in the review picker
+REVIEW_PAGE_SIZE = 50
+
+# Number of top-risk transactions offered for bulk resolution
+BULK_PAGE_SIZE = 500
+
+# Analyst decisions offered for a case
+DECISIONS = ["Confirmed Fraud", "False Positive", "Legitimate Spike"]
+
+# Points drawn in the risk map; beyond this the scatter is downsampled
+MAX_PLOT_POINTS = 2000
+
+# Running TP/FP counts over every resolved case, kept across restarts
+FEEDBACK_FILE = 'feedback_metrics.json'
+
+# Stage timings for the sidebar's pipeline health panel. Cached stages only
+# record when they actually run (first load or new parameters).
+instrumentation.enable()
+
+
+
+@st.cache_resource(show_spinner=False)
+def get_feedback_metrics():
+    """One FeedbackMetrics for all sessions; rebuilt from the case history if never saved (or saved by an older version)."""
+    if os.path.exists(FEEDBACK_FILE):
+        try:
+            return FeedbackMetrics.load(FEEDBACK_FILE)
+        except ValueError:
+            pass
+    return FeedbackMetrics.from_case_history(CaseManager())
+
+
 # --- Initialize Modules ---
 # These act as our backend engines
 if 'manager' not in st.session_state:
     st.session_state.manager = CaseManager()
-    st.session_state.tuner = ModelTuner()
+    # Every resolution in this session updates the shared running counts
+    st.session_state.manager.add_listener(get_feedback_metrics().record)
+    st.session_state.tuner = ModelTuner(get_feedback_metrics())
+    # Transaction index -> case opened for it in this session
+    st.session_state.review_cases = {}
+
+
+@st.cache_data(show_spinner=False)
+def load_transactions():
+    """
+    Part 1 pipeline output plus its content hash (the cache key for everything
+    downstream); computed once per server rather than once per rerun.
+    """
+    with instrumentation.stage('pipeline') as s:
+        df = run_data_pipeline()
+        s.rows = len(df)
+    return df, frame_hash(df, ['transaction_id', 'amount', 'velocity_score', 'geo_score'])
+
+
+@st.cache_resource(show_spinner=False)
+def get_ml_engine(data_hash, _raw_df):
+    """
+    Fitted Isolation Forest, shared across reruns and sessions for the same data.
+    Other contamination rates only move its cut-off (see with_contamination).
+    """
+    with instrumentation.stage('isolation_forest_fit', rows=len(_raw_df)):
+        return MLPatternDetector(contamination=CONTAMINATION,
+                                 transformer=FeatureTransformer.from_spec(DEMO_SPEC)).fit(_raw_df)
+
+
+@st.cache_data(show_spinner="Scoring transactions...")
+def score_transactions(data_hash, _raw_df, contamination, z_threshold):
+    """Parts 2-4 for one dataset/parameter combination."""
+    df = _raw_df.copy()
+
+    # --- Part 2: Statistical Check ---
+    stat_engine = StatisticalDetector(z_threshold=z_threshold)
+    with instrumentation.stage('z_score', rows=len(df)):
+        df['stat_anomaly'] = stat_engine.calculate_z_score(df['amount'])
+
+    # --- Part 3: ML Pattern Recognition ---
+    # Score with the cached, already fitted Isolation Forest (no refit per contamination)
+    ml_engine = get_ml_engine(data_hash, _raw_df).with_contamination(contamination)
+    with instrumentation.stage('isolation_forest_score', rows=len(df)):
+        df['ml_anomaly'], df['anomaly_score'] = ml_engine.score(df)
+
+    # --- Part 4: Scoring & Prioritization ---
+    # Merge all signals into a 0-100 Risk Score (ranking is done by the AlertQueue)
+    with instrumentation.stage('prioritization', rows=len(df)):
+        return AlertPrioritizer().calculate_priority(df, sort=False)
+
+
+@st.cache_resource(show_spinner=False)
+def get_calibrator(data_hash, _raw_df):
+    """
+    Sorted anomaly scores of the fitted model (analyst labels are attached on
+    each rerun), so moving the slider is a binary search, not a re-detection.
+    """
+    scores = pd.DataFrame({'transaction_id': _raw_df['transaction_id'],
+                           'anomaly_score': get_ml_engine(data_hash, _raw_df).score(_raw_df)[1]})
+    return ThresholdCalibrator(scores['anomaly_score']), scores
+
+
+@st.cache_resource(show_spinner=False)
+def get_alert_queue(data_hash, contamination, z_threshold, _final_df):
+    """Score index over the alerts, built once per scored dataset."""
+    with instrumentation.stage('alert_index', rows=len(_final_df)):
+        return AlertQueue(_final_df)
+
 
 # --- Part 7: Dashboard UI Layout ---
 st.title("🔍 Zetheta Anomaly Detection & Surveillance Platform")
 st.markdown("---")
 
-# --- Part 1 & 2: Pipeline & Statistical Check ---
-# We pull the simulated data stream and run the Z-Score engine
-raw_df = run_data_pipeline()
-stat_engine = StatisticalDetector(z_threshold=2.5)
-raw_df['stat_anomaly'] = stat_engine.calculate_z_score(raw_df['amount'])
-
-# --- Part 3: ML Pattern Recognition ---
-# We use the Isolation Forest to find hidden patterns
-ml_engine = MLPatternDetector(contamination=0.10)
-processed_df = ml_engine.train_and_predict(raw_df)
-processed_df = ml_engine.get_anomaly_scores(processed_df)
+# --- Part 6: Sensitivity (read first, it drives the scoring below) ---
+with st.sidebar:
+    st.header("⚙️ Model Control Center")
+    contamination = st.select_slider("Adjust ML Sensitivity (Contamination)", SLIDER_CONTAMINATIONS.tolist(),
+                                     value=CONTAMINATION, key='contamination')
 
-# --- Part 4: Scoring & Prioritization ---
-# Merge all signals into a 0-100 Risk Score
-ranker = AlertPrioritizer()
-final_df = ranker.calculate_priority(processed_df)
+# --- Parts 1-4: Pipeline, Statistical Check, ML and Scoring (all cached) ---
+raw_df, data_hash = load_transactions()
+final_df = score_transactions(data_hash, raw_df, contamination, Z_THRESHOLD)
+alert_queue = get_alert_queue(data_hash, contamination, Z_THRESHOLD, final_df)
 
 # --- Dashboard Visualizations (The 'Surveillance' aspect) ---
 col1, col2 = st.columns([2, 1])
 
 with col1:
     st.subheader("📊 Live Transaction Risk Map")
-    # Color-coding transactions by their ML anomaly status
-    fig = px.scatter(final_df, x="amount", y="final_risk_score", 
+    # Color-coding transactions by their ML anomaly status. Every CRITICAL/HIGH
+    # alert is drawn; the remaining points are a fixed-size sample.
+    plot_df = downsample_for_plot(final_df, MAX_PLOT_POINTS,
+                                  keep=final_df['priority_level'].isin(['🔴 CRITICAL', '🟠 HIGH']))
+    title = "Transaction Value vs. Risk Score"
+    if len(plot_df) < len(final_df):
+        title += f" ({len(plot_df):,} of {len(final_df):,} shown)"
+    fig = px.scatter(plot_df, x="amount", y="final_risk_score", 
                      color="priority_level", size="amount",
                      hover_data=['priority_level'],
-                     title="Transaction Value vs. Risk Score")
-    st.plotly_chart(fig, use_container_width=True)
+                     title=title)
+    st.plotly_chart(fig, width='stretch')
 
 with col2:
     st.subheader("🚨 Priority Alert Queue")
     # Show only the high-risk items requiring immediate human eyes
-    st.dataframe(final_df[['amount', 'priority_level', 'final_risk_score']].head(5))
+    st.dataframe(alert_queue.top_k(5)[['amount', 'priority_level', 'final_risk_score']])
 
 # --- Part 5: Case Management Workflow ---
 st.markdown("---")
@@ -69,29 +182,85 @@ st.subheader("📁 Investigation Workflow")
 case_col1, case_col2 = st.columns(2)
 
 with case_col1:
-    # Allow analyst to select a high-risk case to review
-    target_id = st.selectbox("Select Transaction for Review (ID):", final_df.index)
+    # Allow analyst to select a high-risk case to review (highest risk first)
+    review_page, _ = alert_queue.page(limit=REVIEW_PAGE_SIZE)
+    target_id = st.selectbox("Select Transaction for Review (ID):", review_page.index)
     selected_amt = final_df.loc[target_id, 'amount']
     st.info(f"Reviewing Transaction {target_id} for ${selected_amt}")
 
 with case_col2:
     # Decision buttons for the analyst
-    decision = st.radio("Resolution Action:", ["Confirmed Fraud", "False Positive", "Legitimate Spike"])
+    decision = st.radio("Resolution Action:", DECISIONS)
     notes = st.text_input("Analyst Audit Notes:")
     if st.button("Submit Final Decision"):
-        # Log the decision to the case manager
-        msg = st.session_state.manager.update_case_status(str(target_id), decision, notes)
-        st.success("Case Resolved and Logged for Audit.")
+        # Open a case for the reviewed alert (once), then log the decision to the case manager
+        case_id = st.session_state.review_cases.get(target_id)
+        if case_id is None:
+            case_id = st.session_state.manager.open_case(
+                final_df.loc[target_id], model_version=get_ml_engine(data_hash, raw_df).trained_at)
+            st.session_state.review_cases[target_id] = case_id
+        msg = st.session_state.manager.update_case_status(case_id, decision, notes)
+        get_feedback_metrics().save(FEEDBACK_FILE)
+        st.success(f"{case_id} Resolved and Logged for Audit.")
+
+# Bulk resolution: widgets inside a form don't rerun the script, so any number
+# of alerts is picked first and then opened and resolved in one rerun
+with st.expander("🗂️ Bulk Resolution"):
+    bulk_page, _ = alert_queue.page(limit=BULK_PAGE_SIZE)
+    with st.form('bulk_resolution', clear_on_submit=True):
+        bulk_all = st.checkbox(f"All {len(bulk_page):,} highest-risk alerts")
+        bulk_ids = st.multiselect("Or select transactions (ID):", bulk_page.index)
+        bulk_decision = st.radio("Resolution Action:", DECISIONS, key='bulk_decision', horizontal=True)
+        bulk_notes = st.text_input("Analyst Audit Notes:", key='bulk_notes')
+        bulk_submitted = st.form_submit_button("Resolve Selected")
+    if bulk_submitted:
+        targets = list(bulk_page.index) if bulk_all else bulk_ids
+        if not targets:
+            st.warning("Select at least one transaction.")
+        else:
+            # One transaction opens the missing cases (compact, deduplicated), one more resolves them all
+            review_cases = st.session_state.review_cases
+            unopened = [idx for idx in targets if idx not in review_cases]
+            if unopened:
+                opened = st.session_state.manager.bulk_create_cases(
+                    final_df.loc[unopened], model_version=get_ml_engine(data_hash, raw_df).trained_at,
+                    priorities=None)
+                review_cases.update(zip(unopened, opened['case_id']))
+            result = st.session_state.manager.resolve_cases([review_cases[idx] for idx in targets],
+                                                            bulk_decision, bulk_notes)
+            get_feedback_metrics().save(FEEDBACK_FILE)
+            st.success(f"{int(result['resolved'].sum()):,} cases resolved as {bulk_decision} and logged for audit.")
 
 # --- Part 6: Model Tuning & Feedback Loop ---
 with st.sidebar:
-    st.header("⚙️ Model Control Center")
-    # Calculate performance based on recent decisions
-    fpr = st.session_state.tuner.track_accuracy(pd.Series([decision]))
-    new_param, advice = st.session_state.tuner.suggest_tuning(0.10, fpr)
-    
-    st.metric("False Positive Rate", f"{fpr}%")
-    st.warning(f"Advice: {advice}")
+    # Calculate performance over every resolved case (running counts, no history rescan)
+    fpr = st.session_state.tuner.track_feedback()
+    new_param, advice = st.session_state.tuner.suggest_tuning(contamination, fpr)
     
-    # Allow manual override of ML sensitivity
-    st.slider("Adjust ML Sensitivity (Contamination)", 0.01, 0.20, new_param)
\ No newline at end of file
+    st.metric("False Positive Rate", f"{fpr:.1f}%",
+              help=f"Over {st.session_state.tuner.performance_metrics['total_alerts']:,} resolved cases")
+    st.warning(f"Advice: {advice} (suggested contamination: {new_param:.2f})")
+
+    # What the slider's setting means, from the precomputed calibration curve
+    calibrator, base_scores = get_calibrator(data_hash, raw_df)
+    calibrator = calibrator.with_labels(*case_labels(st.session_state.manager, base_scores))
+    curve = calibrator.curve()
+    at_setting = curve.loc[contamination]
+    c1, c2 = st.columns(2)
+    c1.metric("ML Alerts at this setting", f"{int(at_setting['alerts']):,}")
+    if calibrator.n_labelled:
+        c2.metric("Precision (resolved cases)", f"{at_setting['precision']:.0%}"
+                  if pd.notna(at_setting['precision']) else "n/a")
+        st.line_chart(curve[['precision', 'recall', 'fpr']])
+    else:
+        c2.metric("Precision (resolved cases)", "n/a")
+        st.caption("Precision, recall and FPR appear once cases are resolved.")
+
+    # Where the time and memory went, per pipeline stage (latest run of each)
+    with st.expander("🩺 Pipeline Health"):
+        health = instrumentation.summary()
+        if health.empty:
+            st.caption("No stages recorded yet.")
+        else:
+            st.dataframe(health[['stage', 'seconds', 'rows_per_s', 'rss_peak_mb', 'runs']],
+                         hide_index=True, width='stretch')
\ No newline at end of file
@@ -2,6 +2,10 @@ import streamlit as st
 import pandas as pd
 import os
 
+from alert_queue import AlertQueue
+from result_sink import ResultSink
+from rollups import RollupStore
+
 # Set page title and icon
 st.set_page_config(page_title="Fraud Surveillance", page_icon="🛡️")
 
@@ -9,35 +13,127 @@ st.title("🛡️ Anomaly Surveillance Dashboard")
 st.write("Real-time Banking Fraud Detection Interface")
 
 # --- CHECK IF DATA EXISTS ---
-DATA_FILE = 'analyzed_data.csv'
+# Partitioned results written by main.py (date= / priority= Parquet files, see result_sink.py)
+RESULTS_DIR = 'results'
+# The only columns the investigation queue reads
+QUEUE_COLUMNS = ['Transaction ID', 'Amount', 'Merchant Group', 'risk_score', 'priority', 'event_time']
+# Rows per page in the investigation queue; only this many are sent to the browser
+PAGE_SIZE = 50
+# Pre-aggregated views written by main.py next to the results
+ROLLUP_DIR = 'rollups'
+# Per-stage timings of the last 'python main.py --metrics' run
+METRICS_LOG = 'pipeline_metrics.jsonl'
+
+
+@st.cache_resource
+def load_alert_queue(root, mtime, start=None, end=None, since=None):
+    """
+    Risk-score index over the High priority results in an event-time range,
+    built once per analysis run and range. Only the High partitions and the
+    queue's columns are read (mtime is the manifest's, so a new run is picked up).
+    """
+    df = ResultSink(root).read(columns=QUEUE_COLUMNS, priority='High', start=start, end=end, since=since)
+    return AlertQueue(df, score_col='risk_score', priority_col='priority',
+                      merchant_col='Merchant Group', time_col='event_time')
+
+
+@st.cache_resource
+def load_rollups(path, mtime):
+    """
+    Dashboard aggregates for the current results. Reads the rollups main.py
+    wrote after this run; results without them are rolled up once here.
+    """
+    marker = os.path.join(ROLLUP_DIR, 'by_merchant.parquet')
+    if os.path.exists(marker) and os.path.getmtime(marker) >= mtime:
+        return RollupStore.load(ROLLUP_DIR)
+    return RollupStore(ROLLUP_DIR).update(ResultSink(path).read())
+
+
+@st.cache_data
+def load_stage_metrics(path, mtime):
+    """Structured stage log written by main.py (one JSON object per stage run)."""
+    metrics = pd.read_json(path, lines=True)
+    metrics['rss_peak_mb'] = (metrics['rss_peak_bytes'] / 2**20).round(1)
+    return metrics
+
 
-if os.path.exists(DATA_FILE):
+# --- PIPELINE HEALTH (sidebar) ---
+with st.sidebar:
+    st.header("🩺 Pipeline Health")
+    if os.path.exists(METRICS_LOG):
+        metrics = load_stage_metrics(METRICS_LOG, os.path.getmtime(METRICS_LOG))
+        st.caption(f"Last instrumented run: {metrics['started_at'].min()}")
+        st.dataframe(metrics[['stage', 'seconds', 'rows_per_s', 'rss_peak_mb']], hide_index=True)
+    else:
+        st.caption("Run 'python main.py --metrics' to record stage timings.")
+
+
+manifest = os.path.join(RESULTS_DIR, '_manifest.json')
+if os.path.exists(manifest):
     # Load the data generated by main.py
-    df = pd.read_csv(DATA_FILE)
+    mtime = os.path.getmtime(manifest)
+    rollups = load_rollups(RESULTS_DIR, mtime)
+    totals = rollups.totals()
     
-    # --- METRICS BAR ---
+    # --- METRICS BAR (from the rollups, not the raw rows) ---
     st.divider()
     m1, m2, m3 = st.columns(3)
-    m1.metric("Total Records", len(df))
-    m2.metric("High Risk Alerts", len(df[df['priority'] == 'High']))
-    m3.metric("Avg Risk Score", round(df['risk_score'].mean(), 2))
+    m1.metric("Total Records", totals['count'])
+    m2.metric("High Risk Alerts", totals['high_alerts'])
+    m3.metric("Avg Risk Score", round(totals['avg_risk'], 2))
     
     # --- INVESTIGATION QUEUE ---
     st.subheader("🚩 High-Priority Investigation Queue")
-    # Filter for High risk only
-    high_priority_df = df[df['priority'] == 'High'].sort_values('risk_score', ascending=False)
+
+    # Filters: High risk only, optionally one merchant and an event-time range.
+    # The time range is pushed down to the sink, so other days are never read.
+    merchants = sorted(str(m) for m in rollups.summary('merchant').index if m != 'nan')
+    f1, f2 = st.columns(2)
+    merchant = f1.selectbox("Merchant Group", ["All"] + merchants)
+    merchant = None if merchant == "All" else merchant
+    start = end = since = None
+    if f2.checkbox("Last 24h only"):
+        since = '24h'
+    else:
+        dates = f2.date_input("Event date range", value=())
+        if len(dates) == 2:
+            start, end = pd.Timestamp(dates[0]), pd.Timestamp(dates[1]) + pd.Timedelta(days=1)
+    queue = load_alert_queue(RESULTS_DIR, mtime, start, end, since)
+
+    # Cursor-based paging: remember the cursor that opened each page we've visited
+    filter_key = (merchant, start, end, since, mtime)
+    if st.session_state.get('queue_filter') != filter_key:
+        st.session_state.queue_filter = filter_key
+        st.session_state.queue_cursors = [None]
+    cursors = st.session_state.queue_cursors
+
+    high_priority_df, next_cursor = queue.page(limit=PAGE_SIZE, cursor=cursors[-1], priority='High',
+                                               merchant=merchant)
     
     if not high_priority_df.empty:
-        st.dataframe(high_priority_df[['Transaction ID', 'Amount', 'Merchant Group', 'risk_score']], use_container_width=True)
+        st.dataframe(high_priority_df[['Transaction ID', 'Amount', 'Merchant Group', 'risk_score']], width='stretch')
+        p1, p2, p3 = st.columns([1, 2, 1])
+        if p1.button("⬅️ Previous", disabled=len(cursors) == 1):
+            cursors.pop()
+            st.rerun()
+        p2.caption(f"Page {len(cursors)} · {queue.count('High', merchant):,} High alerts"
+                   f"{' for ' + merchant if merchant else ''}")
+        if p3.button("Next ➡️", disabled=next_cursor is None):
+            cursors.append(next_cursor)
+            st.rerun()
     else:
         st.success("✅ No High-Risk anomalies detected at this time.")
 
     # --- VISUAL ANALYSIS ---
     st.subheader("📊 Risk Distribution by Merchant")
-    chart_data = df.groupby('Merchant Group')['risk_score'].mean().sort_values(ascending=False)
+    chart_data = rollups.summary('merchant')['avg_risk'].sort_values(ascending=False)
     st.bar_chart(chart_data)
 
+    st.subheader("📈 Risk Score Distribution")
+    risk_hist = rollups.histogram('risk')
+    st.bar_chart(risk_hist.set_index('bin_left')['count'])
+
 else:
     # If the file is missing, show this warning instead of a blank screen
-    st.error(f"❌ '{DATA_FILE}' not found!")
+    st.error(f"❌ No results in '{RESULTS_DIR}/'!")
     st.info("Please run 'python main.py' first to generate the analysis data.")
\ No newline at end of file
@@ -0,0 +1,169 @@
+#Benchmark
+# Detector Benchmark
+# bench_detectors.py (Compares latency, memory and detection quality of every pluggable detector on the real extract).
+#==============================================================================================
+#
+# Usage:
+#   python bench_detectors.py                                 # credit_card_trans.zip
+#   python bench_detectors.py --train-fraction 0.3 --output detectors.json
+#   python bench_detectors.py --weights isolation_forest=3,hbos=1,z_score=0
+#
+# Every detector sees the same model matrix (the Isolation Forest's feature
+# transformer) with Merchant_Enc as the entity. It is fitted on a random
+# --train-fraction of the rows and scored on the rest against the Fraud
+# labels: ROC AUC and average precision rank the raw scores, precision and
+# recall are at the detector's own contamination cut-off. (The extract spans
+# two days, so a split by event time would leave day-of-week unseen in training.)
+# Memory: 'fit_peak_mb' is the Python/NumPy allocation peak while fitting and
+# 'state_mb' the pickled size of the fitted detector.
+
+import argparse
+import json
+import pickle
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import average_precision_score, roc_auc_score
+
+from bench_pipeline import environment
+from detectors import (DetectorEnsemble, HalfSpaceTreesDetector, HBOSDetector, IsolationForestDetector,
+                       RobustZScoreDetector, ZScoreDetector)
+from feature_engineering import add_transaction_features
+from main import encode_merchants, new_detector, prepare_detector, run_pipeline
+from replay import order_by_event_time
+from scoring_kernels import PRIORITY_CUTOFFS
+
+# Bump when detectors or metrics are added/renamed, so reports are only compared like for like
+BENCHMARK_VERSION = 2
+
+# Rows per call for the small-batch latency figure (a scoring_service micro-batch)
+LATENCY_BATCH = 64
+
+
+def make_detectors(forest, contamination=0.1):
+    """
+    Unfitted instances of every detector with the same contamination; the
+    Isolation Forest wraps `forest`, whose transformer built the matrix.
+    """
+    return [
+        ZScoreDetector(contamination),
+        RobustZScoreDetector(contamination),
+        HBOSDetector(contamination),
+        HalfSpaceTreesDetector(contamination),
+        IsolationForestDetector(forest, contamination=contamination),
+    ]
+
+
+def load_split(zip_path, train_fraction, seed=42):
+    """
+    (model, X_train, entities_train, X_test, entities_test, labels_test), each
+    part in event-time order; model is the MLPatternDetector whose transformer built X.
+    """
+    events = order_by_event_time(add_transaction_features(run_pipeline(zip_path)))
+    train = np.random.default_rng(seed).random(len(events)) < train_fraction
+    # The transformer (and vocabulary) are fitted on the training window only
+    model = prepare_detector(events[train].copy(), new_detector())
+    events = encode_merchants(events, model.vocabulary)
+    X = model.transform(events).astype(np.float64)
+    entities = events['Merchant_Enc'].to_numpy()
+    return model, X[train], entities[train], X[~train], entities[~train], events['Fraud'].to_numpy()[~train]
+
+
+def quality(labels, scores, flags):
+    flagged = flags.astype(bool)
+    hits = int((flagged & (labels == 1)).sum())
+    return {
+        'roc_auc': round(float(roc_auc_score(labels, scores)), 4),
+        'average_precision': round(float(average_precision_score(labels, scores)), 4),
+        'alert_rate': round(float(flagged.mean()), 4),
+        'precision': round(hits / max(int(flagged.sum()), 1), 4),
+        'recall': round(hits / max(int(labels.sum()), 1), 4),
+    }
+
+
+def benchmark_detector(detector, X_train, e_train, X_test, e_test, labels):
+    start = time.perf_counter()
+    detector.fit(X_train, e_train)
+    fit_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    flags, scores = detector.predict(X_test, e_test)
+    score_s = time.perf_counter() - start
+
+    # Small-batch latency: the same rows again, LATENCY_BATCH at a time
+    timings = []
+    for lo in range(0, min(len(X_test), 200 * LATENCY_BATCH), LATENCY_BATCH):
+        start = time.perf_counter()
+        detector.score(X_test[lo:lo + LATENCY_BATCH], e_test[lo:lo + LATENCY_BATCH])
+        timings.append(time.perf_counter() - start)
+
+    # Memory in a separate pass, since tracing slows allocation-heavy code
+    tracemalloc.start()
+    detector.fit(X_train, e_train)
+    fit_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        'fit_s': round(fit_s, 4),
+        'score_s': round(score_s, 4),
+        'score_rows_per_s': round(len(X_test) / max(score_s, 1e-9)),
+        f'latency_{LATENCY_BATCH}_rows_p50_ms': round(float(np.percentile(timings, 50)) * 1000, 3),
+        f'latency_{LATENCY_BATCH}_rows_p99_ms': round(float(np.percentile(timings, 99)) * 1000, 3),
+        'fit_peak_mb': round(fit_peak / 2**20, 2),
+        'state_mb': round(len(pickle.dumps(detector)) / 2**20, 3),
+        **quality(labels, scores, flags),
+    }
+
+
+def run_benchmark(zip_path, train_fraction=0.5, contamination=0.1, seed=42, weights=None):
+    forest, X_train, e_train, X_test, e_test, labels = load_split(zip_path, train_fraction, seed)
+    detectors = make_detectors(forest, contamination)
+    results = {detector.name: benchmark_detector(detector, X_train, e_train, X_test, e_test, labels)
+               for detector in detectors}
+
+    # Weighted (default: equal-weight) ensemble through the AlertPrioritizer (detectors
+    # are already fitted); a transaction alerts when it reaches MEDIUM priority or above
+    ensemble = DetectorEnsemble(detectors, weights)
+    start = time.perf_counter()
+    risks = ensemble.risk_frame(X_test, e_test)
+    alerts = ensemble.prioritizer().calculate_priority(risks.assign(amount=0.0), sort=False)
+    score_s = time.perf_counter() - start
+    results['ensemble'] = {
+        'weights': ensemble.weights,
+        'score_s': round(score_s, 4),
+        'score_rows_per_s': round(len(X_test) / max(score_s, 1e-9)),
+        **quality(labels, alerts['final_risk_score'].to_numpy(),
+                  alerts['final_risk_score'].to_numpy() > PRIORITY_CUTOFFS[-1]),
+    }
+    return {'train_rows': len(X_train), 'test_rows': len(X_test), 'features': X_train.shape[1],
+            'fraud_rate': round(float(labels.mean()), 4), 'detectors': results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latency, memory and quality of every pluggable detector")
+    parser.add_argument('--zip', default='credit_card_trans.zip')
+    parser.add_argument('--train-fraction', type=float, default=0.5, help="share of rows the detectors are fitted on")
+    parser.add_argument('--contamination', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--weights', help="ensemble weights as name=weight,... (unlisted detectors weigh 1)")
+    parser.add_argument('--output', help="also write the JSON report to this file")
+    args = parser.parse_args()
+    weights = {name: float(weight) for name, weight in
+               (pair.split('=') for pair in args.weights.split(','))} if args.weights else None
+
+    report = {
+        'benchmark_version': BENCHMARK_VERSION,
+        'created_at': pd.Timestamp.now(tz='UTC').isoformat(timespec='seconds'),
+        'train_fraction': args.train_fraction,
+        'contamination': args.contamination,
+        'seed': args.seed,
+        'environment': environment(),
+        **run_benchmark(args.zip, args.train_fraction, args.contamination, args.seed, weights),
+    }
+
+    print(pd.DataFrame(report['detectors']).T.drop(columns='weights').to_string())
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
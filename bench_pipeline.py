@@ -0,0 +1,203 @@
+#Benchmark
+# End-to-End Pipeline Benchmark
+# bench_pipeline.py (Times and memory-profiles every pipeline stage on synthetic data and emits a JSON report).
+#==============================================================================================
+#
+# Usage:
+#   python bench_pipeline.py                                  # 10^5 and 10^6 rows
+#   python bench_pipeline.py 100000 10000000 --output bench.json
+#   python bench_pipeline.py --baseline bench.json            # flag stages slower than the baseline
+#
+# Memory: 'rss_peak_mb' is the sampled peak resident size of the process during the
+# stage. --tracemalloc adds 'py_peak_mb', the peak of Python/NumPy allocations, but
+# slows object-heavy stages (CSV output, string cleaning) several-fold, so the
+# timings of such a run should not be compared with normal runs.
+# A 10^7-row run needs ~8 GB of RAM; for 10^8 rows use main.py --stream.
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+import sklearn
+
+import instrumentation
+from alert_scoring import AlertPrioritizer
+from case_manager import CaseManager
+from data_cache import write_parquet
+from feature_engineering import add_transaction_features
+from main import (clean_transactions, encode_merchants, new_detector, prepare_detector, read_transactions,
+                  run_scoring_and_audit)
+from stats_model import StatisticalDetector
+from synthetic_data import write_synthetic_zip
+
+# Bump when stages are added/renamed, so reports are only compared like for like
+BENCHMARK_VERSION = 3
+
+DEFAULT_SIZES = [10**5, 10**6]
+
+
+@contextmanager
+def measure(stages, name):
+    """Records wall time, RSS peak (and Python allocation peak when tracing) of the block into stages[name]."""
+    with instrumentation.Stage(name) as s:
+        yield s
+    stages[name] = {'seconds': round(s.record['seconds'], 4),
+                    'rss_peak_mb': instrumentation.megabytes(s.record['rss_peak_bytes'])}
+    if s.record['alloc_peak_bytes'] is not None:
+        stages[name]['py_peak_mb'] = instrumentation.megabytes(s.record['alloc_peak_bytes'])
+
+
+def run_benchmark(n_rows, seed=42, workdir=None, trace_allocations=False):
+    """Generates n_rows synthetic transactions and pushes them through every stage once."""
+    stages = {}
+    own_workdir = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix='fraud_bench_')
+    zip_path = os.path.join(workdir, f'synthetic_{n_rows}.zip')
+    if trace_allocations:
+        tracemalloc.start()
+    try:
+        with measure(stages, 'generate'):
+            write_synthetic_zip(zip_path, n_rows, seed=seed)
+
+        # Part 1
+        with measure(stages, 'ingestion'):
+            df = read_transactions(zip_path)
+        with measure(stages, 'cleaning'):
+            df = clean_transactions(df)
+        with measure(stages, 'features'):
+            df = add_transaction_features(df)
+
+        # Part 2
+        with measure(stages, 'z_score'):
+            df['stat_anomaly'] = StatisticalDetector(z_threshold=2.2).calculate_z_score(df['Amount_Num'])
+
+        # Part 3
+        with measure(stages, 'isolation_forest_fit'):
+            detector = prepare_detector(df, new_detector())
+            features = detector.transform(encode_merchants(df, detector.vocabulary))
+            detector.fit(features, strata=df['Merchant_Enc'])
+        with measure(stages, 'isolation_forest_score'):
+            df['ml_anomaly'], df['anomaly_score'] = detector.score(features)
+
+        # Part 4: main.py's risk bands, then the 0-100 AlertPrioritizer scale used for cases
+        with measure(stages, 'prioritization'):
+            df = run_scoring_and_audit(df, verbose=False)
+            alerts = AlertPrioritizer().calculate_priority(pd.DataFrame({
+                'transaction_id': df['Transaction ID'],
+                'amount': df['Amount_Num'].fillna(0),
+                'anomaly_score': df['anomaly_score'],
+                'stat_anomaly': df['stat_anomaly'],
+            }))
+
+        # Part 5
+        manager = CaseManager(db_path=os.path.join(workdir, 'cases.db'))
+        with measure(stages, 'case_creation'):
+            cases = manager.bulk_create_cases(alerts)
+        manager.conn.close()
+
+        # Part 7 outputs
+        csv_path = os.path.join(workdir, 'analyzed_data.csv')
+        parquet_path = os.path.join(workdir, 'analyzed_data.parquet')
+        with measure(stages, 'output_csv'):
+            df.to_csv(csv_path, index=False)
+        with measure(stages, 'output_parquet'):
+            write_parquet(df, parquet_path)
+
+        return {
+            'n_rows': n_rows,
+            'stages': stages,
+            'total_seconds': round(sum(s['seconds'] for name, s in stages.items() if name != 'generate'), 4),
+            'counts': {
+                'fraud': int(df['Fraud'].sum()),
+                'high_priority': int((df['priority'] == 'High').sum()),
+                'cases': int(cases['created'].sum()),
+            },
+            'bytes': {
+                'zip': os.path.getsize(zip_path),
+                'csv': os.path.getsize(csv_path),
+                'parquet': os.path.getsize(parquet_path),
+            },
+        }
+    finally:
+        tracemalloc.stop()
+        if own_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def environment():
+    """Versions and machine details stored with every report."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'scikit_learn': sklearn.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def compare(report, baseline, tolerance):
+    """Stages that got more than `tolerance` slower than in the baseline report (same row counts only)."""
+    previous = {r['n_rows']: r['stages'] for r in baseline.get('results', [])}
+    regressions = []
+    for result in report['results']:
+        for stage, now in result['stages'].items():
+            before = previous.get(result['n_rows'], {}).get(stage)
+            if before and before['seconds'] > 0 and now['seconds'] > before['seconds'] * (1 + tolerance):
+                regressions.append({'n_rows': result['n_rows'], 'stage': stage,
+                                    'baseline_s': before['seconds'], 'current_s': now['seconds'],
+                                    'ratio': round(now['seconds'] / before['seconds'], 2)})
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-stage timing and memory benchmark of the fraud pipeline")
+    parser.add_argument('sizes', type=int, nargs='*', help=f"row counts (default: {DEFAULT_SIZES})")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="also write the JSON report to this file")
+    parser.add_argument('--baseline', help="earlier JSON report to check for regressions")
+    parser.add_argument('--tracemalloc', action='store_true', help="also record Python allocation peaks (slower)")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed slowdown vs baseline (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    report = {
+        'benchmark_version': BENCHMARK_VERSION,
+        'created_at': pd.Timestamp.now(tz='UTC').isoformat(timespec='seconds'),
+        'seed': args.seed,
+        'tracemalloc': args.tracemalloc,
+        'environment': environment(),
+        'results': [run_benchmark(n_rows, seed=args.seed, trace_allocations=args.tracemalloc)
+                    for n_rows in args.sizes or DEFAULT_SIZES],
+    }
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if (baseline.get('benchmark_version'), baseline.get('tracemalloc')) != (BENCHMARK_VERSION, args.tracemalloc):
+            print("Baseline was made with a different benchmark version or --tracemalloc setting; "
+                  "skipping comparison.", file=sys.stderr)
+        else:
+            report['regressions'] = compare(report, baseline, args.tolerance)
+            exit_code = 1 if report['regressions'] else 0
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    sys.exit(exit_code)
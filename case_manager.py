@@ -1,56 +1,411 @@
-#Part 5	
-# Investigation Workflow	
+#Part 5
+# Investigation Workflow
 # case_manager.py (Handles Case IDs, status updates, and analyst audit notes).
 #==============================================================================================
 
-import pandas as pd
+import io
+import sqlite3
+import threading
 from datetime import datetime
 
+import numpy as np
+import pandas as pd
+
+CASE_ID_OFFSET = 1000  # First case is CASE-1001
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cases (
+    seq           INTEGER PRIMARY KEY AUTOINCREMENT,
+    case_id       TEXT NOT NULL UNIQUE,
+    timestamp     TEXT NOT NULL,
+    priority      TEXT,
+    status        TEXT NOT NULL,
+    analyst_notes TEXT,
+    resolution    TEXT,
+    alert_data    TEXT,
+    model_version TEXT,
+    transaction_id TEXT,
+    risk_score    REAL,
+    anomaly_score REAL
+);
+CREATE INDEX IF NOT EXISTS idx_cases_status ON cases(status);
+CREATE INDEX IF NOT EXISTS idx_cases_resolution ON cases(resolution);
+CREATE INDEX IF NOT EXISTS idx_cases_priority ON cases(priority, status);
+
+CREATE TABLE IF NOT EXISTS case_audit (
+    event_id   INTEGER PRIMARY KEY AUTOINCREMENT,
+    case_id    TEXT NOT NULL,
+    timestamp  TEXT NOT NULL,
+    action     TEXT NOT NULL,
+    status     TEXT,
+    resolution TEXT,
+    notes      TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_audit_case ON case_audit(case_id);
+
+-- The audit trail is append-only
+CREATE TRIGGER IF NOT EXISTS case_audit_no_update BEFORE UPDATE ON case_audit
+BEGIN SELECT RAISE(ABORT, 'case_audit is append-only'); END;
+CREATE TRIGGER IF NOT EXISTS case_audit_no_delete BEFORE DELETE ON case_audit
+BEGIN SELECT RAISE(ABORT, 'case_audit is append-only'); END;
+"""
+
+# Columns added after the first release, created on open by CaseManager (name -> SQL type)
+MIGRATED_COLUMNS = {'model_version': 'TEXT', 'transaction_id': 'TEXT', 'risk_score': 'REAL', 'anomaly_score': 'REAL'}
+
+# Alert fields copied into the migrated reference columns of existing cases (column -> JSON paths, first non-null)
+BACKFILLED_COLUMNS = {
+    'transaction_id': ['$.transaction_id', '$."Transaction ID"'],
+    'risk_score': ['$.final_risk_score'],
+    'anomaly_score': ['$.anomaly_score'],
+}
+
+# At most one Open case per transaction (needs the migrated transaction_id column)
+OPEN_CASE_INDEX = ("CREATE UNIQUE INDEX IF NOT EXISTS idx_cases_open_txn ON cases(transaction_id) "
+                   "WHERE status = 'Open' AND transaction_id IS NOT NULL")
+
+CASE_COLUMNS = ['case_id', 'timestamp', 'priority', 'status', 'analyst_notes', 'resolution', 'model_version',
+                'transaction_id', 'risk_score', 'anomaly_score']
+
+# Alert tiers create_cases_from_alerts and bulk_create_cases escalate to the case queue
+ESCALATED_PRIORITIES = ['🔴 CRITICAL', '🟠 HIGH']
+
+# Columns a case's transaction reference is read from, first match wins:
+# the AlertPrioritizer frames, then main.py's real-data frames
+TRANSACTION_ID_COLUMNS = ['transaction_id', 'Transaction ID']
+
+# Bound parameters per IN (...) lookup (SQLite's historical default limit is 999)
+_MAX_PARAMS = 900
+
+
 class CaseManager:
     """
     Part 5: Investigation Workflow and Case Management
     Handles the transition of an anomaly from a 'Detected Alert' to a 'Resolved Case'.
+
+    Cases live in SQLite (WAL mode, so analysts can read while others write):
+    case_id lookups use the primary key index, status/priority queries use
+    secondary indexes, and every change is recorded in an append-only audit table.
+
+    Listeners (add_listener) are called with one event dict per resolution,
+    after it is committed, so feedback metrics can be kept up to date as
+    analysts work instead of rescanning the case history.
+
+    Cases reference their alert's transaction_id, and a transaction has at
+    most one Open case: alerting on it again returns the open case instead
+    of a duplicate. bulk_create_cases and resolve_cases handle thousands of
+    alerts or decisions in a single transaction.
     """
 
-    def __init__(self):
-        # We simulate a simple database for cases using a dictionary or DataFrame
-        self.case_database = pd.DataFrame(columns=[
-            'case_id', 'timestamp', 'priority', 'status', 'analyst_notes', 'resolution'
-        ])
+    def __init__(self, db_path='cases.db'):
+        self.db_path = db_path
+        # Autocommit mode; writes open explicit transactions below
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        self.conn.executescript(SCHEMA)
+        # Databases created before cases recorded the model / transaction that raised them
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(cases)")}
+        added = [name for name in MIGRATED_COLUMNS if name not in columns]
+        for name in added:
+            self.conn.execute(f"ALTER TABLE cases ADD COLUMN {name} {MIGRATED_COLUMNS[name]}")
+        self._backfill_references([name for name in added if name in BACKFILLED_COLUMNS])
+        self.conn.execute(OPEN_CASE_INDEX)
+        # One connection may be shared by several dashboard threads
+        self._lock = threading.Lock()
+        self._listeners = []
+
+    def _backfill_references(self, columns):
+        """
+        Copies the given reference columns out of the stored alert data of
+        existing cases (once, when the columns are added). If a transaction has
+        several Open cases, only the oldest gets the reference, so the
+        one-Open-case-per-transaction index can be built.
+        """
+        if not columns:
+            return
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            for name in columns:
+                values = [f"json_extract(alert_data, '{path}')" for path in BACKFILLED_COLUMNS[name]]
+                value = f"COALESCE({', '.join(values)})" if len(values) > 1 else values[0]
+                if name != 'transaction_id':
+                    self.conn.execute(f"UPDATE cases SET {name} = {value} WHERE alert_data IS NOT NULL")
+                    continue
+                self.conn.execute(
+                    f"UPDATE cases SET transaction_id = CAST({value} AS TEXT) "
+                    f"WHERE alert_data IS NOT NULL AND (status != 'Open' OR seq IN ("
+                    f"SELECT MIN(seq) FROM cases WHERE status = 'Open' GROUP BY {value}))")
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
 
-    def create_cases_from_alerts(self, prioritized_df):
+    def add_listener(self, callback):
+        """
+        Calls callback(event) after every committed resolution. The event has
+        case_id, timestamp, priority, model_version, resolution and
+        previous_resolution (set when an already resolved case is re-resolved).
+        """
+        self._listeners.append(callback)
+
+    @property
+    def case_database(self):
+        """All cases as a DataFrame (core columns plus the original alert fields)."""
+        cases = pd.read_sql_query(
+            f"SELECT {', '.join(CASE_COLUMNS)}, alert_data FROM cases ORDER BY seq", self.conn)
+        alert_data = cases.pop('alert_data').fillna('{}')
+        if cases.empty:
+            return cases
+        # One C-level JSON Lines parse instead of a json.loads per case
+        alerts = pd.read_json(io.StringIO('\n'.join(alert_data)), lines=True)
+        # Cases opened before the reference columns existed only have them in their alert data
+        for col in BACKFILLED_COLUMNS:
+            if col in alerts:
+                cases[col] = cases[col].fillna(alerts[col])
+        alerts = alerts.drop(columns=[c for c in CASE_COLUMNS if c in alerts.columns])
+        return pd.concat([cases, alerts], axis=1)
+
+    def create_cases_from_alerts(self, prioritized_df, model_version=None, id_col=None):
         """
         Converts high-risk alerts into actionable cases for investigators.
+        All new cases are inserted in one transaction and get monotonically
+        increasing IDs, even across calls and restarts.
+        model_version (e.g. the detector's trained_at) is stored with each case.
+        id_col names the transaction ID column (default: the first of
+        TRANSACTION_ID_COLUMNS present). Every alert column is kept with its
+        case; see bulk_create_cases for large batches.
         """
         # We only escalate CRITICAL and HIGH priority alerts to the case queue
-        new_cases = prioritized_df[prioritized_df['priority_level'].isin(['🔴 CRITICAL', '🟠 HIGH'])].copy()
-        
-        # Assign unique Case IDs and initial 'Open' status
-        new_cases['case_id'] = [f"CASE-{i}" for i in range(1001, 1001 + len(new_cases))]
-        new_cases['status'] = 'Open'
-        new_cases['analyst_notes'] = 'Pending Review'
-        
-        # Merge new cases into our permanent case database
-        self.case_database = pd.concat([self.case_database, new_cases], ignore_index=True)
+        new_cases = prioritized_df[prioritized_df['priority_level'].isin(ESCALATED_PRIORITIES)]
+        if not new_cases.empty:
+            self._insert_cases(new_cases, model_version, id_col=id_col)
         return self.case_database
 
+    def bulk_create_cases(self, prioritized_df, model_version=None, priorities=ESCALATED_PRIORITIES, id_col=None):
+        """
+        Opens cases for a large batch of alerts (the CRITICAL/HIGH ones, or
+        every row with priorities=None) as compact records: the transaction_id,
+        priority, final_risk_score and model_version only, not the alert's
+        feature columns. Alerts whose transaction already has an Open case
+        (or repeats an earlier row) get that case instead of a new one.
+        id_col is as in create_cases_from_alerts.
+        Returns one row per escalated alert, in input order: case_id,
+        transaction_id, priority, risk_score and created (False for reused cases).
+        """
+        alerts = prioritized_df if priorities is None else \
+            prioritized_df[prioritized_df['priority_level'].isin(priorities)]
+        if alerts.empty:
+            return pd.DataFrame(columns=['case_id', 'transaction_id', 'priority', 'risk_score', 'created'])
+        case_ids, created = self._insert_cases(alerts, model_version, keep_alert=False, id_col=id_col)
+        return pd.DataFrame({
+            'case_id': case_ids,
+            'transaction_id': _transaction_ids(alerts, id_col),
+            'priority': alerts['priority_level'].to_numpy(),
+            'risk_score': _numbers(alerts, 'final_risk_score'),
+            'created': created,
+        })
+
+    def open_case(self, alert, model_version=None, id_col=None):
+        """
+        Opens a case for one alert (a row of the prioritized frame) whatever its
+        priority; returns its case_id (the existing one if the alert's
+        transaction already has an Open case).
+        """
+        return self._insert_cases(alert.to_frame().T, model_version, id_col=id_col)[0][0]
+
+    def _open_cases(self, transaction_ids):
+        """transaction_id -> case_id of the Open cases among transaction_ids (index lookups, in chunks)."""
+        transaction_ids = list(transaction_ids)
+        found = {}
+        for lo in range(0, len(transaction_ids), _MAX_PARAMS):
+            chunk = transaction_ids[lo:lo + _MAX_PARAMS]
+            found.update(self.conn.execute(
+                f"SELECT transaction_id, case_id FROM cases WHERE status = 'Open' "
+                f"AND transaction_id IN ({', '.join('?' * len(chunk))})", chunk).fetchall())
+        return found
+
+    def _insert_cases(self, new_cases, model_version, keep_alert=True, id_col=None):
+        """
+        Inserts the alerts as Open cases in one transaction, skipping those whose
+        transaction already has an Open case. Returns (case_ids, created), one
+        entry per alert; with keep_alert, every alert column is stored as JSON too.
+        """
+        now = datetime.now().isoformat(timespec='seconds')
+        transaction_ids = pd.Series(_transaction_ids(new_cases, id_col), dtype=object)
+        risk_scores = _numbers(new_cases, 'final_risk_score')
+        anomaly_scores = _numbers(new_cases, 'anomaly_score')
+
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                existing = self._open_cases(transaction_ids.dropna().unique())
+                # New: no Open case yet and not a repeat of an earlier alert in this batch
+                fresh = (~transaction_ids.isin(list(existing)) & ~(transaction_ids.notna() & transaction_ids.duplicated())
+                         ).to_numpy()
+
+                row = self.conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'cases'").fetchone()
+                next_seq = (row[0] if row else 0) + 1
+                seqs = range(next_seq, next_seq + int(fresh.sum()))
+                new_ids = [f"CASE-{CASE_ID_OFFSET + s}" for s in seqs]
+
+                inserted = new_cases[fresh]
+                alert_json = (inserted.to_json(orient='records', lines=True, force_ascii=False,
+                                               date_format='iso').splitlines()
+                              if keep_alert and len(inserted) else [None] * len(inserted))
+                # Assign unique Case IDs and initial 'Open' status
+                self.conn.executemany(
+                    "INSERT INTO cases (seq, case_id, timestamp, priority, status, analyst_notes, alert_data, "
+                    "model_version, transaction_id, risk_score, anomaly_score) "
+                    "VALUES (?, ?, ?, ?, 'Open', 'Pending Review', ?, ?, ?, ?, ?)",
+                    zip(seqs, new_ids, [now] * len(new_ids), inserted['priority_level'], alert_json,
+                        [model_version] * len(new_ids), transaction_ids[fresh], risk_scores[fresh],
+                        anomaly_scores[fresh]))
+                self.conn.executemany(
+                    "INSERT INTO case_audit (case_id, timestamp, action, status) VALUES (?, ?, 'created', 'Open')",
+                    [(case_id, now) for case_id in new_ids])
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+        # Repeated alerts point at the open case, whether it is older or was just opened
+        existing.update((txn, case_id) for txn, case_id in zip(transaction_ids[fresh], new_ids) if txn is not None)
+        case_ids = np.empty(len(new_cases), dtype=object)
+        case_ids[fresh] = new_ids
+        case_ids[~fresh] = transaction_ids[~fresh].map(existing).to_numpy()
+        return case_ids.tolist(), fresh
+
+    def resolve_cases(self, case_ids, decisions, notes=''):
+        """
+        Part 5 Workflow, in bulk: resolves many cases in one transaction
+        (one UPDATE and one audit insert per case, all committed together).
+        decisions and notes are one value for every case or one per case;
+        a case listed twice takes its last decision. Listeners get one event
+        per resolved case after the commit.
+        Returns case_id, resolution and resolved (False if the case ID was not found).
+        """
+        batch = pd.DataFrame({'case_id': list(case_ids)})
+        batch['resolution'] = decisions if isinstance(decisions, str) else list(decisions)
+        batch['notes'] = notes if notes is None or isinstance(notes, str) else list(notes)
+        batch = batch.drop_duplicates('case_id', keep='last').reset_index(drop=True)
+
+        now = datetime.now().isoformat(timespec='seconds')
+        before = {}
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Locate the cases (indexed) and their state before this decision
+                ids = batch['case_id'].tolist()
+                for lo in range(0, len(ids), _MAX_PARAMS):
+                    chunk = ids[lo:lo + _MAX_PARAMS]
+                    for case_id, *state in self.conn.execute(
+                            f"SELECT case_id, priority, model_version, resolution FROM cases "
+                            f"WHERE case_id IN ({', '.join('?' * len(chunk))})", chunk):
+                        before[case_id] = state
+                batch['resolved'] = batch['case_id'].isin(before)
+                found = batch[batch['resolved']]
+                self.conn.executemany(
+                    "UPDATE cases SET status = 'Closed', resolution = ?, analyst_notes = ? WHERE case_id = ?",
+                    zip(found['resolution'], found['notes'], found['case_id']))
+                self.conn.executemany(
+                    "INSERT INTO case_audit (case_id, timestamp, action, status, resolution, notes) "
+                    "VALUES (?, ?, 'resolved', 'Closed', ?, ?)",
+                    zip(found['case_id'], [now] * len(found), found['resolution'], found['notes']))
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+        for case_id, resolution in zip(found['case_id'], found['resolution']):
+            priority, model_version, previous = before[case_id]
+            event = {'case_id': case_id, 'timestamp': now, 'priority': priority, 'model_version': model_version,
+                     'resolution': resolution, 'previous_resolution': previous}
+            for callback in self._listeners:
+                callback(event)
+        return batch[['case_id', 'resolution', 'resolved']]
+
     def update_case_status(self, case_id, decision, notes):
         """
         Part 5 Workflow: Allows an analyst to resolve a case.
         Decisions: 'Confirmed Fraud', 'False Positive', 'Inquiry Sent'
         """
-        # Locate the specific case in our database
-        if case_id in self.case_database['case_id'].values:
-            idx = self.case_database[self.case_database['case_id'] == case_id].index[0]
-            
-            # Update the status and add audit notes
-            self.case_database.at[idx, 'status'] = 'Closed'
-            self.case_database.at[idx, 'resolution'] = decision
-            self.case_database.at[idx, 'analyst_notes'] = notes
-            
+        if self.resolve_cases([case_id], decision, notes)['resolved'].iloc[0]:
             return f"Success: {case_id} has been resolved as {decision}."
         return "Error: Case ID not found."
 
+    def get_case(self, case_id):
+        """Returns one case as a dict, or None."""
+        cur = self.conn.execute(f"SELECT {', '.join(CASE_COLUMNS)} FROM cases WHERE case_id = ?", (case_id,))
+        row = cur.fetchone()
+        return dict(zip(CASE_COLUMNS, row)) if row else None
+
+    def list_cases(self, status=None, priority=None, limit=100):
+        """Cases filtered by status and/or priority (index lookups), newest first."""
+        clauses, params = [], []
+        if status is not None:
+            clauses.append("status = ?")
+            params.append(status)
+        if priority is not None:
+            clauses.append("priority = ?")
+            params.append(priority)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return pd.read_sql_query(
+            f"SELECT {', '.join(CASE_COLUMNS)} FROM cases {where} ORDER BY seq DESC LIMIT ?",
+            self.conn, params=params + [limit])
+
+    def resolved_cases(self, resolutions=None):
+        """
+        transaction_id, anomaly_score and resolution of the closed cases (all, or
+        those with one of the given resolutions), oldest first. Reads only these
+        columns through the resolution index, so it stays cheap to call on every
+        dashboard rerun, unlike case_database.
+        """
+        if resolutions is None:
+            where, params = "resolution IS NOT NULL", []
+        else:
+            resolutions = list(resolutions)
+            where, params = f"resolution IN ({', '.join('?' * len(resolutions))})", resolutions
+        return pd.read_sql_query(
+            f"SELECT case_id, transaction_id, anomaly_score, resolution FROM cases WHERE {where} ORDER BY seq",
+            self.conn, params=params)
+
+    def resolution_events(self):
+        """Every resolution in commit order, shaped like the listener events (for rebuilding metrics)."""
+        return pd.read_sql_query(
+            "SELECT a.case_id, a.timestamp, c.priority, c.model_version, a.resolution "
+            "FROM case_audit a JOIN cases c ON c.case_id = a.case_id "
+            "WHERE a.action = 'resolved' ORDER BY a.event_id", self.conn)
+
+    def audit_trail(self, case_id=None):
+        """The append-only history of case events (optionally for one case)."""
+        if case_id is None:
+            return pd.read_sql_query("SELECT * FROM case_audit ORDER BY event_id", self.conn)
+        return pd.read_sql_query("SELECT * FROM case_audit WHERE case_id = ? ORDER BY event_id",
+                                 self.conn, params=[case_id])
+
+
+def _transaction_ids(alerts, id_col=None):
+    """
+    The alerts' transaction IDs as text, from id_col or else the first of
+    TRANSACTION_ID_COLUMNS present (None where missing, or for every row without one).
+    """
+    if id_col is None:
+        id_col = next((col for col in TRANSACTION_ID_COLUMNS if col in alerts), None)
+    if id_col is None or id_col not in alerts:
+        return np.full(len(alerts), None, dtype=object)
+    ids = alerts[id_col]
+    return np.where(ids.notna(), ids.astype(str), None).astype(object)
+
+
+def _numbers(alerts, col):
+    """An alert column (e.g. final_risk_score) as floats (None where missing, or for every row without it)."""
+    if col not in alerts:
+        return np.full(len(alerts), None, dtype=object)
+    scores = pd.to_numeric(alerts[col], errors='coerce')
+    return np.where(scores.notna(), scores.astype(float), None).astype(object)
+
 # --- Local Testing ---
 if __name__ == "__main__":
     # Mock data representing prioritized alerts from Part 4
@@ -59,13 +414,24 @@ if __name__ == "__main__":
         'priority_level': ['🔴 CRITICAL', '🟠 HIGH'],
         'final_risk_score': [95, 75]
     })
-    
-    manager = CaseManager()
+
+    manager = CaseManager(db_path=':memory:')
     cases = manager.create_cases_from_alerts(mock_prioritized_data)
-    
+
     print("Part 5 - New Investigation Queue:")
     print(cases[['case_id', 'amount', 'priority_level', 'status']])
-    
+
     # Simulate an analyst resolving a case
     result = manager.update_case_status("CASE-1001", "Confirmed Fraud", "User traveling, but amount exceeds limit.")
-    print(f"\nWorkflow Action: {result}")
\ No newline at end of file
+    print(f"\nWorkflow Action: {result}")
+    print(f"\nAudit Trail:\n{manager.audit_trail()[['case_id', 'action', 'resolution']]}")
+
+    # Bulk: compact cases for 10,000 alerts (re-alerting on open transactions reuses their cases),
+    # then one call resolves them all
+    alerts = pd.DataFrame({'transaction_id': [f"TXN-{i}" for i in range(10_000)],
+                           'priority_level': '🟠 HIGH', 'final_risk_score': 60.0})
+    opened = manager.bulk_create_cases(alerts)
+    again = manager.bulk_create_cases(alerts.iloc[:100])
+    resolved = manager.resolve_cases(opened['case_id'], 'False Positive', 'Cleared after incident review')
+    print(f"\nBulk: {int(opened['created'].sum())} cases opened, {int((~again['created']).sum())} duplicates reused, "
+          f"{int(resolved['resolved'].sum())} resolved in one transaction.")
@@ -0,0 +1,213 @@
+#Part 1-6 (CLI)
+# Headless Command-Line Entry Point
+# cli.py (score / train / report subcommands for batch workers and scheduled jobs, with lazy imports).
+#==============================================================================================
+#
+# Usage:
+#   python cli.py train credit_card_trans.zip                 # fit and save isolation_forest.joblib
+#   python cli.py score new_extract.zip                       # score with the saved model, append to results/
+#   python cli.py score transactions.csv --output scored.parquet
+#   python cli.py report                                      # saved model + result sink summary
+#
+# Only the standard library is imported at start-up; each subcommand imports
+# the project modules it needs when it runs. Scoring never imports sklearn or
+# scipy (a saved model carries its compiled forest, see ml_model.py), nor
+# streamlit or plotly. Every run ends with a timing line on stderr (imports,
+# model load, work, total); 'python -X importtime cli.py ...' breaks the
+# imports down per module.
+
+import time
+
+_STARTED = time.perf_counter()
+
+import argparse
+import json
+import os
+import sys
+from contextlib import contextmanager
+
+# Same file names as main.py, repeated so that parsing arguments imports nothing
+MODEL_FILE = 'isolation_forest.joblib'
+RESULTS_DIR = 'results'
+
+# Seconds spent per phase of this run, in order (see timed())
+timings = {}
+
+
+@contextmanager
+def timed(phase):
+    """Adds the wall time of the block to timings[phase]."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[phase] = timings.get(phase, 0.0) + time.perf_counter() - start
+
+
+def startup_report():
+    """Phase timings plus the total since this module started executing, in seconds."""
+    report = {phase: round(seconds, 3) for phase, seconds in timings.items()}
+    report['total'] = round(time.perf_counter() - _STARTED, 3)
+    return report
+
+
+def read_input(path):
+    """
+    Cleaned transactions from the extract ZIP (as main.py reads it), a CSV in
+    the same layout, or a Parquet file (cleaned unless it already has Amount_Num).
+    """
+    import pandas as pd
+    import main
+    from schema import TRANSACTION_DTYPES
+
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"File not found at {path}")
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.zip':
+        return main.run_pipeline(path)
+    if extension == '.csv':
+        return main.clean_transactions(pd.read_csv(path, dtype=TRANSACTION_DTYPES))
+    if extension == '.parquet':
+        df = pd.read_parquet(path)
+        return df if 'Amount_Num' in df else main.clean_transactions(df)
+    raise ValueError(f"Unsupported input '{path}' (expected .zip, .csv or .parquet).")
+
+
+def score(args):
+    """Parts 2-4 with the saved model (no refit); results go to the sink or to --output."""
+    with timed('imports'):
+        import main
+        from feature_engineering import add_transaction_features
+        from ml_model import MLPatternDetector
+        from result_sink import ResultSink
+        from rules import RuleSet
+
+    if not os.path.exists(args.model):
+        raise FileNotFoundError(f"No saved model at {args.model}; run 'python cli.py train' first.")
+    with timed('model_load'):
+        detector = MLPatternDetector.load(args.model)
+        if args.contamination is not None:
+            detector.set_contamination(args.contamination)
+        rules = RuleSet.load(args.rules) if args.rules else None
+
+    with timed('read'):
+        df = read_input(args.input)
+    with timed('features'):
+        df = add_transaction_features(df)
+    with timed('score'):
+        scored = main.run_scoring_and_audit(main.run_detection(df, detector=detector, rules=rules), verbose=False)
+    with timed('write'):
+        if args.output:
+            if args.output.lower().endswith('.csv'):
+                scored.to_csv(args.output, index=False)
+            else:
+                scored.to_parquet(args.output, index=False)
+        else:
+            ResultSink(args.results).append(scored, overwrite=args.replace)
+
+    high = scored['priority'] == 'High'
+    return {'rows': len(scored), 'high_alerts': int(high.sum()),
+            'verified_fraud': int((high & (scored['Fraud'] == 1)).sum()) if 'Fraud' in scored else None,
+            'output': args.output or args.results}
+
+
+def train(args):
+    """Fits a new Isolation Forest (and its feature transformer) on the input and saves it."""
+    with timed('imports'):
+        import main
+        from feature_engineering import add_transaction_features
+
+    with timed('read'):
+        df = read_input(args.input)
+    with timed('features'):
+        df = add_transaction_features(df)
+    with timed('fit'):
+        detector = main.prepare_detector(df, main.new_detector(n_jobs=args.n_jobs))
+        if args.contamination is not None:
+            detector.contamination = args.contamination
+        df = main.encode_merchants(df, detector.vocabulary)
+        detector.fit(detector.transform(df), strata=df['Merchant_Enc'])
+    with timed('write'):
+        detector.save(args.model)
+    return {'model': args.model, 'trained_at': detector.trained_at, 'n_train': detector.n_train,
+            'features': len(detector.features), 'contamination': detector.contamination}
+
+
+def report(args):
+    """Saved model metadata and the result sink's contents, from the manifest alone (no data files are read)."""
+    with timed('imports'):
+        from ml_model import MLPatternDetector
+        from result_sink import ResultSink
+
+    summary = {}
+    if os.path.exists(args.model):
+        with timed('model_load'):
+            detector = MLPatternDetector.load(args.model)
+        summary['model'] = {'path': args.model, 'trained_at': detector.trained_at, 'n_train': detector.n_train,
+                            'features': len(detector.features), 'contamination': detector.contamination,
+                            'size_mb': round(os.path.getsize(args.model) / 2**20, 2)}
+    else:
+        summary['model'] = None
+
+    sink = ResultSink(args.results)
+    by_priority, by_date = {}, {}
+    for entry in sink.manifest['files']:
+        by_priority[entry['priority']] = by_priority.get(entry['priority'], 0) + entry['rows']
+        by_date[entry['date']] = by_date.get(entry['date'], 0) + entry['rows']
+    latest = sink.latest_time()
+    summary['results'] = {'path': args.results, 'rows': len(sink), 'files': len(sink.manifest['files']),
+                          'latest_time': latest.isoformat() if latest is not None else None,
+                          'by_priority': by_priority, 'by_date': dict(sorted(by_date.items()))}
+    return summary
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Headless fraud detection jobs (score, train, report)")
+    parser.add_argument('--timings', help="also append this run's phase timings as a JSON line to this file")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    score_parser = commands.add_parser('score', help="score a file with the saved model")
+    score_parser.add_argument('input', help=".zip extract, .csv or .parquet")
+    score_parser.add_argument('--model', default=MODEL_FILE)
+    score_parser.add_argument('--contamination', type=float, help="move the saved model's cut-off (no refit)")
+    score_parser.add_argument('--rules', help="rules file applied before the forest")
+    score_parser.add_argument('--results', default=RESULTS_DIR, help="ResultSink directory the results are appended to")
+    score_parser.add_argument('--replace', action='store_true', help="replace the sink's previous results")
+    score_parser.add_argument('--output', help="write the full scored frame to this .csv/.parquet instead")
+    score_parser.set_defaults(run=score)
+
+    train_parser = commands.add_parser('train', help="fit and save a new model")
+    train_parser.add_argument('input', help=".zip extract, .csv or .parquet")
+    train_parser.add_argument('--model', default=MODEL_FILE)
+    train_parser.add_argument('--contamination', type=float)
+    train_parser.add_argument('--n-jobs', type=int, default=-1)
+    train_parser.set_defaults(run=train)
+
+    report_parser = commands.add_parser('report', help="summarize the saved model and results")
+    report_parser.add_argument('--model', default=MODEL_FILE)
+    report_parser.add_argument('--results', default=RESULTS_DIR)
+    report_parser.set_defaults(run=report)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    timings['parse'] = time.perf_counter() - _STARTED
+    try:
+        result = args.run(args)
+    except (FileNotFoundError, ValueError) as error:
+        print(f"❌ ERROR: {error}", file=sys.stderr)
+        return 1
+
+    print(json.dumps(result, indent=2))
+    startup = startup_report()
+    print("⏱️ " + ", ".join(f"{phase} {seconds:.3f}s" for phase, seconds in startup.items()), file=sys.stderr)
+    if args.timings:
+        with open(args.timings, 'a') as f:
+            f.write(json.dumps({'command': args.command, **startup}) + '\n')
+    return 0
+
+
+# --- Local Testing ---
+if __name__ == "__main__":
+    sys.exit(main())
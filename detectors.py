@@ -0,0 +1,447 @@
+#Part 2 & 3 (Extension)
+# Pluggable Detectors
+# detectors.py (One fit/score interface over NumPy arrays for the Z-Score, robust MAD, HBOS, half-space-trees and Isolation Forest detectors).
+#==============================================================================================
+#
+# Every detector takes a 2-D float matrix X (e.g. MLPatternDetector.transform(df))
+# and, optionally, one entity label per row (e.g. Merchant_Enc codes):
+#
+#   detector.fit(X, entities)           -> detector
+#   detector.score(X, entities)         -> anomaly score per row (higher = more suspicious)
+#   detector.predict(X, entities)       -> (labels, scores), labels 1 = Anomaly
+#   detector.partial_fit(X, entities)   -> streaming update (HBOS, half-space trees, forest)
+#   detector.risk(scores)               -> 0-1 alert strength for the AlertPrioritizer ensemble
+#
+# Like MLPatternDetector, each detector keeps its training scores sorted, so
+# the contamination cut-off and the alert strength are percentile lookups.
+
+import numpy as np
+import pandas as pd
+
+from alert_scoring import AlertPrioritizer
+
+# Scale that makes the MAD a consistent estimator of the standard deviation for normal data
+MAD_SCALE = 1.4826
+
+# Rows per block when walking the half-space trees (bounds the rows x trees x levels path array)
+HST_BLOCK_ROWS = 8192
+
+
+def _matrix(X):
+    X = np.asarray(X, dtype=np.float64)
+    return X.reshape(len(X), -1)
+
+
+def _entity_positions(entities, known):
+    """Position of each row's entity in `known` (-1 = unseen or no entities given)."""
+    if entities is None or known is None:
+        return None
+    return known.get_indexer(pd.Index(np.asarray(entities)))
+
+
+class Detector:
+    """
+    Part 2 & 3 Extension: Common interface of the pluggable detectors.
+    Subclasses implement _fit (and _update for streaming) plus score.
+    """
+
+    name = 'detector'
+
+    def __init__(self, contamination=0.1):
+        self.contamination = contamination
+        self.reference_scores = None
+        self.threshold = None
+        self.is_fitted = False
+
+    def fit(self, X, entities=None):
+        X = _matrix(X)
+        self._fit(X, entities)
+        self.is_fitted = True
+        return self._calibrate(X, entities)
+
+    def partial_fit(self, X, entities=None):
+        """Folds a new batch into the fitted state and re-derives the cut-off from its scores."""
+        if not self.is_fitted:
+            return self.fit(X, entities)
+        X = _matrix(X)
+        self._update(X, entities)
+        return self._calibrate(X, entities)
+
+    def _fit(self, X, entities):
+        raise NotImplementedError
+
+    def _update(self, X, entities):
+        raise NotImplementedError(f"{type(self).__name__} has no incremental update; use fit().")
+
+    def score(self, X, entities=None):
+        raise NotImplementedError
+
+    def _calibrate(self, X, entities):
+        self.reference_scores = np.sort(self.score(X, entities))
+        return self.set_contamination(self.contamination)
+
+    def set_contamination(self, contamination):
+        """Moves the anomaly cut-off to a new contamination rate, without refitting."""
+        if self.reference_scores is None:
+            raise ValueError(f"{type(self).__name__} must be fitted before setting contamination.")
+        self.contamination = contamination
+        self.threshold = np.percentile(self.reference_scores, 100.0 * (1 - contamination))
+        return self
+
+    def predict(self, X, entities=None):
+        """(labels, scores): labels are 1 for Anomaly / 0 for Normal."""
+        scores = self.score(X, entities)
+        return (scores > self.threshold).astype(np.int8), scores
+
+    def risk(self, scores):
+        """
+        0-1 alert strength: 0 up to the cut-off, then rising with the score's
+        percentile among the training scores to 1 at the most extreme ones.
+        """
+        tail = 1 - np.searchsorted(self.reference_scores, scores, side='left') / len(self.reference_scores)
+        return np.clip(1 - tail / self.contamination, 0, 1)
+
+
+class ZScoreDetector(Detector):
+    """Part 2 as a detector: the largest absolute Z-Score over the columns."""
+
+    name = 'z_score'
+
+    def _fit(self, X, entities):
+        self.mean = np.nanmean(X, axis=0)
+        std = np.nanstd(X, axis=0)
+        # Constant columns cannot be outliers
+        self.scale = np.where(std > 0, std, np.inf)
+
+    def score(self, X, entities=None):
+        return np.nanmax(np.abs(_matrix(X) - self.mean) / self.scale, axis=1, initial=0.0)
+
+
+class RobustZScoreDetector(Detector):
+    """
+    Median/MAD Z-Score: (x - median) / (1.4826 * MAD), the largest over the
+    columns. Unlike the mean and std, the median and MAD barely move when the
+    reference window itself contains outliers or frauds.
+
+    With entities, each entity with at least min_count rows gets its own
+    median and MAD; the others use the global ones.
+    """
+
+    name = 'robust_z'
+
+    def __init__(self, contamination=0.1, min_count=30):
+        super().__init__(contamination)
+        self.min_count = min_count
+        self.entities = None
+
+    @staticmethod
+    def _location_scale(frame):
+        median = frame.median()
+        mad = (frame - median).abs().median() * MAD_SCALE
+        # Mostly-constant columns have MAD = 0: fall back to the mean absolute deviation
+        mean_ad = (frame - median).abs().mean() * 1.2533
+        scale = mad.where(mad > 0, mean_ad)
+        return median.to_numpy(), scale.where(scale > 0, np.inf).to_numpy()
+
+    def _fit(self, X, entities):
+        frame = pd.DataFrame(X)
+        self.median, self.scale = (values[None, :] for values in self._location_scale(frame))
+        if entities is None:
+            return
+        grouped = frame.groupby(np.asarray(entities), sort=True)
+        sizes = grouped.size()
+        kept = sizes.index[sizes >= self.min_count]
+        self.entities = pd.Index(kept)
+        medians = grouped.median().loc[kept]
+        mads = (frame - medians.reindex(np.asarray(entities)).to_numpy()).abs().groupby(
+            np.asarray(entities), sort=True).median().loc[kept] * MAD_SCALE
+        # Entities whose MAD is 0 in a column keep the global scale there
+        self.entity_median = medians.to_numpy()
+        self.entity_scale = np.where(mads.to_numpy() > 0, mads.to_numpy(), self.scale)
+
+    def score(self, X, entities=None):
+        X = _matrix(X)
+        median = np.broadcast_to(self.median, X.shape)
+        scale = np.broadcast_to(self.scale, X.shape)
+        positions = _entity_positions(entities, self.entities)
+        if positions is not None and (positions >= 0).any():
+            own = positions >= 0
+            median, scale = median.copy(), scale.copy()
+            median[own] = self.entity_median[positions[own]]
+            scale[own] = self.entity_scale[positions[own]]
+        return np.nanmax(np.abs(X - median) / scale, axis=1, initial=0.0)
+
+
+class HBOSDetector(Detector):
+    """
+    Histogram-Based Outlier Score: every column gets a histogram with
+    quantile bin edges, and a row scores the sum over columns of
+    -log(probability of its bin). Values outside the training range fall in
+    two extra, initially empty, bins.
+
+    With entities, each entity keeps its own counts, shrunk towards the
+    global histogram with prior_weight pseudo-rows, so small entities are
+    judged mostly by the global shape. partial_fit only adds counts.
+    """
+
+    name = 'hbos'
+
+    def __init__(self, contamination=0.1, n_bins=20, prior_weight=10.0):
+        super().__init__(contamination)
+        self.n_bins = n_bins
+        self.prior_weight = prior_weight
+        self.entities = None
+
+    def _bins(self, X):
+        """(rows, columns) bin index: 0 = below range, 1..n = inside, n + 1 = above range (and NaN)."""
+        bins = np.empty(X.shape, dtype=np.int64)
+        for j, edges in enumerate(self.edges):
+            inside = np.searchsorted(edges[1:-1], X[:, j], side='right') + 1
+            bins[:, j] = np.where(X[:, j] < edges[0], 0, np.where(X[:, j] <= edges[-1], inside, self.width - 1))
+        return bins
+
+    def _fit(self, X, entities):
+        quantiles = np.linspace(0, 1, self.n_bins + 1)
+        self.edges = [np.unique(np.nanquantile(X[:, j], quantiles)) for j in range(X.shape[1])]
+        # Slots per column: the inside bins plus one below and one above the range
+        self.width = max(len(edges) for edges in self.edges) + 1
+        self.global_counts = np.zeros((X.shape[1], self.width))
+        self.entities = pd.Index([]) if entities is not None else None
+        self.entity_counts = np.zeros((0, X.shape[1], self.width))
+        self._update(X, entities)
+
+    def _update(self, X, entities):
+        bins = self._bins(X)
+        columns = np.arange(X.shape[1])
+        flat = (columns * self.width + bins).ravel()
+        self.global_counts += np.bincount(flat, minlength=self.global_counts.size).reshape(self.global_counts.shape)
+        if entities is None or self.entities is None:
+            return
+        labels = pd.Index(np.asarray(entities))
+        new = labels.unique().difference(self.entities)
+        if len(new):
+            self.entities = self.entities.append(new)
+            self.entity_counts = np.concatenate(
+                [self.entity_counts, np.zeros((len(new),) + self.entity_counts.shape[1:])])
+        positions = self.entities.get_indexer(labels)
+        flat = ((positions[:, None] * X.shape[1] + columns) * self.width + bins).ravel()
+        self.entity_counts += np.bincount(flat, minlength=self.entity_counts.size).reshape(self.entity_counts.shape)
+
+    def score(self, X, entities=None):
+        X = _matrix(X)
+        bins = self._bins(X)
+        columns = np.arange(X.shape[1])
+        # Laplace-smoothed global bin probabilities, so empty bins are rare but not impossible
+        totals = self.global_counts.sum(axis=1, keepdims=True)
+        global_p = (self.global_counts + 1) / (totals + self.width)
+        p = global_p[columns, bins]
+
+        positions = _entity_positions(entities, self.entities)
+        if positions is not None and (positions >= 0).any():
+            own = np.flatnonzero(positions >= 0)
+            counts = self.entity_counts[positions[own][:, None], columns, bins[own]]
+            entity_totals = self.entity_counts[positions[own]].sum(axis=2)
+            p[own] = (counts + self.prior_weight * p[own]) / (entity_totals + self.prior_weight)
+        return -np.log(p).sum(axis=1)
+
+
+class HalfSpaceTreesDetector(Detector):
+    """
+    Half-Space Trees (Tan, Ting & Liu, 2011): an online forest of random,
+    fully grown trees whose splits halve a randomly perturbed copy of the
+    feature space, so the trees need no training data, only its range.
+
+    Each node counts the rows that reach it: a reference window (used for
+    scoring) and the latest window (being filled). Once the latest window
+    holds window_size rows it becomes the reference, so the model follows
+    drift at the cost of a few counter updates per row. A row's mass score
+    is, per tree, the reference mass of the first node on its path holding
+    less than size_limit of the window (or of its leaf) times 2**depth;
+    sparse regions have low mass, so the anomaly score is minus the mean mass.
+    """
+
+    name = 'half_space_trees'
+
+    def __init__(self, contamination=0.1, n_trees=25, depth=8, window_size=10_000, size_limit=0.1, seed=42):
+        super().__init__(contamination)
+        self.n_trees = n_trees
+        self.depth = depth
+        self.window_size = window_size
+        self.size_limit = size_limit
+        self.seed = seed
+
+    def _normalize(self, X):
+        return np.nan_to_num((X - self.low) / self.span, nan=0.5)
+
+    def _build(self, n_features, rng):
+        n_nodes = 2 ** (self.depth + 1) - 1
+        self.feature = np.zeros((self.n_trees, n_nodes), dtype=np.int64)
+        self.split = np.zeros((self.n_trees, n_nodes))
+        for t in range(self.n_trees):
+            # Workspace around a random point of [0, 1]: wide enough to hold the whole unit cube
+            s = rng.random(n_features)
+            radius = 2 * np.maximum(s, 1 - s)
+            lows, highs = np.empty((n_nodes, n_features)), np.empty((n_nodes, n_features))
+            lows[0], highs[0] = s - radius, s + radius
+            for node in range(2 ** self.depth - 1):
+                q = rng.integers(n_features)
+                mid = (lows[node, q] + highs[node, q]) / 2
+                self.feature[t, node], self.split[t, node] = q, mid
+                left, right = 2 * node + 1, 2 * node + 2
+                lows[left], highs[left] = lows[node], highs[node]
+                lows[right], highs[right] = lows[node], highs[node]
+                highs[left, q] = lows[right, q] = mid
+
+    def _paths(self, X):
+        """(rows, trees, depth + 1) node index of each row at every level of every tree."""
+        Xn = self._normalize(X)
+        rows = np.arange(len(Xn))[:, None]
+        trees = np.arange(self.n_trees)[None, :]
+        nodes = np.zeros((len(Xn), self.n_trees), dtype=np.int64)
+        paths = [nodes]
+        for _ in range(self.depth):
+            go_right = Xn[rows, self.feature[trees, nodes]] > self.split[trees, nodes]
+            nodes = 2 * nodes + 1 + go_right
+            paths.append(nodes)
+        return np.stack(paths, axis=2)
+
+    def _fit(self, X, entities):
+        self.low = np.nanmin(X, axis=0)
+        span = np.nanmax(X, axis=0) - self.low
+        self.span = np.where(span > 0, span, 1.0)
+        self._build(X.shape[1], np.random.default_rng(self.seed))
+        self.reference_mass = self._mass(X)
+        self.reference_rows = len(X)
+        self.latest_mass = np.zeros_like(self.reference_mass)
+        self.latest_rows = 0
+
+    def _mass(self, X):
+        mass = np.zeros(self.feature.size)
+        offsets = np.arange(self.n_trees)[None, :, None] * self.feature.shape[1]
+        for start in range(0, len(X), HST_BLOCK_ROWS):
+            paths = self._paths(X[start:start + HST_BLOCK_ROWS])
+            mass += np.bincount((offsets + paths).ravel(), minlength=self.feature.size)
+        return mass.reshape(self.feature.shape)
+
+    def _update(self, X, entities):
+        self.latest_mass += self._mass(X)
+        self.latest_rows += len(X)
+        if self.latest_rows >= self.window_size:
+            self.reference_mass, self.reference_rows = self.latest_mass, self.latest_rows
+            self.latest_mass, self.latest_rows = np.zeros_like(self.reference_mass), 0
+
+    def score(self, X, entities=None):
+        X = _matrix(X)
+        scores = np.empty(len(X))
+        trees = np.arange(self.n_trees)[None, :, None]
+        for start in range(0, len(X), HST_BLOCK_ROWS):
+            paths = self._paths(X[start:start + HST_BLOCK_ROWS])
+            mass = self.reference_mass[trees, paths] / self.reference_rows
+            # First level whose node is too sparse to split further (the leaf if none is)
+            sparse = mass < self.size_limit
+            sparse[:, :, -1] = True
+            level = sparse.argmax(axis=2)
+            stop_mass = np.take_along_axis(mass, level[:, :, None], axis=2)[:, :, 0]
+            scores[start:start + HST_BLOCK_ROWS] = -(stop_mass * 2.0 ** level).mean(axis=1)
+        return scores
+
+
+class IsolationForestDetector(Detector):
+    """
+    Part 3 as a detector: wraps an MLPatternDetector (its transformer must be
+    fitted, since X is its model matrix). Scores are minus the decision
+    function, so the forest's own cut-off sits at 0. partial_fit() adds
+    warm_start_trees trees, within the model's max_trees cap.
+    """
+
+    name = 'isolation_forest'
+
+    def __init__(self, model, contamination=None, warm_start_trees=10):
+        super().__init__(model.contamination if contamination is None else contamination)
+        self.model = model
+        self.warm_start_trees = warm_start_trees
+        if model.is_fitted:
+            self.is_fitted = True
+            self._calibrate_from_model()
+
+    def _calibrate_from_model(self):
+        self.model.set_contamination(self.contamination)
+        self.reference_scores = np.sort(self.model.model.offset_ - self.model.reference_scores)
+        self.threshold = 0.0
+
+    def fit(self, X, entities=None):
+        self.model.fit(_matrix(X).astype(np.float32), strata=entities)
+        self.is_fitted = True
+        self._calibrate_from_model()
+        return self
+
+    def partial_fit(self, X, entities=None):
+        self.model.partial_fit(_matrix(X).astype(np.float32), n_trees=self.warm_start_trees, strata=entities)
+        self.is_fitted = True
+        self._calibrate_from_model()
+        return self
+
+    def set_contamination(self, contamination):
+        self.contamination = contamination
+        self._calibrate_from_model()
+        return self
+
+    def score(self, X, entities=None):
+        return -self.model.score_array(_matrix(X))[1]
+
+
+class DetectorEnsemble:
+    """
+    Several detectors fitted on the same matrix and blended by the
+    AlertPrioritizer: risk_frame() gives one risk_<name> column (0-1 alert
+    strength) per detector and prioritizer() the matching weighted prioritizer.
+    """
+
+    def __init__(self, detectors, weights=None):
+        self.detectors = {detector.name: detector for detector in detectors}
+        self.weights = {name: 1.0 for name in self.detectors}
+        self.weights.update(weights or {})
+
+    def fit(self, X, entities=None):
+        for detector in self.detectors.values():
+            detector.fit(X, entities)
+        return self
+
+    def partial_fit(self, X, entities=None):
+        """Streaming update of every detector that supports one (the others keep their fit)."""
+        for detector in self.detectors.values():
+            try:
+                detector.partial_fit(X, entities)
+            except NotImplementedError:
+                pass
+        return self
+
+    def risk_frame(self, X, entities=None):
+        return pd.DataFrame({f'risk_{name}': detector.risk(detector.score(X, entities))
+                             for name, detector in self.detectors.items()})
+
+    def prioritizer(self):
+        return AlertPrioritizer(weights={f'risk_{name}': weight for name, weight in self.weights.items()})
+
+
+# --- Local Testing ---
+if __name__ == "__main__":
+    rng = np.random.default_rng(42)
+    merchants = rng.choice([0, 1, 2], 5000)
+    X = np.column_stack([np.where(merchants == 1, rng.normal(800, 100, 5000), rng.normal(60, 15, 5000)),
+                         rng.normal(0, 1, 5000)])
+    # $900 is routine for travel (merchant 1) but extreme for gaming (merchant 2)
+    probe = np.array([[900.0, 0.0], [900.0, 0.0], [60.0, 6.0]])
+    probe_merchants = np.array([1, 2, 0])
+
+    ensemble = DetectorEnsemble([ZScoreDetector(), RobustZScoreDetector(), HBOSDetector(),
+                                 HalfSpaceTreesDetector(window_size=2000)], weights={'hbos': 2.0})
+    ensemble.fit(X, merchants)
+    print("Part 2 & 3 Extension - Detector scores (travel $900, gaming $900, odd second feature):")
+    for name, detector in ensemble.detectors.items():
+        labels, scores = detector.predict(probe, probe_merchants)
+        print(f"{name:>17}: scores {np.round(scores, 2).tolist()} -> flags {labels.tolist()}")
+
+    risks = ensemble.risk_frame(probe, probe_merchants)
+    alerts = ensemble.prioritizer().calculate_priority(risks.assign(amount=probe[:, 0]), sort=False)
+    print(alerts[['ensemble_component', 'final_risk_score', 'priority_level']])
@@ -0,0 +1,300 @@
+#Part 6 (Extension)
+# Pipeline Instrumentation
+# instrumentation.py (Per-stage wall time, rows/sec, peak RSS and allocations, exported as JSON logs or Prometheus text).
+#==============================================================================================
+#
+# Usage:
+#   import instrumentation as inst
+#   inst.enable()                                   # off by default
+#   with inst.stage('cleaning') as s:
+#       df = clean_transactions(df)
+#       s.rows = len(df)
+#
+#   @inst.instrumented('detection')                 # rows taken from the returned DataFrame
+#   def run_detection(df): ...
+#
+#   inst.write_prometheus('pipeline_metrics.prom')
+#
+# While disabled, stage() returns a shared no-op context and instrumented
+# functions only pay for one flag check, so the hooks can stay in hot paths.
+
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict, deque
+from contextlib import nullcontext
+from datetime import datetime
+
+import pandas as pd
+
+logger = logging.getLogger('fraud.pipeline')
+
+# Completed stage records kept in memory for the dashboard
+MAX_RECORDS = 1000
+
+_state = {'enabled': False, 'trace_allocations': False}
+_records = deque(maxlen=MAX_RECORDS)
+_totals = OrderedDict()  # stage -> {'runs', 'seconds', 'rows'}
+_lock = threading.Lock()
+
+
+class _NullStage:
+    """Stand-in yielded while disabled, so `s.rows = n` still works."""
+    rows = None
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_DISABLED = nullcontext(_NullStage())
+
+
+def enable(trace_allocations=False):
+    """
+    Turns recording on. With trace_allocations, tracemalloc also records the
+    peak of Python/NumPy allocations per stage (noticeably slower; a nested
+    stage restarts the peak of the stage around it).
+    """
+    _state['enabled'] = True
+    _state['trace_allocations'] = trace_allocations
+    if trace_allocations and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable():
+    """Turns recording off (already collected records are kept)."""
+    _state['enabled'] = False
+    if _state['trace_allocations'] and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _state['trace_allocations'] = False
+
+
+def is_enabled():
+    return _state['enabled']
+
+
+def reset():
+    """Forgets all collected records and totals."""
+    with _lock:
+        _records.clear()
+        _totals.clear()
+
+
+def _rss_bytes():
+    """Current resident set size (Linux /proc; None elsewhere)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+class _RssSampler(threading.Thread):
+    """Polls the RSS in the background to catch the peak inside a stage."""
+
+    def __init__(self, interval=0.01):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = _rss_bytes()
+        self._stop_event = threading.Event()
+
+    def _sample(self):
+        rss = _rss_bytes()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self._sample()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self._sample()
+        return self.peak
+
+
+class Stage:
+    """One running stage; set `rows` inside the block to get rows/sec."""
+
+    def __init__(self, name, rows=None):
+        self.name = name
+        self.rows = rows
+        self.record = None
+
+    def __enter__(self):
+        self._tracing = tracemalloc.is_tracing()
+        if self._tracing:
+            tracemalloc.reset_peak()
+        self._sampler = _RssSampler()
+        self._sampler.start()
+        self._started_at = datetime.now().isoformat(timespec='milliseconds')
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self._start
+        rss_peak = self._sampler.stop()
+        self.record = {
+            'stage': self.name,
+            'started_at': self._started_at,
+            'seconds': round(seconds, 6),
+            'rows': self.rows,
+            'rows_per_s': round(self.rows / seconds, 1) if self.rows and seconds > 0 else None,
+            # Raw byte counts; summary() rounds them to MB for display
+            'rss_peak_bytes': rss_peak,
+            'alloc_peak_bytes': tracemalloc.get_traced_memory()[1] if self._tracing else None,
+            'ok': exc_type is None,
+        }
+        _record(self.record)
+        return False
+
+
+def _record(record):
+    with _lock:
+        _records.append(record)
+        totals = _totals.setdefault(record['stage'], {'runs': 0, 'seconds': 0.0, 'rows': 0})
+        totals['runs'] += 1
+        totals['seconds'] += record['seconds']
+        totals['rows'] += record['rows'] or 0
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps(record))
+
+
+def stage(name, rows=None):
+    """Context manager timing one pipeline stage (a no-op while disabled)."""
+    if not _state['enabled']:
+        return _DISABLED
+    return Stage(name, rows)
+
+
+def _default_rows(result):
+    """Rows processed, read from a returned DataFrame/array (or the first element of a tuple)."""
+    if isinstance(result, tuple) and result:
+        result = result[0]
+    shape = getattr(result, 'shape', None)
+    return shape[0] if shape else None
+
+
+def instrumented(name=None, rows=_default_rows):
+    """Decorator form of stage(); rows is a function of the return value."""
+    def decorator(fn):
+        stage_name = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _state['enabled']:
+                return fn(*args, **kwargs)
+            with Stage(stage_name) as s:
+                result = fn(*args, **kwargs)
+                s.rows = rows(result) if rows is not None else None
+            return result
+        return wrapper
+    return decorator
+
+
+# --- Reads & Exports ---
+def megabytes(n_bytes):
+    """A byte count as MB rounded for display (None stays None)."""
+    return round(n_bytes / 2**20, 1) if n_bytes is not None else None
+
+
+def records():
+    """All kept stage records, oldest first, as a DataFrame."""
+    with _lock:
+        return pd.DataFrame(list(_records))
+
+
+def summary():
+    """
+    Latest run of every stage plus its cumulative totals, in first-seen order,
+    with the memory peaks also in MB (rss_peak_mb, alloc_peak_mb).
+    """
+    with _lock:
+        latest = {r['stage']: r for r in _records}
+        rows = [{**latest.get(name, {'stage': name}), 'runs': t['runs'], 'total_seconds': round(t['seconds'], 6)}
+                for name, t in _totals.items()]
+    for row in rows:
+        row['rss_peak_mb'] = megabytes(row.get('rss_peak_bytes'))
+        row['alloc_peak_mb'] = megabytes(row.get('alloc_peak_bytes'))
+    return pd.DataFrame(rows)
+
+
+def write_json_lines(path, append=True):
+    """Writes the kept records as JSON Lines (one structured log entry per stage run)."""
+    with _lock:
+        lines = [json.dumps(r) for r in _records]
+    with open(path, 'a' if append else 'w') as f:
+        f.writelines(line + '\n' for line in lines)
+    return path
+
+
+def prometheus_text():
+    """Current metrics in the Prometheus text exposition format."""
+    with _lock:
+        latest = {r['stage']: r for r in _records}
+        totals = {name: dict(t) for name, t in _totals.items()}
+
+    metrics = [
+        ('pipeline_stage_runs_total', 'counter', 'Completed runs of the stage.',
+         {s: t['runs'] for s, t in totals.items()}),
+        ('pipeline_stage_seconds_total', 'counter', 'Wall time spent in the stage.',
+         {s: t['seconds'] for s, t in totals.items()}),
+        ('pipeline_stage_rows_total', 'counter', 'Rows processed by the stage.',
+         {s: t['rows'] for s, t in totals.items()}),
+        ('pipeline_stage_last_seconds', 'gauge', 'Wall time of the latest run.',
+         {s: r['seconds'] for s, r in latest.items()}),
+        ('pipeline_stage_last_rows_per_second', 'gauge', 'Throughput of the latest run.',
+         {s: r['rows_per_s'] for s, r in latest.items()}),
+        ('pipeline_stage_last_rss_peak_bytes', 'gauge', 'Peak resident set size during the latest run.',
+         {s: r['rss_peak_bytes'] for s, r in latest.items()}),
+        ('pipeline_stage_last_alloc_peak_bytes', 'gauge', 'Peak traced allocations during the latest run.',
+         {s: r['alloc_peak_bytes'] for s, r in latest.items()}),
+    ]
+    lines = []
+    for metric, kind, help_text, values in metrics:
+        values = {s: v for s, v in values.items() if v is not None}
+        if not values:
+            continue
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {kind}")
+        lines.extend(f'{metric}{{stage="{s}"}} {v if isinstance(v, int) else float(v)!r}' for s, v in values.items())
+    return '\n'.join(lines) + '\n'
+
+
+def write_prometheus(path):
+    """Writes prometheus_text() atomically (e.g. for a node_exporter textfile collector)."""
+    with open(f'{path}.tmp', 'w') as f:
+        f.write(prometheus_text())
+    os.replace(f'{path}.tmp', path)
+    return path
+
+
+# --- Local Testing ---
+if __name__ == "__main__":
+    import numpy as np
+
+    @instrumented('square')
+    def square(values):
+        return values ** 2
+
+    values = np.arange(1_000_000, dtype=np.float64)
+    start = time.perf_counter()
+    for _ in range(1000):
+        with stage('noop'):
+            pass
+    print(f"Disabled overhead: {(time.perf_counter() - start) / 1000 * 1e6:.2f} µs per stage")
+
+    enable(trace_allocations=True)
+    with stage('sort') as s:
+        np.sort(values[::-1])
+        s.rows = len(values)
+    square(values)
+
+    print("\nPart 6 Extension - Pipeline Health:")
+    print(summary()[['stage', 'seconds', 'rows_per_s', 'rss_peak_mb', 'alloc_peak_mb']])
+    print(f"\n{prometheus_text()}")
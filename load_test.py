@@ -0,0 +1,143 @@
+#Benchmark
+# Scoring Service Load Test
+# load_test.py (Replays transactions against scoring_service.py and reports throughput and latency percentiles).
+#==============================================================================================
+#
+# Usage:
+#   python load_test.py                                  # replay credit_card_trans.zip
+#   python load_test.py --model other_model.joblib       # against another saved model
+#   python load_test.py --jsonl transactions.jsonl       # one transaction object per line
+#   python load_test.py --url-port 8765                  # target an already running service
+#
+# Without --url-port a service is started in a subprocess for the duration of
+# the run, serving the saved model (--model) that main.py / cli.py train wrote.
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from feature_engineering import add_transaction_features
+
+
+def load_transactions(jsonl_path=None, zip_path='credit_card_trans.zip', limit=20000):
+    """
+    Transactions to replay. A JSONL file is sent as-is (one object per line);
+    the sample CSV rows are sent with every field the saved model reads (the
+    velocity/geo features included), the cleaned amount as 'Amount_Num' and
+    the ID as 'transaction_id'.
+    """
+    if jsonl_path:
+        with open(jsonl_path) as f:
+            return [json.loads(line) for line in f if line.strip()][:limit]
+
+    with zipfile.ZipFile(zip_path) as z:
+        with z.open(z.namelist()[0]) as f:
+            df = pd.read_csv(f, nrows=limit)
+    df['Amount_Num'] = df.pop('Amount').replace('[£,]', '', regex=True).astype(float)
+    df = add_transaction_features(df).drop(columns=['event_time', 'Fraud'], errors='ignore')
+    df = df.rename(columns={'Transaction ID': 'transaction_id'})
+    # Missing values go out as JSON null rather than NaN
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+
+async def _post(reader, writer, body):
+    writer.write((f"POST /score HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                  f"Content-Length: {len(body)}\r\n\r\n").encode() + body)
+    await writer.drain()
+    head = await reader.readuntil(b'\r\n\r\n')
+    length = 0
+    for line in head.decode('latin-1').split('\r\n'):
+        if line.lower().startswith('content-length:'):
+            length = int(line.split(':', 1)[1])
+    await reader.readexactly(length)
+    return head.split(b' ', 2)[1] == b'200'
+
+
+async def run_load(transactions, host, port, concurrency, batch_size):
+    """Replays the transactions over `concurrency` keep-alive connections."""
+    payloads = [json.dumps(transactions[i] if batch_size == 1 else transactions[i:i + batch_size]).encode()
+                for i in range(0, len(transactions), batch_size)]
+    cursor = iter(payloads)
+    latencies, errors = [], 0
+
+    async def client():
+        nonlocal errors
+        reader, writer = await asyncio.open_connection(host, port)
+        for body in cursor:
+            start = time.perf_counter()
+            ok = await _post(reader, writer, body)
+            latencies.append(time.perf_counter() - start)
+            errors += not ok
+        writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    ms = np.array(latencies) * 1000
+    return {
+        'requests': len(payloads),
+        'transactions': len(transactions),
+        'errors': errors,
+        'concurrency': concurrency,
+        'batch_size': batch_size,
+        'elapsed_s': round(elapsed, 3),
+        'requests_per_s': round(len(payloads) / elapsed, 1),
+        'transactions_per_s': round(len(transactions) / elapsed, 1),
+        'latency_ms': {p: round(float(np.percentile(ms, q)), 3)
+                       for p, q in [('p50', 50), ('p90', 90), ('p99', 99), ('max', 100)]},
+    }
+
+
+async def _wait_for_port(host, port, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise TimeoutError(f"Scoring service did not start on {host}:{port}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test for scoring_service.py")
+    parser.add_argument('--jsonl', help="JSONL file with one transaction object per line")
+    parser.add_argument('--zip', default='credit_card_trans.zip')
+    parser.add_argument('--model', default='isolation_forest.joblib', help="saved model the started service serves")
+    parser.add_argument('--limit', type=int, default=20000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--batch-size', type=int, default=1, help="transactions per request")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--url-port', type=int, help="port of an already running service")
+    parser.add_argument('--output', help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    transactions = load_transactions(args.jsonl, args.zip, args.limit)
+    port = args.url_port or 8799
+    service = None
+    if args.url_port is None:
+        service = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(__file__) or '.', 'scoring_service.py'),
+                                    '--host', args.host, '--port', str(port),
+                                    '--model', args.model, '--reference', args.zip])
+    try:
+        asyncio.run(_wait_for_port(args.host, port))
+        report = asyncio.run(run_load(transactions, args.host, port, args.concurrency, args.batch_size))
+    finally:
+        if service is not None:
+            service.terminate()
+            service.wait()
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
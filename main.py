@@ -2,54 +2,257 @@ import pandas as pd
 import numpy as np
 import zipfile
 import os
-from scipy import stats
-from sklearn.ensemble import IsolationForest
-from sklearn.preprocessing import LabelEncoder
+import sys
+
+import instrumentation
+from calibration import ThresholdCalibrator
+from data_cache import DatasetCache, file_hash
+from feature_engineering import VelocityFeatureState, add_transaction_features
+from feature_transformer import REAL_DATA_SPEC, FeatureTransformer
+from ml_model import MLPatternDetector
+from online_stats import OnlineStatsStore
+from parallel_detection import score_in_parallel
+from result_sink import ResultSink
+from rollups import RollupStore
+from rules import RuleSet
+from schema import TRANSACTION_DTYPES, Vocabulary, downcast
+from scoring_kernels import z_score_flags
+from stats_model import StatisticalDetector
+
+# Raw columns the Isolation Forest's feature transformer is built from (see feature_transformer.py)
+DETECTION_SPEC = REAL_DATA_SPEC
+
+# Where main.py stores the fitted model so later jobs can score without refitting
+MODEL_FILE = 'isolation_forest.joblib'
+
+# Larger windows are trained on a per-Merchant Group stratified sample of this many rows
+TRAIN_SAMPLE_ROWS = 250_000
+
+# Trees added per chunk in streaming mode (warm start on top of the first chunk's forest).
+# The forest stays at MLPatternDetector.max_trees: each chunk's new trees replace the oldest ones.
+WARM_START_TREES = 10
+
+# Fast-path rules applied before the Isolation Forest (python main.py --rules)
+RULES_FILE = 'rules.yaml'
+
+# Sorted anomaly scores and fraud labels of the last batch run, for threshold what-ifs
+CALIBRATION_FILE = 'calibration.npz'
+
+# Checkpoint of the per-Merchant Group running statistics used in streaming mode
+STATS_FILE = 'online_stats.npz'
+
+# Velocity feature carry-over for streaming mode (checkpointed like STATS_FILE, with the same position)
+VELOCITY_FILE = 'velocity_state.npz'
+
+# Result columns of every run, as Parquet partitioned by date and priority (result_sink.py)
+RESULTS_DIR = 'results'
+
+# Pre-aggregated dashboard views (per merchant/country/bank/hour/day, plus histograms)
+ROLLUP_DIR = 'rollups'
+
+# Per-stage timings of the last instrumented run (python main.py --metrics)
+METRICS_FILE = 'pipeline_metrics.prom'
+METRICS_LOG = 'pipeline_metrics.jsonl'
 
 # ==========================================
 # PART 1: DATA PIPELINE (Ingestion & Cleaning)
 # ==========================================
-def run_pipeline(zip_path):
-    """Handles ZIP extraction and data cleaning."""
+
+# Rows per chunk in streaming mode
+DEFAULT_CHUNKSIZE = 100_000
+
+
+@instrumentation.instrumented('cleaning')
+def clean_transactions(df):
+    """Cleans the 'Amount' column (Removing £ and converting to float; float32 when exact)."""
+    df['Amount_Num'] = df['Amount'].replace('[£,]', '', regex=True).astype(float)
+    return downcast(df, ['Amount_Num'])
+
+
+@instrumentation.instrumented('ingestion')
+def read_transactions(zip_path):
+    """
+    Reads the CSV inside the ZIP (the ingestion half of run_pipeline), with
+    text columns as categoricals and small numerics downcast (schema.py).
+    """
+    with zipfile.ZipFile(zip_path, 'r') as z:
+        csv_name = z.namelist()[0]
+        with z.open(csv_name) as f:
+            return pd.read_csv(f, dtype=TRANSACTION_DTYPES)
+
+
+def run_pipeline(zip_path, cache=None):
+    """
+    Handles ZIP extraction and data cleaning.
+    If a DatasetCache is given, the cleaned frame is loaded from (or saved to) it.
+    """
     if not os.path.exists(zip_path):
         print(f"❌ ERROR: File not found at {zip_path}")
         return None
 
+    if cache is not None:
+        cached = cache.load(zip_path, 'clean')
+        if cached is not None:
+            return cached
+
+    df = clean_transactions(read_transactions(zip_path))
+    if cache is not None:
+        cache.save(df, zip_path, 'clean')
+    return df
+
+
+def iter_pipeline_chunks(zip_path, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Streaming version of run_pipeline: yields cleaned, typed chunks of the
+    ZIP member one at a time instead of materializing the whole CSV.
+    """
+    if not os.path.exists(zip_path):
+        print(f"❌ ERROR: File not found at {zip_path}")
+        return
+
     with zipfile.ZipFile(zip_path, 'r') as z:
         csv_name = z.namelist()[0]
         with z.open(csv_name) as f:
-            df = pd.read_csv(f)
-    
-    # Clean the 'Amount' column (Removing £ and converting to float)
-    df['Amount_Num'] = df['Amount'].replace('[£,]', '', regex=True).astype(float)
-    return df
+            for chunk in pd.read_csv(f, chunksize=chunksize, dtype=TRANSACTION_DTYPES):
+                yield clean_transactions(chunk)
 
 # ==========================================
 # PART 2 & 3: DETECTION ENGINES (Math & ML)
 # ==========================================
-def run_detection(df):
-    """Tuned Detection: More sensitive to catch anomalies."""
+def encode_merchants(df, vocabulary=None):
+    """
+    Encodes 'Merchant Group' into the numeric Merchant_Enc model feature using
+    the stable vocabulary codes (-1 = missing), so a merchant keeps its number
+    across batches. Without a vocabulary, one is built from this batch.
+    """
+    if vocabulary is None:
+        vocabulary = Vocabulary().update(df, ['Merchant Group'])
+    df['Merchant_Enc'] = vocabulary.codes(df, 'Merchant Group')
+    return df
+
+
+def new_detector(n_jobs=None):
+    """An unfitted Isolation Forest over the DETECTION_SPEC feature transformer."""
+    # Increased contamination to 0.1 (Top 10% of weird patterns)
+    return MLPatternDetector(contamination=0.1, n_jobs=n_jobs, max_train_rows=TRAIN_SAMPLE_ROWS,
+                             transformer=FeatureTransformer.from_spec(DETECTION_SPEC))
+
+
+def prepare_detector(df, detector=None, n_jobs=None):
+    """
+    The detector for this batch (a new one if None) with its vocabulary
+    extended by any unseen categories, which are then applied to df in place.
+    An unfitted detector also gets its feature transformer fitted on df.
+    """
+    if detector is None:
+        detector = new_detector(n_jobs=n_jobs)
+    if detector.vocabulary is None:
+        detector.vocabulary = Vocabulary()
+    detector.vocabulary.update(df).apply(df)
+    if not detector.is_fitted:
+        detector.fit_transformer(df)
+    return detector
+
+
+def apply_rules(df, rules):
+    """
+    Runs the RuleSet over df, records the deciding rule per row in 'rule'
+    and returns (decision, ml_rows): rule verdicts (1 flag, 0 clear, -1 none)
+    and the mask of rows still to be scored by the model.
+    """
+    with instrumentation.stage('rules', rows=len(df)):
+        decision, matched = rules.evaluate(df)
+    df['rule'] = rules.rule_names(matched)
+    return decision, decision < 0
+
+
+def _merge_rule_verdicts(df, decision, ml_rows):
+    """Rule-decided rows take the rule's verdict as ml_anomaly and have no anomaly_score."""
+    df['ml_anomaly'] = np.where(ml_rows, df['ml_anomaly'], decision).astype(np.int8)
+    df['anomaly_score'] = np.where(ml_rows, df['anomaly_score'], np.nan).astype(np.float32)
+    return df
+
+
+@instrumentation.instrumented('detection')
+def run_detection(df, detector=None, stats_store=None, warm_start_trees=0, rules=None):
+    """
+    Tuned Detection: More sensitive to catch anomalies.
+    Pass a fitted (or loaded) MLPatternDetector to score without refitting;
+    its saved vocabulary keeps Merchant_Enc codes stable across runs.
+    An unfitted detector (or None) is fitted on this batch first; a fitted one
+    first grows warm_start_trees new trees on this batch, if that is non-zero.
+    With a RuleSet, rows a rule decides skip the model (see apply_rules).
+    Pass an OnlineStatsStore to use running per-Merchant Group Z-Scores
+    instead of recomputing the mean/std over this batch alone.
+    """
     
     # PART 2: Statistical Engine
     # Lowered from 3 to 2.2 to catch more 'unusual' spending
-    z_scores = np.abs(stats.zscore(df['Amount_Num']))
-    df['stat_anomaly'] = (z_scores > 2.2).astype(int)
+    with instrumentation.stage('z_score', rows=len(df)):
+        if stats_store is not None:
+            df['stat_anomaly'] = StatisticalDetector(z_threshold=2.2).calculate_online_z_score(
+                stats_store, df['Merchant Group'], df['Amount_Num']).astype(np.int8)
+        else:
+            # Batch-wide mean/std, as scipy.stats.zscore (NaN-propagating, ddof=0), without importing scipy
+            df['stat_anomaly'] = z_score_flags(df['Amount_Num'], 2.2).astype(np.int8)
 
     # PART 3: ML Engine
-    le = LabelEncoder()
-    df['Merchant_Enc'] = le.fit_transform(df['Merchant Group'].astype(str))
+    detector = prepare_detector(df, detector)
+    df = encode_merchants(df, detector.vocabulary)
     
-    # Increased contamination to 0.1 (Top 10% of weird patterns)
-    model = IsolationForest(contamination=0.1, random_state=42)
-    features = df[['Amount_Num', 'Age', 'Merchant_Enc']].fillna(0)
-    df['ml_anomaly'] = [1 if x == -1 else 0 for x in model.fit_predict(features)]
-    
-    return df
+    # One float32 matrix in a single transform pass, used by both fit and score
+    features = detector.transform(df)
+    if not detector.is_fitted:
+        with instrumentation.stage('isolation_forest_fit', rows=len(features)):
+            detector.fit(features, strata=df['Merchant_Enc'])
+    elif warm_start_trees:
+        with instrumentation.stage('isolation_forest_fit', rows=len(features)):
+            detector.partial_fit(features, n_trees=warm_start_trees, strata=df['Merchant_Enc'])
+    if rules is None:
+        with instrumentation.stage('isolation_forest_score', rows=len(features)):
+            labels, scores = detector.score(features)
+        df['ml_anomaly'] = labels.astype(np.int8)
+        df['anomaly_score'] = scores.astype(np.float32)
+        return df
+
+    # Only the rows no rule settled go through the forest
+    decision, ml_rows = apply_rules(df, rules)
+    labels, scores = np.zeros(len(df), dtype=np.int8), np.full(len(df), np.nan, dtype=np.float32)
+    with instrumentation.stage('isolation_forest_score', rows=int(ml_rows.sum())):
+        if ml_rows.any():
+            labels[ml_rows], scores[ml_rows] = detector.score(features[ml_rows])
+    df['ml_anomaly'], df['anomaly_score'] = labels, scores
+    return _merge_rule_verdicts(df, decision, ml_rows)
+
+@instrumentation.instrumented('detection')
+def run_parallel_detection(df, detector=None, n_workers=None, rules=None):
+    """
+    Same output as run_detection, but the batch is sharded by a hash of
+    'Transaction ID' and scored across a process pool (see parallel_detection.py).
+    Tree building also uses every core when a new model has to be fitted.
+    With a RuleSet, only the rows no rule decides are scored by the workers.
+    """
+    detector = prepare_detector(df, detector, n_jobs=-1)
+    df = encode_merchants(df, detector.vocabulary)
+    features = detector.transform(df)
+    if not detector.is_fitted:
+        detector.fit(features, strata=df['Merchant_Enc'])
+
+    decision, ml_rows = apply_rules(df, rules) if rules is not None else (None, None)
+
+    stat_anomaly, ml_anomaly, anomaly_score = score_in_parallel(
+        features, df['Amount_Num'], detector, df['Transaction ID'], z_threshold=2.2, n_workers=n_workers,
+        ml_rows=ml_rows)
+    df['stat_anomaly'] = stat_anomaly.astype(np.int8)
+    df['ml_anomaly'] = ml_anomaly.astype(np.int8)
+    df['anomaly_score'] = anomaly_score.astype(np.float32)
+    return df if rules is None else _merge_rule_verdicts(df, decision, ml_rows)
 
 # ==========================================
 # PART 4, 5 & 6: SCORING & VALIDATION
 # ==========================================
-def run_scoring_and_audit(df):
+@instrumentation.instrumented('scoring')
+def run_scoring_and_audit(df, verbose=True):
     """Aggressive Tuning: Ensures alerts appear on the dashboard."""
     
     # Part 4: Scoring logic remains the same
@@ -64,10 +267,80 @@ def run_scoring_and_audit(df):
     
     # Part 6: Validation
     actual_fraud = len(df[(df['priority'] == 'High') & (df['Fraud'] == 1)])
-    print(f"✅ Audit Complete: Found {actual_fraud} verified fraud cases.")
+    if verbose:
+        print(f"✅ Audit Complete: Found {actual_fraud} verified fraud cases.")
     
     return df
 
+
+# ==========================================
+# STREAMING MODE (Parts 1-6, chunk by chunk)
+# ==========================================
+def load_checkpoint(cls, path, source):
+    """
+    The streaming state saved at path (a new cls() if there is none). A
+    checkpoint carries history over to the next extract, but one whose
+    position is this same source already has every row of it folded in:
+    rescanning the file from row 0 would count each row twice, so the state
+    starts fresh instead.
+    """
+    if not os.path.exists(path):
+        return cls()
+    state = cls.load(path)
+    if state.position is not None and state.position['source'] == source:
+        print(f"♻️ '{path}' already holds the {state.position['rows']} rows of this extract; starting fresh.")
+        return cls()
+    return state
+
+
+def run_streaming_pipeline(zip_path, output_path=None, chunksize=DEFAULT_CHUNKSIZE,
+                           stats_store=None, rollups=None, detector=None, rules=None, sink=None,
+                           velocity_state=None):
+    """
+    Runs ingestion, detection and scoring one chunk at a time and appends
+    each scored chunk to a ResultSink (replacing its previous results with
+    the first chunk) and/or the CSV at output_path, so peak memory is
+    bounded by chunksize rather than by the size of the extract.
+    With an OnlineStatsStore, Z-Scores use the running history of all chunks so far.
+    Velocity features carry over from chunk to chunk through velocity_state
+    (a fresh VelocityFeatureState if None), so each chunk sees its full history.
+    With a RollupStore, each scored chunk is folded into the dashboard aggregates.
+    Without a detector every chunk gets its own forest; with one, the first
+    chunk fits it and every later chunk adds WARM_START_TREES trees to it.
+    A RuleSet pre-filters every chunk (its hit counters accumulate).
+    """
+    summary = {'rows': 0, 'chunks': 0, 'high_alerts': 0, 'verified_fraud': 0}
+    if velocity_state is None:
+        velocity_state = VelocityFeatureState()
+
+    for chunk in iter_pipeline_chunks(zip_path, chunksize):
+        with instrumentation.stage('features', rows=len(chunk)):
+            chunk = add_transaction_features(chunk, state=velocity_state)
+        detected = run_detection(chunk, detector=detector, stats_store=stats_store,
+                                 warm_start_trees=WARM_START_TREES if detector is not None else 0, rules=rules)
+        scored = run_scoring_and_audit(detected, verbose=False)
+        high = scored['priority'] == 'High'
+
+        summary['rows'] += len(scored)
+        summary['high_alerts'] += int(high.sum())
+        summary['verified_fraud'] += int((high & (scored['Fraud'] == 1)).sum())
+        if rollups is not None:
+            rollups.update(scored)
+
+        first = summary['chunks'] == 0
+        if sink is not None:
+            with instrumentation.stage('output_sink', rows=len(scored)):
+                sink.append(scored, overwrite=first)
+        if output_path is not None:
+            # Header only on the first chunk, then append
+            with instrumentation.stage('output_csv', rows=len(scored)):
+                scored.to_csv(output_path, mode='w' if first else 'a', header=first, index=False)
+        summary['chunks'] += 1
+
+    print(f"✅ Audit Complete: Found {summary['verified_fraud']} verified fraud cases "
+          f"across {summary['chunks']} chunks ({summary['rows']} rows).")
+    return summary
+
 # ==========================================
 # MAIN EXECUTION (How it runs in VS Code)
 # ==========================================
@@ -76,18 +349,102 @@ if __name__ == "__main__":
     FILE_PATH = r"D:\anomaly detection project\credit_card_trans.zip"
     
     print("--- Starting Anomaly Detection System ---")
+
+    # Per-stage timing/memory report (pipeline_metrics.prom / .jsonl):
+    #   python main.py --metrics
+    if '--metrics' in sys.argv:
+        instrumentation.enable()
+
+    # Rule-based pre-filter, so only ambiguous transactions reach the model:
+    #   python main.py --rules
+    rules = RuleSet.load(RULES_FILE) if '--rules' in sys.argv else None
+
+    # Results go to the partitioned sink in RESULTS_DIR; the full frame (every
+    # intermediate column) is also written as CSV only on request:
+    #   python main.py --csv
+    csv_path = 'analyzed_data.csv' if '--csv' in sys.argv else None
+
+    # Streaming mode for extracts too large to hold in memory:
+    #   python main.py --stream
+    if '--stream' in sys.argv:
+        # Running statistics carry over to the next extract through the checkpoint file
+        source = file_hash(FILE_PATH)
+        store = load_checkpoint(OnlineStatsStore, STATS_FILE, source)
+        velocity = load_checkpoint(VelocityFeatureState, VELOCITY_FILE, source)
+        # The output file is rewritten, so the rollups are rebuilt chunk by chunk alongside it
+        rollups = RollupStore(ROLLUP_DIR)
+        detector = new_detector(n_jobs=-1)
+        summary = run_streaming_pipeline(FILE_PATH, output_path=csv_path, stats_store=store, rollups=rollups,
+                                         detector=detector, rules=rules, sink=ResultSink(RESULTS_DIR),
+                                         velocity_state=velocity)
+        if rules is not None:
+            print(rules.counters())
+        detector.save(MODEL_FILE)
+        store.position = velocity.position = {'source': source, 'rows': summary['rows']}
+        store.save(STATS_FILE)
+        velocity.save(VELOCITY_FILE)
+        rollups.save()
+        if instrumentation.is_enabled():
+            instrumentation.write_prometheus(METRICS_FILE)
+            instrumentation.write_json_lines(METRICS_LOG, append=False)
+        sys.exit(0)
     
+    # Cleaned and scored data are cached as Parquet keyed on the ZIP's hash.
+    # (Bump data_cache.CACHE_VERSION when the feature or scoring stages change.)
+    # Pass --no-cache to force a full re-parse and re-score.
+    cache = None if '--no-cache' in sys.argv else DatasetCache()
+
     # Step 1: Ingest
-    raw_data = run_pipeline(FILE_PATH)
+    raw_data = run_pipeline(FILE_PATH, cache=cache)
     
     if raw_data is not None:
-        # Step 2: Detect
-        detected_data = run_detection(raw_data)
-        
-        # Step 3: Score & Audit
-        final_data = run_scoring_and_audit(detected_data)
+        # Rule-filtered results are cached separately, per version of the rules file
+        scored_stage = 'scored' if rules is None else f"scored-rules-{file_hash(RULES_FILE)[:12]}"
+        final_data = cache.load(FILE_PATH, scored_stage) if cache is not None else None
+
+        if final_data is None:
+            # Step 1b: Per-customer velocity and country-mismatch features
+            with instrumentation.stage('features', rows=len(raw_data)):
+                raw_data = add_transaction_features(raw_data)
+
+            # Step 2: Detect (fit once, then persist the model for score-only jobs)
+            detector = new_detector(n_jobs=-1)
+            if '--parallel' in sys.argv:
+                # Shard scoring across all CPU cores (same results as the serial path)
+                detected_data = run_parallel_detection(raw_data, detector=detector, rules=rules)
+            else:
+                detected_data = run_detection(raw_data, detector=detector, rules=rules)
+            detector.save(MODEL_FILE)
+            
+            if rules is not None:
+                print(rules.counters())
+                # Rule-decided rows have no anomaly_score, so the model's score of every row is
+                # kept (and cached) with the results for the calibrator
+                with instrumentation.stage('calibration_scores', rows=len(detected_data)):
+                    _, model_scores = detector.score(detected_data)
+                detected_data['model_score'] = model_scores.astype(np.float32)
+
+            # Step 3: Score & Audit
+            final_data = downcast(run_scoring_and_audit(detected_data))
+            if cache is not None:
+                cache.save(final_data, FILE_PATH, scored_stage)
         
-        # Step 4: Save for Dashboard (Part 7)
-        final_data.to_csv('analyzed_data.csv', index=False)
-        print("📁 Success: Results saved to 'analyzed_data.csv'.")
-        print(final_data[['Transaction ID', 'Amount', 'risk_score', 'priority']].head(10))
\ No newline at end of file
+        # Step 4: Save for Dashboard (Part 7): this run's results replace the last run's in one commit
+        with instrumentation.stage('output_sink', rows=len(final_data)):
+            ResultSink(RESULTS_DIR).append(final_data, overwrite=True)
+        if csv_path is not None:
+            with instrumentation.stage('output_csv', rows=len(final_data)):
+                final_data.to_csv(csv_path, index=False)
+        with instrumentation.stage('rollups', rows=len(final_data)):
+            RollupStore(ROLLUP_DIR).update(final_data).save()
+        # The extract is labelled, so its Fraud column serves as the calibration labels
+        calibration_scores = final_data['model_score' if rules is not None else 'anomaly_score']
+        ThresholdCalibrator(calibration_scores, calibration_scores, final_data['Fraud']).save(CALIBRATION_FILE)
+        print(f"📁 Success: Results saved to '{RESULTS_DIR}/'{' and ' + repr(csv_path) if csv_path else ''} "
+              f"(rollups in '{ROLLUP_DIR}/').")
+        print(final_data[['Transaction ID', 'Amount', 'risk_score', 'priority']].head(10))
+
+        if instrumentation.is_enabled():
+            instrumentation.write_prometheus(METRICS_FILE)
+            instrumentation.write_json_lines(METRICS_LOG, append=False)
+            print(f"⏱️ Stage metrics written to '{METRICS_FILE}' and '{METRICS_LOG}'.")
@@ -4,37 +4,353 @@
 #=======================================================================================
 
 
+import copy
+import os
+import pickle
+from datetime import datetime
+
+import joblib
+import numpy as np
 import pandas as pd
-from sklearn.ensemble import IsolationForest
+
+from feature_transformer import FeatureTransformer
+from schema import Vocabulary, feature_matrix
+
+# Version of the saved model artifact layout; bump when the payload or the feature set changes
+MODEL_VERSION = 7
+
+# Rows per CompiledForest pass when scoring a loaded model (bounds the node-index temporaries)
+COMPILED_BLOCK_ROWS = 16_384
+
+# We select multiple features for pattern recognition
+# In a real bank, this would include: Amount, Time_of_Day, Distance_from_Home
+DEFAULT_FEATURES = ['amount', 'velocity_score', 'geo_score']
+
+
+def training_sample(n_rows, size, strata=None, seed=42):
+    """
+    Sorted row positions of a random training sample of about `size` rows.
+
+    With strata (one label per row, e.g. merchant codes), every stratum keeps
+    its share of the sample and at least one row, so small groups are not
+    lost; missing labels form a stratum of their own.
+    """
+    rng = np.random.default_rng(seed)
+    if size >= n_rows:
+        return np.arange(n_rows)
+    if strata is None:
+        return np.sort(rng.choice(n_rows, size, replace=False))
+
+    codes, _ = pd.factorize(np.asarray(strata), use_na_sentinel=False)
+    counts = np.bincount(codes)
+    quota = np.minimum(counts, np.maximum(1, np.round(counts * size / n_rows))).astype(np.int64)
+    # Shuffle, group by stratum (stable), then keep the first `quota` rows of each group
+    order = rng.permutation(n_rows)
+    order = order[np.argsort(codes[order], kind='stable')]
+    grouped = codes[order]
+    rank = np.arange(n_rows) - np.concatenate([[0], np.cumsum(counts)[:-1]])[grouped]
+    return np.sort(order[rank < quota[grouped]])
+
+
+class CompiledForest:
+    """
+    Flattened copy of a fitted IsolationForest for low-latency scoring.
+
+    sklearn's decision_function carries ~10 ms of fixed overhead per call (input
+    validation, joblib dispatch, one apply() per tree), which dominates when
+    scoring a handful of transactions. Here every tree's nodes are packed into
+    shared NumPy arrays and all trees are walked together, one level per step,
+    so a call costs roughly max_depth vectorized operations.
+    Scores match IsolationForest.decision_function.
+    """
+
+    def __init__(self, forest):
+        # Only reached with a fitted forest, so sklearn is already imported
+        from sklearn.ensemble._iforest import _average_path_length
+
+        offsets, node_count = [], 0
+        for est in forest.estimators_:
+            offsets.append(node_count)
+            node_count += est.tree_.node_count
+
+        self.roots = np.array(offsets, dtype=np.int64)
+        self.left = np.empty(node_count, dtype=np.int64)
+        self.right = np.empty(node_count, dtype=np.int64)
+        self.feature = np.empty(node_count, dtype=np.int64)
+        self.threshold = np.empty(node_count, dtype=np.float64)
+        self.missing_left = np.zeros(node_count, dtype=bool)
+        # Path length credited when a sample lands in a node (only read at leaves)
+        self.leaf_value = np.empty(node_count, dtype=np.float64)
+
+        subsample = forest._max_features != forest.n_features_in_
+        for est, features, start, depths, avg_lengths in zip(
+                forest.estimators_, forest.estimators_features_, offsets,
+                forest._decision_path_lengths, forest._average_path_length_per_tree):
+            tree = est.tree_
+            end = start + tree.node_count
+            is_leaf = tree.children_left < 0
+            self.left[start:end] = np.where(is_leaf, np.arange(tree.node_count), tree.children_left) + start
+            self.right[start:end] = np.where(is_leaf, np.arange(tree.node_count), tree.children_right) + start
+            local_feature = np.where(is_leaf, 0, tree.feature)
+            self.feature[start:end] = np.asarray(features)[local_feature] if subsample else local_feature
+            self.threshold[start:end] = np.where(is_leaf, np.inf, tree.threshold)
+            if hasattr(tree, 'missing_go_to_left'):
+                self.missing_left[start:end] = tree.missing_go_to_left.astype(bool)
+            self.leaf_value[start:end] = depths + avg_lengths - 1.0
+
+        self.max_depth = max(est.tree_.max_depth for est in forest.estimators_)
+        self.denominator = len(forest.estimators_) * _average_path_length([forest._max_samples])[0]
+        self.offset = forest.offset_
+
+    def decision_function(self, X):
+        """Same values as IsolationForest.decision_function (lower = more anomalous)."""
+        # Trees compare float32 inputs against float64 thresholds
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        rows = np.arange(len(X))[:, None]
+        nodes = np.broadcast_to(self.roots, (len(X), len(self.roots)))
+        for _ in range(self.max_depth):
+            values = X[rows, self.feature[nodes]]
+            go_left = (values <= self.threshold[nodes]) | (np.isnan(values) & self.missing_left[nodes])
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+
+        # cumsum adds the trees left to right, the same order sklearn accumulates them in
+        depths = np.cumsum(self.leaf_value[nodes], axis=1)[:, -1] if len(X) else np.zeros(0)
+        if self.denominator == 0:
+            return -np.ones(len(X)) - self.offset
+        return -(2 ** (-depths / self.denominator)) - self.offset
+
 
 class MLPatternDetector:
     """
     Part 3: ML-based Pattern Recognition Models
     Uses Isolation Forest to detect complex fraud patterns that statistical models miss.
+
+    Lifecycle: fit() once on a reference window, save()/load() the artifact,
+    then score() new transactions without retraining.
+
+    Large windows: with max_train_rows, fit() trains on a (optionally
+    stratified) sample of that many rows, so both tree building and the
+    contamination cut-off cost O(max_train_rows) instead of O(window);
+    partial_fit() adds trees grown on new data to the existing forest (warm
+    start), dropping the oldest trees beyond max_trees (n_estimators by
+    default), so a long stream keeps a fixed-size forest of its most recent
+    trees instead of growing the model and its scoring cost chunk by chunk.
+    The training scores are kept sorted, so set_contamination()
+    only moves the cut-off to a new percentile, without refitting.
+
+    With a FeatureTransformer, DataFrames are turned into the model matrix by
+    the transformer (fitted together with the forest and saved in the same
+    artifact) and self.features becomes its output column names.
+
+    sklearn is imported on first use of self.model, not with this module. A
+    saved artifact carries the compiled forest next to the pickled
+    IsolationForest, so load() + score() never import sklearn at all; the
+    forest is only unpickled when something fits or touches self.model.
     """
     
-    def __init__(self, contamination=0.05):
+    def __init__(self, contamination=0.05, features=None, n_jobs=None, transformer=None, max_train_rows=None,
+                 n_estimators=100, max_trees=None):
         # Contamination is the expected % of anomalies (e.g., 5% of transactions are fraud)
-        self.model = IsolationForest(contamination=contamination, random_state=42)
+        self.contamination = contamination
+        self.transformer = transformer
+        if transformer is not None and transformer.is_fitted:
+            features = transformer.feature_names
+        self.features = list(features or DEFAULT_FEATURES)
+        self.max_train_rows = max_train_rows
+        # n_jobs builds trees in parallel (-1 = all cores); it does not change the result
+        self.n_estimators = n_estimators
+        # Forest size cap for warm starts (partial_fit replaces the oldest trees beyond it)
+        self.max_trees = max_trees if max_trees is not None else n_estimators
+        self.n_jobs = n_jobs
+        self._model = None
+        # Pickled IsolationForest of a loaded artifact, until self.model is first used
+        self._model_payload = None
+        self.offset = None
+        self.is_fitted = False
+        self.trained_at = None
+        self.n_train = 0
+        # Sorted score_samples of the latest training rows: the contamination cut-off is a percentile of these
+        self.reference_scores = None
+        # Category vocabulary the encoded features were built with (saved with the model)
+        self.vocabulary = None
+        self._compiled = None
+
+    @property
+    def model(self):
+        """The sklearn IsolationForest (built, or unpickled from a loaded artifact, on first use)."""
+        if self._model is None:
+            if self._model_payload is not None:
+                self._model = pickle.loads(self._model_payload)
+                self._model_payload = None
+                self._model.set_params(contamination=self.contamination)
+                self._model.offset_ = self.offset
+            else:
+                from sklearn.ensemble import IsolationForest
+                self._model = IsolationForest(n_estimators=self.n_estimators, contamination=self.contamination,
+                                              random_state=42, n_jobs=self.n_jobs)
+        return self._model
+
+    @model.setter
+    def model(self, model):
+        self._model = model
+        self._model_payload = None
+
+    def fit_transformer(self, df):
+        """Fits the FeatureTransformer (if any) on df; fit() does this automatically for DataFrames."""
+        if self.transformer is not None:
+            self.features = self.transformer.fit(df).feature_names
+        return self
+
+    def transform(self, df):
+        """The float32 model matrix for a DataFrame (arrays pass through uncopied)."""
+        if isinstance(df, np.ndarray):
+            return np.asarray(df, dtype=np.float32)
+        if self.transformer is not None:
+            return self.transformer.transform(df)
+        return feature_matrix(df, self.features)
+
+    def _training_matrix(self, df, strata):
+        X = self.transform(df)
+        if self.max_train_rows is not None and len(X) > self.max_train_rows:
+            X = X[training_sample(len(X), self.max_train_rows, strata=strata)]
+        return X
+
+    def _grow(self, X, warm_start):
+        """Builds trees on X, then recomputes the reference scores and the cut-off over X."""
+        # Fitting with contamination='auto' skips sklearn's own scoring pass over X;
+        # the same percentile cut-off is derived from reference_scores below
+        self.model.set_params(contamination='auto', warm_start=warm_start)
+        self.model.fit(X)
+        self.model.set_params(contamination=self.contamination, warm_start=False)
+        self.reference_scores = np.sort(self.model.score_samples(X))
+        self.is_fitted = True
+        # The trees changed, so the compiled copy is rebuilt on next use
+        self._compiled = None
+        self.set_contamination(self.contamination)
+        self.trained_at = datetime.now().isoformat(timespec='seconds')
+
+    def fit(self, df, strata=None):
+        """
+        Fits the Isolation Forest on a reference window of transactions
+        (a DataFrame, or a matrix already produced by transform()).
+        strata (one label per row) stratifies the max_train_rows sample.
+        """
+        if isinstance(df, pd.DataFrame):
+            self.fit_transformer(df)
+        elif self.transformer is not None and not self.transformer.is_fitted:
+            raise ValueError("Fit the transformer (fit_transformer) before fitting on a matrix.")
+        # Fit the model: It builds random trees to isolate data points
+        X = self._training_matrix(df, strata)
+        self._grow(X, warm_start=False)
+        self.n_train = len(X)
+        return self
+
+    def partial_fit(self, df, n_trees=10, strata=None):
+        """
+        Warm start: adds n_trees trees grown on new transactions to the fitted
+        forest (older trees are kept as they are, up to max_trees in total: the
+        oldest ones beyond that are dropped first) and re-derives the
+        contamination cut-off from the new rows' scores. The transformer is not refitted.
+        """
+        if not self.is_fitted:
+            return self.fit(df, strata=strata)
+        X = self._training_matrix(df, strata)
+        n_trees = min(n_trees, self.max_trees)
+        overflow = len(self.model.estimators_) + n_trees - self.max_trees
+        if overflow > 0:
+            # Dropped before growing, so sklearn recomputes its per-tree path lengths for the kept trees
+            del self.model.estimators_[:overflow]
+            del self.model.estimators_features_[:overflow]
+        self.model.set_params(n_estimators=len(self.model.estimators_) + n_trees)
+        self._grow(X, warm_start=True)
+        self.n_train += len(X)
+        return self
+
+    def set_contamination(self, contamination):
+        """Moves the anomaly cut-off to a new contamination rate, without refitting."""
+        if self.reference_scores is None:
+            raise ValueError("MLPatternDetector must be fitted (or loaded) before setting contamination.")
+        self.contamination = contamination
+        # Same percentile IsolationForest.fit computes for a float contamination
+        self.offset = np.percentile(self.reference_scores, 100.0 * contamination)
+        if self._model is not None:
+            self._model.set_params(contamination=contamination)
+            self._model.offset_ = self.offset
+        if self._compiled is not None:
+            self._compiled.offset = self.offset
+        return self
+
+    def with_contamination(self, contamination):
+        """
+        A copy that flags at another contamination rate. The trees, transformer
+        and reference scores are shared, not copied, so this costs microseconds.
+        The forest's tree lists are copied, though: a warm start (partial_fit)
+        extends them in place, which would otherwise add the copy's new trees
+        to this detector too.
+        """
+        detector = copy.copy(self)
+        detector._model = copy.copy(self._model)
+        if detector._model is not None and hasattr(detector._model, 'estimators_'):
+            detector._model.estimators_ = list(detector._model.estimators_)
+            detector._model.estimators_features_ = list(detector._model.estimators_features_)
+        detector._compiled = copy.copy(self._compiled)
+        return detector.set_contamination(contamination)
+
+    def score(self, df):
+        """
+        Scores transactions with the fitted model in a single tree traversal.
+        Returns (labels, scores): labels are 1 for Anomaly / 0 for Normal and
+        scores are the decision_function values (lower = more suspicious).
+        """
+        if not self.is_fitted:
+            raise ValueError("MLPatternDetector must be fitted (or loaded) before scoring.")
+        X = self.transform(df)
+        if self._model is None:
+            # Loaded and not yet unpickled: the compiled forest gives the same scores without sklearn
+            compiled = self.compile()
+            scores = np.concatenate([compiled.decision_function(X[lo:lo + COMPILED_BLOCK_ROWS])
+                                     for lo in range(0, len(X), COMPILED_BLOCK_ROWS)] or [np.zeros(0)])
+        else:
+            scores = self.model.decision_function(X)
+        # IsolationForest.predict() is exactly decision_function < 0, so the label
+        # comes for free from the scores instead of walking the trees again
+        labels = (scores < 0).astype(int)
+        return labels, scores
+
+    def compile(self):
+        """
+        Returns a CompiledForest for latency-sensitive scoring of small batches
+        (see score_array). Rebuilt automatically after each fit/load.
+        """
+        if not self.is_fitted:
+            raise ValueError("MLPatternDetector must be fitted (or loaded) before compiling.")
+        if self._compiled is None:
+            self._compiled = CompiledForest(self.model)
+        return self._compiled
+
+    def score_array(self, X):
+        """
+        Like score(), but takes a plain 2-D array (columns in self.features order)
+        and uses the compiled forest, skipping DataFrame and sklearn overhead.
+        """
+        scores = self.compile().decision_function(X)
+        return (scores < 0).astype(int), scores
 
     def train_and_predict(self, df):
         """
         Trains the ML model on multi-dimensional data and flags pattern outliers.
+        Also stores 'anomaly_score', so get_anomaly_scores() is only needed for new data.
         """
-        # We select multiple features for pattern recognition
-        # In a real bank, this would include: Amount, Time_of_Day, Distance_from_Home
-        features = df[['amount', 'velocity_score', 'geo_score']]
-        
-        # Fit the model: It builds random trees to isolate data points
-        self.model.fit(features)
+        labels, scores = self.fit(df).score(df)
         
         # Predict: 
         #  1 = Normal (inside the dense clusters)
         # -1 = Anomaly (isolated early in the trees)
-        df['ml_prediction'] = self.model.predict(features)
+        df['ml_prediction'] = np.where(labels == 1, -1, 1)
         
-        # Convert -1/1 format to a more readable 1/0 (1 for Anomaly)
-        df['ml_anomaly'] = df['ml_prediction'].apply(lambda x: 1 if x == -1 else 0)
+        # 1/0 format is more readable (1 for Anomaly)
+        df['ml_anomaly'] = labels
+        df['anomaly_score'] = scores
         
         return df
 
@@ -42,11 +358,68 @@ class MLPatternDetector:
         """
         Returns a 'normality score'. Lower/negative scores indicate higher fraud risk.
         """
-        features = df[['amount', 'velocity_score', 'geo_score']]
         # Decision function returns the 'path length' to isolate the point
-        df['anomaly_score'] = self.model.decision_function(features)
+        _, df['anomaly_score'] = self.score(df)
         return df
 
+    def save(self, path):
+        """
+        Saves the fitted model and its metadata as a versioned joblib artifact.
+        """
+        if not self.is_fitted:
+            raise ValueError("Cannot save an unfitted MLPatternDetector.")
+        import sklearn
+
+        artifact = {
+            'model_version': MODEL_VERSION,
+            'sklearn_version': sklearn.__version__,
+            'contamination': self.contamination,
+            'features': self.features,
+            'trained_at': self.trained_at,
+            'n_train': self.n_train,
+            'max_train_rows': self.max_train_rows,
+            'max_trees': self.max_trees,
+            'reference_scores': self.reference_scores,
+            'vocabulary': self.vocabulary.to_dict() if self.vocabulary is not None else None,
+            'transformer': self.transformer.to_dict() if self.transformer is not None else None,
+            # Pickled separately, so loading the artifact does not import sklearn
+            'model': pickle.dumps(self.model, protocol=pickle.HIGHEST_PROTOCOL),
+            'compiled': self.compile(),
+        }
+        # Write then rename so a reader never sees a half-written artifact
+        tmp_path = f"{path}.tmp"
+        joblib.dump(artifact, tmp_path)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        """
+        Restores a detector saved with save(), ready to score() immediately
+        (through the saved compiled forest; see the class docstring).
+        """
+        artifact = joblib.load(path)
+        if artifact.get('model_version') != MODEL_VERSION:
+            raise ValueError(
+                f"Model artifact version {artifact.get('model_version')} is not supported "
+                f"(expected {MODEL_VERSION}). Please retrain."
+            )
+        transformer = (FeatureTransformer.from_dict(artifact['transformer'])
+                       if artifact['transformer'] is not None else None)
+        detector = cls(contamination=artifact['contamination'], features=artifact['features'],
+                       transformer=transformer, max_train_rows=artifact['max_train_rows'],
+                       max_trees=artifact['max_trees'])
+        detector._model_payload = artifact['model']
+        detector._compiled = artifact['compiled']
+        detector.offset = detector._compiled.offset
+        detector.is_fitted = True
+        detector.trained_at = artifact['trained_at']
+        detector.n_train = artifact['n_train']
+        detector.reference_scores = artifact['reference_scores']
+        if artifact['vocabulary'] is not None:
+            detector.vocabulary = Vocabulary.from_dict(artifact['vocabulary'])
+        return detector
+
 # --- Local Testing ---
 if __name__ == "__main__":
     # Create sample data with patterns
@@ -62,4 +435,11 @@ if __name__ == "__main__":
     results = ml_engine.train_and_predict(df_test)
     
     print("Part 3 - ML Pattern Recognition Results:")
-    print(results[['amount', 'velocity_score', 'ml_anomaly']])
\ No newline at end of file
+    print(results[['amount', 'velocity_score', 'ml_anomaly']])
+
+    # Fit once, score many: reload the saved artifact and score without retraining
+    ml_engine.save('ml_model_demo.joblib')
+    reloaded = MLPatternDetector.load('ml_model_demo.joblib')
+    labels, scores = reloaded.score(df_test)
+    print(f"\nReloaded model (trained {reloaded.trained_at}) flags: {labels.tolist()}")
+    os.remove('ml_model_demo.joblib')
\ No newline at end of file
@@ -0,0 +1,217 @@
+#Part 2 (Extension)
+# Online Statistics Engine
+# online_stats.py (Per-entity running mean/variance so single transactions get O(1) Z-Scores).
+#==============================================================================================
+
+import os
+
+import numpy as np
+import pandas as pd
+
+
+class OnlineStatsStore:
+    """
+    Part 2 Extension: Streaming Z-Score state per entity (card, merchant group, country...).
+
+    Exact mode (decay=None) uses Welford's running mean/variance and merges whole
+    batches with Chan's parallel formula. Decayed mode (0 < decay <= 1) keeps an
+    exponentially weighted mean/variance so old behaviour fades out.
+
+    State lives in flat NumPy arrays indexed by a slot per entity, which keeps it
+    compact and makes checkpointing a single np.savez call.
+    """
+
+    def __init__(self, decay=None, min_count=2, initial_capacity=1024):
+        if decay is not None and not 0 < decay <= 1:
+            raise ValueError("decay must be in (0, 1] or None.")
+        self.decay = decay
+        # Entities with fewer observations than this score as z = 0 (not enough history)
+        self.min_count = min_count
+        self._slots = {}
+        self._keys = []
+        self.count = np.zeros(initial_capacity, dtype=np.int64)
+        self.mean = np.zeros(initial_capacity, dtype=np.float64)
+        # Exact mode: sum of squared deviations (M2). Decayed mode: the variance itself.
+        self.m2 = np.zeros(initial_capacity, dtype=np.float64)
+        # {'source': file hash, 'rows': n} of the extract the state was last advanced over (set by the caller)
+        self.position = None
+
+    def __len__(self):
+        return len(self._keys)
+
+    # --- Slot management ---
+    def _slot(self, key):
+        key = str(key)
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = len(self._keys)
+            if slot == len(self.count):
+                self._grow()
+            self._slots[key] = slot
+            self._keys.append(key)
+        return slot
+
+    def _grow(self):
+        capacity = max(1, len(self.count)) * 2
+        for name in ('count', 'mean', 'm2'):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def _slots_for(self, keys):
+        # Factorize first so the dict is only consulted once per distinct entity
+        codes, uniques = pd.factorize(pd.Series(keys), use_na_sentinel=False)
+        unique_slots = np.fromiter((self._slot(k) for k in uniques), dtype=np.int64, count=len(uniques))
+        return unique_slots[codes]
+
+    def _known_slots(self, keys):
+        # Like _slots_for, but read-only: entities not seen yet get slot -1
+        codes, uniques = pd.factorize(pd.Series(keys), use_na_sentinel=False)
+        unique_slots = np.fromiter((self._slots.get(str(k), -1) for k in uniques), dtype=np.int64,
+                                   count=len(uniques))
+        return unique_slots[codes]
+
+    def _std(self, slots):
+        if self.decay is None:
+            var = np.divide(self.m2[slots], self.count[slots],
+                            out=np.zeros(len(slots)), where=self.count[slots] > 0)
+        else:
+            var = self.m2[slots]
+        return np.sqrt(var)
+
+    # --- Single event API (O(1) per transaction) ---
+    def score_one(self, key, x):
+        """Z-Score of x against the entity's current state, without learning from it."""
+        slot = self._slots.get(str(key))
+        if slot is None or self.count[slot] < self.min_count:
+            return 0.0
+        std = self._std(np.array([slot]))[0]
+        if std == 0:
+            return 0.0
+        return float((x - self.mean[slot]) / std)
+
+    def update_one(self, key, x):
+        """Scores x, then folds it into the entity's state. Returns the Z-Score."""
+        z = self.score_one(key, x)
+        slot = self._slot(key)
+        self.count[slot] += 1
+        if self.decay is None:
+            delta = x - self.mean[slot]
+            self.mean[slot] += delta / self.count[slot]
+            self.m2[slot] += delta * (x - self.mean[slot])
+        elif self.count[slot] == 1:
+            self.mean[slot] = x
+            self.m2[slot] = 0.0
+        else:
+            delta = x - self.mean[slot]
+            increment = self.decay * delta
+            self.mean[slot] += increment
+            self.m2[slot] = (1 - self.decay) * (self.m2[slot] + delta * increment)
+        return z
+
+    # --- Batch API (vectorized) ---
+    def score(self, keys, values):
+        """
+        Z-Scores for a batch against the current state (state is not modified;
+        unseen entities score 0 and are not added).
+        """
+        values = np.asarray(values, dtype=np.float64)
+        slots = self._known_slots(keys)
+        known = np.flatnonzero(slots >= 0)
+        slots = slots[known]
+        std = self._std(slots)
+        valid = (self.count[slots] >= self.min_count) & (std > 0)
+        z = np.zeros(len(values))
+        z[known] = np.divide(values[known] - self.mean[slots], std, out=np.zeros(len(slots)), where=valid)
+        return z
+
+    def update(self, keys, values):
+        """Folds a batch into the state. NaN values are skipped."""
+        values = np.asarray(values, dtype=np.float64)
+        keep = ~np.isnan(values)
+        keys = np.asarray(keys, dtype=object)[keep]
+        values = values[keep]
+        if len(values) == 0:
+            return self
+
+        if self.decay is not None:
+            # Exponential decay is order dependent, so apply events in sequence
+            for key, x in zip(keys, values):
+                self.update_one(key, x)
+            return self
+
+        # Chan et al. parallel merge of per-entity batch moments into the running state
+        slots = self._slots_for(keys)
+        unique_slots, inverse = np.unique(slots, return_inverse=True)
+        n_b = np.bincount(inverse).astype(np.float64)
+        mean_b = np.bincount(inverse, weights=values) / n_b
+        m2_b = np.bincount(inverse, weights=(values - mean_b[inverse]) ** 2)
+
+        n_a = self.count[unique_slots].astype(np.float64)
+        mean_a = self.mean[unique_slots]
+        n = n_a + n_b
+        delta = mean_b - mean_a
+
+        self.mean[unique_slots] = mean_a + delta * n_b / n
+        self.m2[unique_slots] += m2_b + delta ** 2 * n_a * n_b / n
+        self.count[unique_slots] += n_b.astype(np.int64)
+        return self
+
+    def score_and_update(self, keys, values):
+        """Scores a batch against the state before it, then learns from it."""
+        z = self.score(keys, values)
+        self.update(keys, values)
+        return z
+
+    # --- Checkpointing ---
+    def save(self, path):
+        """Writes the state to a .npz checkpoint (atomically, via a temp file)."""
+        n = len(self._keys)
+        tmp_path = f"{path}.tmp.npz"
+        position = self.position or {'source': '', 'rows': 0}
+        np.savez(tmp_path, keys=np.array(self._keys, dtype=str), count=self.count[:n],
+                 mean=self.mean[:n], m2=self.m2[:n],
+                 config=np.array([np.nan if self.decay is None else self.decay, self.min_count]),
+                 position_source=np.array(position['source']), position_rows=np.array(position['rows']))
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        """Restores a store written by save()."""
+        with np.load(path) as data:
+            decay, min_count = data['config']
+            keys = data['keys'].tolist()
+            store = cls(decay=None if np.isnan(decay) else float(decay),
+                        min_count=int(min_count), initial_capacity=max(1, len(keys)))
+            n = len(keys)
+            store.count[:n] = data['count']
+            store.mean[:n] = data['mean']
+            store.m2[:n] = data['m2']
+            if 'position_source' in data.files and str(data['position_source']):
+                store.position = {'source': str(data['position_source']), 'rows': int(data['position_rows'])}
+        store._keys = keys
+        store._slots = {key: slot for slot, key in enumerate(keys)}
+        return store
+
+
+# --- Local Testing ---
+if __name__ == "__main__":
+    rng = np.random.default_rng(42)
+    merchants = rng.choice(['Retail', 'Travel', 'Gaming'], 1000)
+    amounts = np.where(merchants == 'Travel', rng.normal(800, 100, 1000), rng.normal(60, 15, 1000))
+
+    store = OnlineStatsStore()
+    store.update(merchants, amounts)
+
+    # The same $900 is routine for Travel but extreme for Gaming
+    print("Part 2 Extension - Online Z-Scores per Merchant Group:")
+    for merchant in ['Travel', 'Gaming']:
+        print(f"{merchant:<7} $900 -> z = {store.score_one(merchant, 900):.2f}")
+
+    store.save('online_stats_demo.npz')
+    restored = OnlineStatsStore.load('online_stats_demo.npz')
+    print(f"Checkpoint restored {len(restored)} entities; "
+          f"Gaming z = {restored.score_one('Gaming', 900):.2f}")
+    os.remove('online_stats_demo.npz')
@@ -0,0 +1,354 @@
+#Part 1-5 (Replay)
+# Event-Time Replay Engine
+# replay.py (Feeds a labelled extract through Parts 1-5 as event-time micro-batches and measures lag and throughput).
+#==============================================================================================
+#
+# Usage:
+#   python replay.py                                   # as fast as possible, 1h windows
+#   python replay.py --speedup 3600                    # one event-time hour per wall-clock second
+#   python replay.py --checkpoint-dir replay_state     # checkpoint every 10 windows...
+#   python replay.py --checkpoint-dir replay_state --resume   # ...and carry on after a restart
+#
+# Each window is released when it closes on the replay clock (event time
+# divided by the speed-up). Lag is the wall time from that release to the
+# window's scored results, so it includes any time the window spent queued
+# behind slower ones; backlog is the number of released windows still waiting.
+
+import argparse
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import instrumentation
+from alert_scoring import AlertPrioritizer
+from case_manager import CaseManager
+from feature_engineering import VelocityFeatureState, add_transaction_features, event_time
+from main import MODEL_FILE, WARM_START_TREES, new_detector, run_detection, run_pipeline, run_scoring_and_audit
+from ml_model import MLPatternDetector
+from online_stats import OnlineStatsStore
+from result_sink import ResultSink
+from rules import RuleSet
+
+# Event-time length of one micro-batch (a pandas offset alias)
+DEFAULT_WINDOW = '1h'
+
+# Without a saved model, the forest is fitted on this much event time from the start of the
+# extract (a full day, so every hour of the daily cycle is in the reference)
+DEFAULT_WARMUP = '24h'
+
+# Windows between checkpoints
+DEFAULT_CHECKPOINT_EVERY = 10
+
+# Version of the checkpoint layout; bump when the state files change
+REPLAY_VERSION = 1
+
+_STATE_FILE = 'state.json'
+_MODEL_FILE = 'model.joblib'
+_STATS_FILE = 'online_stats.npz'
+_VELOCITY_FILE = 'velocity_state.npz'
+
+
+def order_by_event_time(df):
+    """Adds 'event_time' (Date + hour) and returns the rows in event-time order (ties keep file order)."""
+    df = df.copy()
+    df['event_time'] = event_time(df)
+    return df.sort_values('event_time', kind='stable').reset_index(drop=True)
+
+
+def micro_batches(df, window=DEFAULT_WINDOW):
+    """
+    Splits a frame in event-time order into (window_start, batch) pairs, one
+    per non-empty window, with the boundaries found in one vectorized pass.
+    """
+    starts = df['event_time'].dt.floor(window).to_numpy()
+    if not len(starts):
+        return
+    bounds = np.concatenate(([0], np.flatnonzero(starts[1:] != starts[:-1]) + 1, [len(starts)]))
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        yield pd.Timestamp(starts[lo]), df.iloc[lo:hi].reset_index(drop=True)
+
+
+class ReplayEngine:
+    """
+    Parts 1-5 under streaming conditions: every micro-batch gets incremental
+    velocity features (VelocityFeatureState), online Z-Scores (OnlineStatsStore),
+    the shared Isolation Forest (plus rules and warm-start trees, if enabled),
+    main.py's risk bands and, with a CaseManager, case creation.
+
+    speedup=None replays as fast as possible: every window is released as
+    soon as the previous one is done, so lag is pure processing time.
+
+    With a checkpoint_dir, the detector, statistics, velocity tail and replay
+    position are saved every checkpoint_every windows and at the end, and
+    ReplayEngine.resume() continues from the last checkpoint. With a
+    ResultSink, each scored window is appended as soon as it is done; on
+    resume, the rows the sink got after the checkpoint are dropped before
+    their windows are replayed again.
+    """
+
+    def __init__(self, detector, window=DEFAULT_WINDOW, speedup=None, stats_store=None, velocity_state=None,
+                 rules=None, case_manager=None, warm_start_trees=0, checkpoint_dir=None,
+                 checkpoint_every=DEFAULT_CHECKPOINT_EVERY, sink=None,
+                 clock=time.perf_counter, sleep=time.sleep):
+        if speedup is not None and speedup <= 0:
+            raise ValueError("speedup must be positive (or None for as fast as possible).")
+        self.detector = detector
+        self.window = window
+        self.speedup = speedup
+        self.stats_store = stats_store if stats_store is not None else OnlineStatsStore()
+        self.velocity_state = velocity_state if velocity_state is not None else VelocityFeatureState()
+        self.rules = rules
+        self.case_manager = case_manager
+        self.warm_start_trees = warm_start_trees
+        self.checkpoint_dir = checkpoint_dir
+        self.checkpoint_every = checkpoint_every
+        self.sink = sink
+        self.clock = clock
+        self.sleep = sleep
+        # First event-time window not yet processed (None = start of the extract)
+        self.position = None
+        self.batches = 0
+        self.rows = 0
+        self.batch_metrics = []
+        # Cases opened by the latest process() call
+        self._new_cases = 0
+
+    # --- Parts 1-5 for one micro-batch ---
+    def process(self, batch):
+        """Scores one micro-batch; returns it with main.py's columns (plus case counts in the metrics)."""
+        with instrumentation.stage('features', rows=len(batch)):
+            batch = add_transaction_features(batch, state=self.velocity_state)
+        detected = run_detection(batch, detector=self.detector, stats_store=self.stats_store,
+                                 warm_start_trees=self.warm_start_trees, rules=self.rules)
+        scored = run_scoring_and_audit(detected, verbose=False)
+        if self.case_manager is not None:
+            alerts = AlertPrioritizer().calculate_priority(pd.DataFrame({
+                'transaction_id': scored['Transaction ID'],
+                'amount': scored['Amount_Num'].fillna(0),
+                'anomaly_score': scored['anomaly_score'],
+                'stat_anomaly': scored['stat_anomaly'],
+            }), sort=False)
+            # Rows a rule decided have no anomaly_score to prioritize on: a flagging
+            # rule's verdict escalates them as HIGH, with main.py's risk_score
+            rule_flagged = (scored['anomaly_score'].isna() & (scored['ml_anomaly'] == 1)).to_numpy()
+            if rule_flagged.any():
+                alerts.loc[rule_flagged, 'priority_level'] = '🟠 HIGH'
+                alerts.loc[rule_flagged, 'final_risk_score'] = scored['risk_score'].to_numpy()[rule_flagged]
+            # Compact cases that reference the transaction; alerts on still-open transactions reuse their case
+            with instrumentation.stage('case_creation', rows=len(alerts)):
+                cases = self.case_manager.bulk_create_cases(alerts, model_version=self.detector.trained_at)
+            self._new_cases = int(cases['created'].sum())
+        return scored
+
+    # --- Replay loop ---
+    def run(self, events, max_batches=None):
+        """
+        Replays events (a frame with 'event_time', see order_by_event_time)
+        from the current position and returns the run summary; per-window
+        figures are in metrics().
+        """
+        if self.position is not None:
+            events = events[events['event_time'] >= self.position]
+        windows = list(micro_batches(events, self.window))
+        if max_batches is not None:
+            windows = windows[:max_batches]
+        if not windows:
+            return self.summary()
+
+        step = pd.Timedelta(self.window)
+        origin_event = windows[0][0]
+        origin_wall = self.clock()
+        # Wall-clock second at which each window closes on the replay clock
+        release_at = np.array([origin_wall + (start + step - origin_event).total_seconds() / self.speedup
+                               for start, _ in windows]) if self.speedup else None
+
+        for i, (start, batch) in enumerate(windows):
+            if release_at is not None:
+                wait = release_at[i] - self.clock()
+                if wait > 0:
+                    self.sleep(wait)
+                released = release_at[i]
+            else:
+                released = self.clock()
+
+            began = self.clock()
+            with instrumentation.stage('replay_batch', rows=len(batch)):
+                scored = self.process(batch)
+                self._write(scored)
+            done = self.clock()
+
+            self.position = start + step
+            self.batches += 1
+            self.rows += len(scored)
+            self.batch_metrics.append({
+                'window_start': start,
+                'rows': len(scored),
+                'high_alerts': int((scored['priority'] == 'High').sum()),
+                'new_cases': self._new_cases,
+                'processing_s': done - began,
+                'lag_s': done - released,
+                'backlog': int(np.searchsorted(release_at, done, side='right') - i - 1)
+                           if release_at is not None else len(windows) - i - 1,
+                'events_per_s': len(scored) / max(done - began, 1e-9),
+            })
+            if self.checkpoint_dir and self.batches % self.checkpoint_every == 0:
+                self.checkpoint()
+
+        if self.checkpoint_dir:
+            self.checkpoint()
+        self._wall_s = self.clock() - origin_wall
+        return self.summary()
+
+    def _write(self, scored):
+        if self.sink is not None:
+            with instrumentation.stage('output_sink', rows=len(scored)):
+                self.sink.append(scored)
+
+    def metrics(self):
+        """One row per replayed window: rows, processing time, lag, backlog and throughput."""
+        return pd.DataFrame(self.batch_metrics)
+
+    def summary(self):
+        """
+        Sustained throughput and lag over the replayed windows. In paced mode,
+        recovery_s is how long the worst backlog took to drain (None if it
+        never did before the end of the replay).
+        """
+        metrics = self.metrics()
+        if metrics.empty:
+            return {'batches': 0, 'rows': 0}
+        busy = metrics['processing_s'].sum()
+        summary = {
+            'window': self.window,
+            'speedup': self.speedup,
+            'batches': len(metrics),
+            'rows': int(metrics['rows'].sum()),
+            'wall_s': round(getattr(self, '_wall_s', busy), 3),
+            'busy_s': round(busy, 3),
+            'sustained_events_per_s': round(metrics['rows'].sum() / max(busy, 1e-9), 1),
+            'lag_p50_s': round(metrics['lag_s'].quantile(0.5), 4),
+            'lag_p95_s': round(metrics['lag_s'].quantile(0.95), 4),
+            'lag_max_s': round(metrics['lag_s'].max(), 4),
+            'high_alerts': int(metrics['high_alerts'].sum()),
+        }
+        if self.speedup:
+            peak = int(metrics['backlog'].idxmax())
+            drained = metrics.index[(metrics.index > peak) & (metrics['backlog'] == 0)]
+            done_at = metrics['lag_s'] + (metrics['window_start'] - metrics['window_start'].iloc[0]
+                                          + pd.Timedelta(self.window)).dt.total_seconds() / self.speedup
+            summary['max_backlog'] = int(metrics['backlog'].max())
+            summary['recovery_s'] = (0.0 if summary['max_backlog'] == 0 else
+                                     round(done_at[drained[0]] - done_at[peak], 3) if len(drained) else None)
+        return summary
+
+    # --- Checkpointing ---
+    def checkpoint(self):
+        """
+        Writes the detector, statistics, velocity tail and replay position to
+        checkpoint_dir. The files go to a sibling temp directory that then
+        replaces the old checkpoint, so a crash never leaves a mix of two.
+        """
+        tmp_dir, old_dir = f"{self.checkpoint_dir}.tmp", f"{self.checkpoint_dir}.old"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        if self.detector.is_fitted:
+            self.detector.save(os.path.join(tmp_dir, _MODEL_FILE))
+        self.stats_store.save(os.path.join(tmp_dir, _STATS_FILE))
+        self.velocity_state.save(os.path.join(tmp_dir, _VELOCITY_FILE))
+        with open(os.path.join(tmp_dir, _STATE_FILE), 'w') as f:
+            json.dump({
+                'replay_version': REPLAY_VERSION,
+                'window': self.window,
+                'position': self.position.isoformat() if self.position is not None else None,
+                'batches': self.batches,
+                'rows': self.rows,
+                'saved_at': datetime.now().isoformat(timespec='seconds'),
+            }, f, indent=2)
+
+        if os.path.exists(self.checkpoint_dir):
+            shutil.rmtree(old_dir, ignore_errors=True)
+            os.replace(self.checkpoint_dir, old_dir)
+        os.replace(tmp_dir, self.checkpoint_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+        return self.checkpoint_dir
+
+    @classmethod
+    def resume(cls, checkpoint_dir, detector=None, **kwargs):
+        """
+        An engine restored from checkpoint_dir (or from the previous checkpoint
+        if a crash interrupted the swap). A detector passed in is only used
+        when the checkpoint has none. With a sink, the rows appended after the
+        checkpoint (event time >= its position) are removed, so the windows
+        replayed again are not stored twice.
+        """
+        path = checkpoint_dir if os.path.exists(checkpoint_dir) else f"{checkpoint_dir}.old"
+        with open(os.path.join(path, _STATE_FILE)) as f:
+            state = json.load(f)
+        if state.get('replay_version') != REPLAY_VERSION:
+            raise ValueError(f"Replay checkpoint version {state.get('replay_version')} is not supported "
+                             f"(expected {REPLAY_VERSION}).")
+        if os.path.exists(os.path.join(path, _MODEL_FILE)):
+            detector = MLPatternDetector.load(os.path.join(path, _MODEL_FILE))
+        kwargs.setdefault('window', state['window'])
+        engine = cls(detector, checkpoint_dir=checkpoint_dir,
+                     stats_store=OnlineStatsStore.load(os.path.join(path, _STATS_FILE)),
+                     velocity_state=VelocityFeatureState.load(os.path.join(path, _VELOCITY_FILE)), **kwargs)
+        engine.position = pd.Timestamp(state['position']) if state['position'] else None
+        engine.batches = state['batches']
+        engine.rows = state['rows']
+        if engine.sink is not None and engine.position is not None:
+            engine.sink.truncate(engine.position)
+        return engine
+
+
+def warmed_up_detector(events, warmup=DEFAULT_WARMUP):
+    """A detector fitted on the first `warmup` of event time (the replay still scores those rows)."""
+    head = events[events['event_time'] < events['event_time'].iloc[0] + pd.Timedelta(warmup)].copy()
+    detector = new_detector()
+    run_detection(add_transaction_features(head), detector=detector)
+    return detector
+
+
+# --- Local Testing ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Event-time replay of an extract through Parts 1-5")
+    parser.add_argument('--zip', default='credit_card_trans.zip')
+    parser.add_argument('--window', default=DEFAULT_WINDOW, help="event-time length of a micro-batch")
+    parser.add_argument('--speedup', type=float, help="event-time seconds per wall second (default: as fast as possible)")
+    parser.add_argument('--max-batches', type=int)
+    parser.add_argument('--model', default=MODEL_FILE, help="saved detector; fitted on --warmup if missing")
+    parser.add_argument('--warmup', default=DEFAULT_WARMUP)
+    parser.add_argument('--warm-start', action='store_true', help=f"grow {WARM_START_TREES} trees per window")
+    parser.add_argument('--rules', help="rules file applied before the forest")
+    parser.add_argument('--cases-db', help="open cases for CRITICAL/HIGH alerts in this database")
+    parser.add_argument('--checkpoint-dir')
+    parser.add_argument('--checkpoint-every', type=int, default=DEFAULT_CHECKPOINT_EVERY)
+    parser.add_argument('--resume', action='store_true', help="continue from --checkpoint-dir")
+    parser.add_argument('--results', help="append the scored windows to a ResultSink in this directory")
+    parser.add_argument('--report', help="write the per-window metrics to this CSV")
+    args = parser.parse_args()
+
+    events = order_by_event_time(run_pipeline(args.zip))
+    options = dict(speedup=args.speedup, rules=RuleSet.load(args.rules) if args.rules else None,
+                   case_manager=CaseManager(args.cases_db) if args.cases_db else None,
+                   warm_start_trees=WARM_START_TREES if args.warm_start else 0,
+                   checkpoint_every=args.checkpoint_every,
+                   sink=ResultSink(args.results) if args.results else None)
+
+    if args.resume and args.checkpoint_dir and (os.path.exists(args.checkpoint_dir)
+                                                or os.path.exists(f"{args.checkpoint_dir}.old")):
+        engine = ReplayEngine.resume(args.checkpoint_dir, **options)
+        print(f"Resuming at {engine.position} after {engine.batches} windows ({engine.rows} rows).")
+    else:
+        detector = (MLPatternDetector.load(args.model) if os.path.exists(args.model)
+                    else warmed_up_detector(events, args.warmup))
+        engine = ReplayEngine(detector, window=args.window, checkpoint_dir=args.checkpoint_dir, **options)
+
+    print(json.dumps(engine.run(events, max_batches=args.max_batches), indent=2))
+    if args.report:
+        engine.metrics().to_csv(args.report, index=False)
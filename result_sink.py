@@ -0,0 +1,296 @@
+#Part 7 (Extension)
+# Partitioned Results Sink
+# result_sink.py (Appends scored batches as Parquet partitioned by date and priority, with atomic commits and pushdown reads).
+#==============================================================================================
+#
+# Layout (Hive-style, so pyarrow/duckdb/spark can also read it directly):
+#
+#   results/_manifest.json                                   committed files + per-file time range
+#   results/date=2020-10-13/priority=High/part-000007-0.parquet
+#
+# A batch is written to hidden temp files, renamed into place, and only then
+# listed in the manifest, which is replaced atomically. Readers go through
+# the manifest, so they never see part of a batch, and a crashed append
+# leaves only unlisted files behind (removed by the next clear or compact).
+# One writer at a time; any number of readers.
+
+import json
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from feature_engineering import event_time
+
+# The columns kept from a scored batch (the rest of main.py's frame are intermediate features)
+RESULT_COLUMNS = ['Transaction ID', 'event_time', 'Date', 'Time', 'Amount', 'Amount_Num', 'Merchant Group',
+                  'Country of Transaction', 'Bank', 'stat_anomaly', 'ml_anomaly', 'anomaly_score', 'rule',
+                  'risk_score', 'priority', 'Fraud']
+
+# main.py's risk bands, in order (the priority partition values)
+PRIORITY_ORDER = ['Low', 'Medium', 'High']
+
+MANIFEST_FILE = '_manifest.json'
+
+SINK_VERSION = 1
+
+_PARTITIONING = ds.partitioning(pa.schema([('date', pa.string()), ('priority', pa.string())]), flavor='hive')
+
+
+class ResultSink:
+    """
+    Part 7 Extension: Append-only, partitioned store of scored transactions.
+
+    append() writes one file per (date, priority) present in the batch.
+    read() prunes whole files with the partition values and the time range
+    kept in the manifest, then pushes the remaining filters down to
+    pyarrow, which skips row groups by their statistics and only decodes
+    the requested columns.
+    """
+
+    def __init__(self, root='results', columns=RESULT_COLUMNS, time_col='event_time', priority_col='priority'):
+        self.root = root
+        self.columns = list(columns)
+        self.time_col = time_col
+        self.priority_col = priority_col
+        self.manifest = self._load_manifest()
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.root, MANIFEST_FILE)
+
+    def _load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {'version': SINK_VERSION, 'next_part': 0, 'columns': None, 'files': []}
+        with open(self.manifest_path) as f:
+            manifest = json.load(f)
+        if manifest.get('version') != SINK_VERSION:
+            raise ValueError(f"Result sink version {manifest.get('version')} is not supported "
+                             f"(expected {SINK_VERSION}).")
+        return manifest
+
+    def _commit(self, manifest):
+        """Atomically replaces the manifest: the moment new files become visible (or old ones disappear)."""
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+        self.manifest = manifest
+
+    def __len__(self):
+        return sum(entry['rows'] for entry in self.manifest['files'])
+
+    # --- Writing ---
+    def _result_frame(self, df, columns):
+        if self.time_col not in df and {'Date', 'Time'} <= set(df.columns):
+            df = df.assign(**{self.time_col: event_time(df)})
+        # The first batch fixes the column set, so every file has the same schema
+        columns = columns or [col for col in self.columns if col in df]
+        return df.reindex(columns=columns), columns
+
+    def append(self, df, overwrite=False):
+        """
+        Writes the result columns of a scored batch; returns the number of files
+        committed. With overwrite, the same commit also drops everything
+        written before, so readers switch from the old results to the new ones at once.
+        """
+        if df.empty and not overwrite:
+            return 0
+        results, columns = self._result_frame(df, None if overwrite else self.manifest['columns'])
+        dates = pd.to_datetime(results[self.time_col]).dt.strftime('%Y-%m-%d').fillna('unknown')
+        priorities = results[self.priority_col].astype(object).fillna('unknown').astype(str)
+
+        part = self.manifest['next_part']
+        partitions = results.groupby([dates, priorities], sort=True).indices
+        written = []
+        try:
+            for i, ((date, priority), rows) in enumerate(partitions.items()):
+                directory = os.path.join(f"date={date}", f"priority={priority}")
+                path = os.path.join(directory, f"part-{part:06d}-{i}.parquet")
+                os.makedirs(os.path.join(self.root, directory), exist_ok=True)
+                chunk = results.iloc[rows]
+                tmp_path = os.path.join(self.root, directory, f".part-{part:06d}-{i}.tmp")
+                # The priority is the partition value (in the path), so it isn't repeated in the file
+                pq.write_table(pa.Table.from_pandas(chunk.drop(columns=[self.priority_col]), preserve_index=False),
+                               tmp_path)
+                times = pd.to_datetime(chunk[self.time_col])
+                written.append({'path': path, 'date': date, 'priority': priority, 'rows': len(chunk),
+                                'min_time': None if times.isna().all() else times.min().isoformat(),
+                                'max_time': None if times.isna().all() else times.max().isoformat(),
+                                'tmp_path': tmp_path})
+            for entry in written:
+                os.replace(entry.pop('tmp_path'), os.path.join(self.root, entry['path']))
+        except Exception:
+            for entry in written:
+                for path in (entry.get('tmp_path'), os.path.join(self.root, entry['path'])):
+                    if path and os.path.exists(path):
+                        os.remove(path)
+            raise
+
+        replaced = [entry['path'] for entry in self.manifest['files']] if overwrite else []
+        self._commit({**self.manifest, 'next_part': part + 1, 'columns': columns,
+                      'files': written if overwrite else self.manifest['files'] + written})
+        if overwrite:
+            for path in replaced:
+                os.remove(os.path.join(self.root, path))
+            self._remove_orphans()
+        return len(written)
+
+    def clear(self):
+        """Empties the sink (an empty manifest is committed first, then the files are deleted)."""
+        old_files = [entry['path'] for entry in self.manifest['files']]
+        self._commit({'version': SINK_VERSION, 'next_part': self.manifest['next_part'], 'columns': None, 'files': []})
+        for path in old_files:
+            full_path = os.path.join(self.root, path)
+            if os.path.exists(full_path):
+                os.remove(full_path)
+        self._remove_orphans()
+        return self
+
+    def compact(self):
+        """
+        Rewrites every partition holding several files (e.g. one per streaming
+        batch) as a single file, in one manifest commit.
+        """
+        by_partition = {}
+        for entry in self.manifest['files']:
+            by_partition.setdefault((entry['date'], entry['priority']), []).append(entry)
+
+        part = self.manifest['next_part']
+        files, replaced = [], []
+        for (date, priority), entries in by_partition.items():
+            if len(entries) == 1:
+                files.extend(entries)
+                continue
+            table = pa.concat_tables([pq.read_table(os.path.join(self.root, entry['path']), partitioning=None)
+                                      for entry in entries], promote_options='default')
+            directory = os.path.join(f"date={date}", f"priority={priority}")
+            path = os.path.join(directory, f"part-{part:06d}-c.parquet")
+            tmp_path = os.path.join(self.root, directory, f".part-{part:06d}-c.tmp")
+            pq.write_table(table, tmp_path)
+            os.replace(tmp_path, os.path.join(self.root, path))
+            times = [entry[key] for entry in entries for key in ('min_time', 'max_time') if entry[key]]
+            files.append({'path': path, 'date': date, 'priority': priority, 'rows': table.num_rows,
+                          'min_time': min(times) if times else None, 'max_time': max(times) if times else None})
+            replaced.extend(entry['path'] for entry in entries)
+
+        self._commit({**self.manifest, 'next_part': part + 1, 'files': files})
+        for path in replaced:
+            os.remove(os.path.join(self.root, path))
+        self._remove_orphans()
+        return self
+
+    def truncate(self, since):
+        """
+        Drops every row with event time >= since, in one manifest commit: files
+        entirely at or after since are removed and files straddling it are
+        rewritten without those rows. Used to undo appends made after a
+        checkpoint (see ReplayEngine.resume). Rows with no event time are kept.
+        """
+        since = pd.Timestamp(since)
+        part = self.manifest['next_part']
+        files, replaced = [], []
+        for i, entry in enumerate(self.manifest['files']):
+            if entry['min_time'] is None or pd.Timestamp(entry['max_time']) < since:
+                files.append(entry)
+                continue
+            replaced.append(entry['path'])
+            if pd.Timestamp(entry['min_time']) >= since:
+                continue
+            table = pq.read_table(os.path.join(self.root, entry['path']), partitioning=None)
+            table = table.filter(ds.field(self.time_col) < pa.scalar(since.to_datetime64()))
+            directory = os.path.dirname(entry['path'])
+            path = os.path.join(directory, f"part-{part:06d}-t{i}.parquet")
+            tmp_path = os.path.join(self.root, directory, f".part-{part:06d}-t{i}.tmp")
+            pq.write_table(table, tmp_path)
+            os.replace(tmp_path, os.path.join(self.root, path))
+            times = table.column(self.time_col).to_pandas()
+            files.append({**entry, 'path': path, 'rows': table.num_rows,
+                          'max_time': times.max().isoformat()})
+
+        if not replaced:
+            return self
+        self._commit({**self.manifest, 'next_part': part + 1, 'files': files})
+        for path in replaced:
+            os.remove(os.path.join(self.root, path))
+        self._remove_orphans()
+        return self
+
+    def _remove_orphans(self):
+        """Deletes leftovers of interrupted appends (temp files and files missing from the manifest)."""
+        listed = {os.path.normpath(entry['path']) for entry in self.manifest['files']}
+        for directory, _, names in os.walk(self.root, topdown=False):
+            for name in names:
+                path = os.path.normpath(os.path.relpath(os.path.join(directory, name), self.root))
+                if name.startswith('.part-') or (name.startswith('part-') and path not in listed):
+                    os.remove(os.path.join(directory, name))
+            # Partition directories left empty
+            if directory != self.root and not os.listdir(directory):
+                os.rmdir(directory)
+
+    # --- Reading ---
+    def latest_time(self):
+        """Latest event time in the sink (None if empty), e.g. to read "the last 24h" of a replayed extract."""
+        times = [entry['max_time'] for entry in self.manifest['files'] if entry['max_time']]
+        return pd.Timestamp(max(times)) if times else None
+
+    def _files(self, priority, start, end):
+        """Manifest entries that can hold matching rows (partition and time-range pruning)."""
+        priorities = None if priority is None else {priority} if isinstance(priority, str) else set(priority)
+        start_day = None if start is None else start.strftime('%Y-%m-%d')
+        end_day = None if end is None else end.strftime('%Y-%m-%d')
+        selected = []
+        for entry in self.manifest['files']:
+            if priorities is not None and entry['priority'] not in priorities:
+                continue
+            if entry['date'] != 'unknown':
+                if (start_day is not None and entry['date'] < start_day) or (end_day is not None and entry['date'] > end_day):
+                    continue
+            if entry['max_time'] and start is not None and pd.Timestamp(entry['max_time']) < start:
+                continue
+            if entry['min_time'] and end is not None and pd.Timestamp(entry['min_time']) >= end:
+                continue
+            selected.append(entry)
+        return selected
+
+    def read(self, columns=None, priority=None, start=None, end=None, since=None, filters=None):
+        """
+        Matching rows as a DataFrame.
+        priority: one label or a list; start/end: event-time range [start, end);
+        since: a duration back from latest_time() (e.g. '24h'), instead of start;
+        filters: extra row filters in pandas/pyarrow form, e.g. [('risk_score', '>=', 60)].
+        """
+        if since is not None:
+            latest = self.latest_time()
+            start = None if latest is None else latest - pd.Timedelta(since)
+        start = None if start is None else pd.Timestamp(start)
+        end = None if end is None else pd.Timestamp(end)
+
+        entries = self._files(priority, start, end)
+        wanted = list(columns) if columns is not None else self.manifest['columns'] or []
+        if not entries:
+            return pd.DataFrame(columns=wanted)
+
+        dataset = ds.dataset([os.path.join(self.root, entry['path']) for entry in entries], format='parquet',
+                             partitioning=_PARTITIONING, partition_base_dir=self.root)
+        expression = None
+        conditions = []
+        if start is not None:
+            conditions.append(ds.field(self.time_col) >= pa.scalar(start.to_datetime64()))
+        if end is not None:
+            conditions.append(ds.field(self.time_col) < pa.scalar(end.to_datetime64()))
+        if filters:
+            conditions.append(pq.filters_to_expression(filters))
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+
+        # The priority column is restored from the partition path
+        stored = [col for col in wanted if col != self.priority_col]
+        df = dataset.to_table(columns=stored + ['priority'], filter=expression).to_pandas()
+        priority = df.pop('priority')
+        df[self.priority_col] = (pd.Categorical(priority, categories=PRIORITY_ORDER)
+                                 if set(priority.unique()) <= set(PRIORITY_ORDER) else priority)
+        return df[wanted]
@@ -0,0 +1,206 @@
+#Part 7 (Extension)
+# Dashboard Rollups
+# rollups.py (Incrementally maintained aggregates and histograms so dashboard charts never scan raw rows).
+#==============================================================================================
+
+import os
+
+import numpy as np
+import pandas as pd
+
+# Rollup name -> column of analyzed_data it groups by
+ROLLUP_DIMENSIONS = {
+    'merchant': 'Merchant Group',
+    'country': 'Country of Transaction',
+    'bank': 'Bank',
+    'hour': 'Time',
+    'day': 'Date',
+}
+
+# Fixed bin edges, so histograms from different batches can simply be added
+RISK_BINS = np.linspace(0, 100, 21)
+AMOUNT_BINS = np.concatenate([[0.0], np.logspace(0, 5, 26)])  # £0, £1 ... £100k (larger amounts go in the last bin)
+
+MEASURES = ['count', 'risk_sum', 'amount_sum', 'high_alerts', 'fraud']
+
+
+class RollupStore:
+    """
+    Part 7 Extension: Pre-aggregated views of the scored transactions.
+
+    Every rollup holds only additive measures (counts and sums), so a new batch
+    is folded in with a groupby over that batch alone plus an index-aligned add.
+    Averages are derived at read time. Dashboards read these small tables,
+    whose size depends on the number of merchants/countries/bins, not on rows.
+    """
+
+    def __init__(self, directory='rollups', risk_col='risk_score', amount_col='Amount_Num',
+                 priority_col='priority', high_label='High', fraud_col='Fraud'):
+        self.directory = directory
+        self.risk_col = risk_col
+        self.amount_col = amount_col
+        self.priority_col = priority_col
+        self.high_label = high_label
+        self.fraud_col = fraud_col
+        self.tables = {}
+        self.risk_hist = np.zeros(len(RISK_BINS) - 1, dtype=np.int64)
+        self.amount_hist = np.zeros(len(AMOUNT_BINS) - 1, dtype=np.int64)
+        self.density = np.zeros((len(AMOUNT_BINS) - 1, len(RISK_BINS) - 1), dtype=np.int64)
+
+    def reset(self):
+        """Drops all aggregates (used when the full output is rebuilt)."""
+        self.__init__(self.directory, self.risk_col, self.amount_col, self.priority_col,
+                      self.high_label, self.fraud_col)
+        return self
+
+    def update(self, df):
+        """Folds one batch of scored rows into every rollup and histogram."""
+        if df.empty:
+            return self
+        risk = df[self.risk_col].astype(np.float64)
+        amount = df[self.amount_col].astype(np.float64)
+        measures = pd.DataFrame({
+            'count': 1,
+            'risk_sum': risk.fillna(0),
+            'amount_sum': amount.fillna(0),
+            'high_alerts': (np.asarray(df[self.priority_col], dtype=object) == self.high_label).astype(np.int64),
+            'fraud': df[self.fraud_col].fillna(0).astype(np.int64) if self.fraud_col in df else 0,
+        }, index=df.index)
+
+        for name, col in ROLLUP_DIMENSIONS.items():
+            if col not in df:
+                continue
+            keys = df[col] if pd.api.types.is_numeric_dtype(df[col]) else df[col].astype(str)
+            batch = measures.groupby(keys.to_numpy(), sort=False).sum()
+            current = self.tables.get(name)
+            self.tables[name] = batch if current is None else current.add(batch, fill_value=0)
+
+        valid = risk.notna() & amount.notna()
+        r = risk[valid].clip(RISK_BINS[0], RISK_BINS[-1]).to_numpy()
+        a = amount[valid].clip(AMOUNT_BINS[0], AMOUNT_BINS[-1]).to_numpy()
+        self.risk_hist += np.histogram(r, RISK_BINS)[0]
+        self.amount_hist += np.histogram(a, AMOUNT_BINS)[0]
+        self.density += np.histogram2d(a, r, [AMOUNT_BINS, RISK_BINS])[0].astype(np.int64)
+        return self
+
+    # --- Reads ---
+    def summary(self, name):
+        """A rollup with derived averages, e.g. summary('merchant')['avg_risk']."""
+        table = self.tables.get(name, pd.DataFrame(columns=MEASURES)).sort_index()
+        table['avg_risk'] = table['risk_sum'] / table['count']
+        table['avg_amount'] = table['amount_sum'] / table['count']
+        return table
+
+    def totals(self):
+        """Whole-dataset totals (from the smallest rollup, so O(groups))."""
+        table = min(self.tables.values(), key=len) if self.tables else pd.DataFrame(columns=MEASURES)
+        totals = table[MEASURES].sum()
+        count = totals['count']
+        return {
+            'count': int(count),
+            'high_alerts': int(totals['high_alerts']),
+            'fraud': int(totals['fraud']),
+            'avg_risk': float(totals['risk_sum'] / count) if count else 0.0,
+        }
+
+    def histogram(self, kind):
+        """Histogram as a DataFrame with bin edges and counts ('risk' or 'amount')."""
+        edges, counts = (RISK_BINS, self.risk_hist) if kind == 'risk' else (AMOUNT_BINS, self.amount_hist)
+        return pd.DataFrame({'bin_left': edges[:-1], 'bin_right': edges[1:], 'count': counts})
+
+    def density_frame(self):
+        """Amount x risk 2-D histogram in long format (non-empty cells only), for heatmaps."""
+        a_idx, r_idx = np.nonzero(self.density)
+        return pd.DataFrame({
+            'amount_left': AMOUNT_BINS[a_idx], 'amount_right': AMOUNT_BINS[a_idx + 1],
+            'risk_left': RISK_BINS[r_idx], 'risk_right': RISK_BINS[r_idx + 1],
+            'count': self.density[a_idx, r_idx],
+        })
+
+    # --- Persistence ---
+    def save(self):
+        """Writes every rollup as a small Parquet file (each written atomically)."""
+        os.makedirs(self.directory, exist_ok=True)
+        frames = {f'by_{name}': table.rename_axis('key').reset_index() for name, table in self.tables.items()}
+        frames['histograms'] = pd.concat(
+            [self.histogram(kind).assign(kind=kind) for kind in ('risk', 'amount')], ignore_index=True)
+        frames['density'] = self.density_frame()
+        for name, frame in frames.items():
+            path = os.path.join(self.directory, f'{name}.parquet')
+            frame.to_parquet(f'{path}.tmp', index=False)
+            os.replace(f'{path}.tmp', path)
+        return self.directory
+
+    @classmethod
+    def load(cls, directory='rollups', **kwargs):
+        """Restores a store saved with save()."""
+        store = cls(directory, **kwargs)
+        for name in ROLLUP_DIMENSIONS:
+            path = os.path.join(directory, f'by_{name}.parquet')
+            if os.path.exists(path):
+                store.tables[name] = pd.read_parquet(path).set_index('key').rename_axis(None)
+
+        path = os.path.join(directory, 'histograms.parquet')
+        if os.path.exists(path):
+            hist = pd.read_parquet(path)
+            store.risk_hist = hist.loc[hist['kind'] == 'risk', 'count'].to_numpy(np.int64)
+            store.amount_hist = hist.loc[hist['kind'] == 'amount', 'count'].to_numpy(np.int64)
+
+        path = os.path.join(directory, 'density.parquet')
+        if os.path.exists(path):
+            cells = pd.read_parquet(path)
+            a_idx = np.searchsorted(AMOUNT_BINS, cells['amount_left'].to_numpy())
+            r_idx = np.searchsorted(RISK_BINS, cells['risk_left'].to_numpy())
+            store.density[a_idx, r_idx] = cells['count'].to_numpy()
+        return store
+
+
+def downsample_for_plot(df, max_points=2000, keep=None, seed=42):
+    """
+    At most max_points rows for a scatter plot: rows flagged by `keep` (e.g.
+    high-priority alerts) are kept first, and the rest is a seeded random
+    sample, so the plot costs the same however many transactions there are.
+    """
+    if len(df) <= max_points:
+        return df
+    keep = np.zeros(len(df), dtype=bool) if keep is None else np.asarray(keep, dtype=bool)
+    rng = np.random.default_rng(seed)
+    kept = np.flatnonzero(keep)
+    if len(kept) >= max_points:
+        return df.iloc[np.sort(rng.choice(kept, max_points, replace=False))]
+    rest = rng.choice(np.flatnonzero(~keep), max_points - len(kept), replace=False)
+    return df.iloc[np.sort(np.concatenate([kept, rest]))]
+
+
+# --- Local Testing ---
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    n = 10_000
+    scored = pd.DataFrame({
+        'Merchant Group': rng.choice(['Retail', 'Travel', 'Gaming'], n),
+        'Country of Transaction': rng.choice(['UK', 'USA', 'India'], n),
+        'Bank': rng.choice(['Barclays', 'HSBC'], n),
+        'Time': rng.integers(0, 24, n),
+        'Date': rng.choice(['13-Oct-20', '14-Oct-20'], n),
+        'Amount_Num': rng.lognormal(4, 1, n).round(),
+        'risk_score': rng.choice([0, 40, 60, 100], n, p=[0.85, 0.05, 0.08, 0.02]),
+        'Fraud': rng.integers(0, 2, n),
+    })
+    scored['priority'] = np.where(scored['risk_score'] > 39, 'High', 'Low')
+
+    # Two batches folded in incrementally give the same rollup as one big batch
+    store = RollupStore(directory='rollups_demo')
+    store.update(scored.iloc[:4000]).update(scored.iloc[4000:])
+    full = RollupStore().update(scored)
+    same = np.allclose(store.summary('merchant').sort_index()[MEASURES].to_numpy(dtype=float),
+                       full.summary('merchant').sort_index()[MEASURES].to_numpy(dtype=float))
+
+    print("Part 7 Extension - Rollups:")
+    print(store.summary('merchant')[['count', 'high_alerts', 'avg_risk']])
+    print(f"Totals: {store.totals()} | Incremental == full: {same}")
+
+    store.save()
+    reloaded = RollupStore.load('rollups_demo')
+    print(f"Reloaded totals match: {reloaded.totals() == store.totals()}")
+    import shutil
+    shutil.rmtree('rollups_demo')
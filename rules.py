@@ -0,0 +1,205 @@
+#Part 3 (Extension)
+# Rule-Based Pre-Filter
+# rules.py (Declarative YAML/JSON rules compiled to vectorized predicates that settle clear cases before the ML model).
+#==============================================================================================
+#
+# A rules file is an ordered list; the first rule a transaction matches
+# decides it, and transactions no rule matches go on to the Isolation Forest.
+#
+#   rules:
+#     - name: high_value
+#       action: flag                  # flag = anomaly, clear = normal
+#       when: {column: Amount_Num, op: '>', value: 5000}
+#     - name: domestic
+#       action: clear
+#       when:
+#         all:                        # also: any, not
+#           - {column: Country of Transaction, op: '==', other: Country of Residence}
+#           - {column: Time, op: between, value: [6, 23]}
+#
+# Ops: < <= > >= == != in, not in, between, missing. `value` compares with a
+# constant, `other` with another column. A missing value never matches a
+# comparison, so incomplete rows are left to the model; likewise `not` only
+# matches rows where every column it refers to is present.
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+ACTIONS = {'clear': 0, 'flag': 1}
+
+# Decision code of transactions no rule matched
+UNDECIDED = -1
+
+RULES_VERSION = 1
+
+_NUMERIC_OPS = {'<': np.less, '<=': np.less_equal, '>': np.greater, '>=': np.greater_equal}
+
+
+def _numeric(series):
+    return series.to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def _categories(series):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.categories
+    return pd.Index(pd.unique(series.dropna()))
+
+
+def _paired_codes(left, right):
+    """Codes of two columns over one shared category list (-1 = missing), so they compare as integers."""
+    dtype = pd.CategoricalDtype(_categories(left).union(_categories(right)))
+    return left.astype(dtype).cat.codes.to_numpy(), right.astype(dtype).cat.codes.to_numpy()
+
+
+def _compile_leaf(spec):
+    column, op = spec['column'], spec['op']
+    if op == 'missing':
+        return lambda df: df[column].isna().to_numpy()
+
+    if 'other' in spec:
+        other = spec['other']
+        if op in ('==', '!='):
+            def column_equality(df):
+                left, right = _paired_codes(df[column], df[other])
+                equal = left == right if op == '==' else left != right
+                return equal & (left >= 0) & (right >= 0)
+            return column_equality
+        if op in _NUMERIC_OPS:
+            return lambda df: _NUMERIC_OPS[op](_numeric(df[column]), _numeric(df[other]))
+        raise ValueError(f"Op {op!r} cannot compare two columns.")
+
+    value = spec.get('value')
+    if op in _NUMERIC_OPS:
+        return lambda df: _NUMERIC_OPS[op](_numeric(df[column]), float(value))
+    if op == 'between':
+        low, high = value
+        return lambda df: (lambda x: (x >= low) & (x <= high))(_numeric(df[column]))
+    if op in ('==', 'in'):
+        values = list(value) if op == 'in' else [value]
+        return lambda df: df[column].isin(values).to_numpy()
+    if op in ('!=', 'not in'):
+        values = list(value) if op == 'not in' else [value]
+        return lambda df: (df[column].notna() & ~df[column].isin(values)).to_numpy()
+    raise ValueError(f"Unknown op {op!r}.")
+
+
+def referenced_columns(spec):
+    """Every column a condition reads (`column` and `other` of its leaves)."""
+    for key in ('all', 'any'):
+        if key in spec:
+            return {col for part in spec[key] for col in referenced_columns(part)}
+    if 'not' in spec:
+        return referenced_columns(spec['not'])
+    return {spec['column'], *([spec['other']] if 'other' in spec else [])}
+
+
+def compile_condition(spec):
+    """Turns a condition (a leaf or an all/any/not combination) into a df -> bool array function."""
+    if 'all' in spec or 'any' in spec:
+        combine = np.logical_and if 'all' in spec else np.logical_or
+        parts = [compile_condition(part) for part in spec['all' if 'all' in spec else 'any']]
+        return lambda df: combine.reduce([part(df) for part in parts])
+    if 'not' in spec:
+        part = compile_condition(spec['not'])
+        columns = sorted(referenced_columns(spec['not']))
+        # Negating would turn "missing, so no match" into a match
+        return lambda df: ~part(df) & df[columns].notna().all(axis=1).to_numpy()
+    return _compile_leaf(spec)
+
+
+class RuleSet:
+    """
+    Part 3 Extension: Fast-path rules that settle trivially normal or
+    trivially suspicious transactions without the ML model.
+
+    evaluate() returns a decision per row (1 = flag, 0 = clear, -1 = left to
+    the model) and keeps per-rule hit counters across calls.
+    """
+
+    def __init__(self, rules):
+        self.rules = []
+        for rule in rules:
+            if rule.get('action') not in ACTIONS:
+                raise ValueError(f"Rule {rule.get('name')!r}: action must be one of {list(ACTIONS)}.")
+            try:
+                predicate = compile_condition(rule['when'])
+            except (KeyError, TypeError, ValueError) as exc:
+                raise ValueError(f"Rule {rule.get('name')!r}: invalid condition ({exc}).") from exc
+            self.rules.append({'name': rule['name'], 'action': rule['action'], 'predicate': predicate})
+        self.names = [rule['name'] for rule in self.rules]
+        self.reset_counters()
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('version', RULES_VERSION) != RULES_VERSION:
+            raise ValueError(f"Rules version {data.get('version')} is not supported (expected {RULES_VERSION}).")
+        return cls(data['rules'])
+
+    @classmethod
+    def load(cls, path):
+        """Reads a .yaml/.yml (needs PyYAML) or .json rules file."""
+        with open(path) as f:
+            if os.path.splitext(path)[1].lower() in ('.yaml', '.yml'):
+                import yaml
+                return cls.from_dict(yaml.safe_load(f))
+            return cls.from_dict(json.load(f))
+
+    def reset_counters(self):
+        self.hits = dict.fromkeys(self.names, 0)
+        self.rows_seen = 0
+        self.rows_undecided = 0
+
+    def evaluate(self, df):
+        """(decision, matched): per-row decision codes and the index of the deciding rule (-1 = none)."""
+        n = len(df)
+        decision = np.full(n, UNDECIDED, dtype=np.int8)
+        matched = np.full(n, -1, dtype=np.int16)
+        undecided = np.ones(n, dtype=bool)
+        for i, rule in enumerate(self.rules):
+            hit = rule['predicate'](df) & undecided
+            decision[hit] = ACTIONS[rule['action']]
+            matched[hit] = i
+            undecided &= ~hit
+            self.hits[rule['name']] += int(hit.sum())
+        self.rows_seen += n
+        self.rows_undecided += int(undecided.sum())
+        return decision, matched
+
+    def rule_names(self, matched):
+        """The deciding rule's name per row as a categorical (missing = left to the model)."""
+        return pd.Categorical.from_codes(matched, categories=self.names)
+
+    def counters(self):
+        """Hits per rule (plus the rows left to the model) since the last reset."""
+        rows = [{'rule': rule['name'], 'action': rule['action'], 'hits': self.hits[rule['name']]}
+                for rule in self.rules]
+        rows.append({'rule': '(model)', 'action': 'ml', 'hits': self.rows_undecided})
+        counters = pd.DataFrame(rows)
+        counters['hit_rate'] = counters['hits'] / max(self.rows_seen, 1)
+        return counters
+
+
+# --- Local Testing ---
+if __name__ == "__main__":
+    rules = RuleSet([
+        {'name': 'high_value', 'action': 'flag', 'when': {'column': 'Amount_Num', 'op': '>', 'value': 5000}},
+        {'name': 'foreign', 'action': 'flag',
+         'when': {'column': 'Country of Transaction', 'op': '!=', 'other': 'Country of Residence'}},
+        {'name': 'domestic_daytime', 'action': 'clear',
+         'when': {'all': [{'column': 'Shipping Address', 'op': '==', 'other': 'Country of Residence'},
+                          {'column': 'Time', 'op': 'between', 'value': [6, 23]}]}},
+    ])
+    df = pd.DataFrame({
+        'Amount_Num': [12.0, 9000.0, 40.0, 25.0, np.nan],
+        'Time': [14, 10, 3, 20, 12],
+        'Country of Transaction': ['United Kingdom', 'United Kingdom', 'United Kingdom', 'India', None],
+        'Shipping Address': ['United Kingdom', 'United Kingdom', 'United Kingdom', 'India', 'USA'],
+        'Country of Residence': ['United Kingdom'] * 4 + ['USA'],
+    })
+    decision, matched = rules.evaluate(df)
+    print("Part 3 Extension - Rule decisions:", decision.tolist())
+    print(f"Deciding rules: {list(rules.rule_names(matched))}")
+    print(rules.counters())
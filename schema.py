@@ -0,0 +1,174 @@
+#Part 1 (Extension)
+# Typed Transaction Schema
+# schema.py (Categorical vocabulary, numeric downcasting and the priority enum shared by every stage).
+#==============================================================================================
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from scoring_kernels import DEFAULT_PRIORITY, PRIORITY_LABELS
+
+# Explicit column types for CreditCardData.csv. Low-cardinality text columns
+# are read as categoricals so a frame holds small integer codes, not strings.
+TRANSACTION_DTYPES = {
+    'Transaction ID': str,
+    'Date': 'category',
+    'Day of Week': 'category',
+    'Time': 'int8',
+    'Type of Card': 'category',
+    'Entry Mode': 'category',
+    'Amount': str,
+    'Type of Transaction': 'category',
+    'Merchant Group': 'category',
+    'Country of Transaction': 'category',
+    'Shipping Address': 'category',
+    'Country of Residence': 'category',
+    'Gender': 'category',
+    'Age': 'float32',
+    'Bank': 'category',
+    'Fraud': 'int8',
+}
+
+CATEGORICAL_COLUMNS = [col for col, dtype in TRANSACTION_DTYPES.items() if dtype == 'category']
+
+# Part 4 priority levels as a 4-value categorical (1 byte per row instead of a
+# string); the category order matches the scoring_kernels band codes.
+PRIORITY_DTYPE = pd.CategoricalDtype(PRIORITY_LABELS + [DEFAULT_PRIORITY])
+
+VOCABULARY_VERSION = 1
+
+
+class Vocabulary:
+    """
+    Part 1 Extension: Stable category lists for the categorical columns.
+
+    Codes never change once assigned: values seen for the first time are
+    appended to the end of their column's list. A model trained on the codes
+    (e.g. Merchant_Enc) therefore sees the same number for the same merchant
+    in every later batch, and the vocabulary is saved next to the model.
+    """
+
+    def __init__(self, categories=None):
+        self.categories = {col: list(values) for col, values in (categories or {}).items()}
+
+    def update(self, df, columns=None):
+        """Appends unseen values (sorted, per column) without renumbering existing ones."""
+        for col in columns or CATEGORICAL_COLUMNS:
+            if col not in df:
+                continue
+            values = df[col].cat.categories if isinstance(df[col].dtype, pd.CategoricalDtype) \
+                else pd.unique(df[col].dropna())
+            known = self.categories.setdefault(col, [])
+            seen = set(known)
+            known.extend(sorted(str(v) for v in values if str(v) not in seen))
+        return self
+
+    def apply(self, df, columns=None):
+        """
+        Converts the columns (in place) to categoricals over the vocabulary.
+        Values not in the vocabulary become missing; call update() first to keep them.
+        """
+        for col in columns or CATEGORICAL_COLUMNS:
+            if col not in df or col not in self.categories:
+                continue
+            dtype = pd.CategoricalDtype(self.categories[col])
+            series = df[col]
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                # Re-maps the small category table, not every row
+                series = series.cat.rename_categories(series.cat.categories.astype(str))
+                df[col] = series.cat.set_categories(dtype.categories)
+            else:
+                df[col] = series.astype(dtype)
+        return df
+
+    def codes(self, df, col, dtype=np.int16):
+        """Integer codes of a column under this vocabulary (-1 = missing/unknown)."""
+        series = df[col]
+        if not (isinstance(series.dtype, pd.CategoricalDtype)
+                and list(series.cat.categories) == self.categories[col]):
+            series = series.astype(pd.CategoricalDtype(self.categories[col]))
+        return series.cat.codes.to_numpy().astype(dtype, copy=False)
+
+    def to_dict(self):
+        return {'vocabulary_version': VOCABULARY_VERSION, 'categories': self.categories}
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('vocabulary_version') != VOCABULARY_VERSION:
+            raise ValueError(f"Vocabulary version {data.get('vocabulary_version')} is not supported "
+                             f"(expected {VOCABULARY_VERSION}).")
+        return cls(data['categories'])
+
+    def save(self, path):
+        """Writes the vocabulary as JSON (atomically)."""
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump(self.to_dict(), f, indent=1)
+        os.replace(f'{path}.tmp', path)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+
+def downcast(df, columns=None):
+    """
+    Shrinks numeric columns in place where it loses nothing: integers go to
+    the smallest integer type that holds their range, and float64 columns
+    become float32 only if every value survives the round trip exactly.
+    """
+    for col in columns if columns is not None else df.columns:
+        series = df[col]
+        if pd.api.types.is_bool_dtype(series) or not pd.api.types.is_numeric_dtype(series):
+            continue
+        if pd.api.types.is_integer_dtype(series):
+            df[col] = pd.to_numeric(series, downcast='integer')
+        elif series.dtype == np.float64:
+            values = series.to_numpy()
+            narrow = values.astype(np.float32)
+            if np.array_equal(narrow, values, equal_nan=True):
+                df[col] = narrow
+    return df
+
+
+def feature_matrix(df, columns, fill_value=None):
+    """
+    Model input as one C-contiguous float32 matrix, the dtype the Isolation
+    Forest works in, so sklearn uses it as-is instead of converting again.
+    """
+    X = np.empty((len(df), len(columns)), dtype=np.float32)
+    for j, col in enumerate(columns):
+        X[:, j] = df[col].to_numpy(dtype=np.float32, na_value=np.nan)
+    if fill_value is not None:
+        np.nan_to_num(X, copy=False, nan=fill_value)
+    return X
+
+
+def memory_mb(df):
+    """Resident size of a frame in MB, counting string/object payloads."""
+    return df.memory_usage(deep=True).sum() / 2**20
+
+
+# --- Local Testing ---
+if __name__ == "__main__":
+    batch_1 = pd.DataFrame({'Merchant Group': ['Retail', 'Travel', None, 'Retail'],
+                            'Bank': ['HSBC', 'Monzo', 'HSBC', 'RBS'],
+                            'Amount_Num': [12.0, 250.0, 31.0, 7.0],
+                            'Time': [9, 23, 14, 2]})
+    batch_2 = pd.DataFrame({'Merchant Group': ['Gaming', 'Travel'], 'Bank': ['RBS', 'HSBC'],
+                            'Amount_Num': [19.99, 5.0], 'Time': [1, 2]})
+
+    vocab = Vocabulary().update(batch_1)
+    vocab.update(batch_2)  # 'Gaming' is appended; Retail/Travel keep their codes
+    print("Part 1 Extension - Vocabulary:", vocab.categories)
+    print(f"Batch 2 merchant codes: {vocab.codes(batch_2, 'Merchant Group')}")
+
+    big = pd.concat([batch_1] * 250_000, ignore_index=True)
+    before = memory_mb(big)
+    downcast(vocab.apply(big))
+    print(f"\n1M-row typed frame: {before:.1f} MB -> {memory_mb(big):.1f} MB")
+    print(big.dtypes)
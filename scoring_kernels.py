@@ -0,0 +1,105 @@
+#Part 2 & 4 (Kernels)
+# Vectorized Scoring Kernels
+# scoring_kernels.py (NumPy array-in / array-out versions of the Z-Score, risk score and priority logic).
+#==============================================================================================
+
+import numpy as np
+
+# Priority bands used by AlertPrioritizer: (lower bound, exclusive) -> label
+PRIORITY_LABELS = ["🔴 CRITICAL", "🟠 HIGH", "🟡 MEDIUM"]
+PRIORITY_CUTOFFS = [80, 50, 25]
+DEFAULT_PRIORITY = "🟢 LOW"
+
+# High-value boost: transactions above this amount get extra risk points
+HIGH_VALUE_AMOUNT = 5000
+HIGH_VALUE_BOOST = 20
+
+# Points a weighted detector ensemble contributes when every detector is at
+# full strength (the high-value boost adds the rest of the 0-100 scale)
+ENSEMBLE_POINTS = 80
+
+_PRIORITY_TABLE = np.array(PRIORITY_LABELS + [DEFAULT_PRIORITY], dtype=object)
+
+
+def z_score_flags(values, threshold, mean=None, std=None):
+    """
+    Flags values whose absolute z-score exceeds threshold (1 = Anomaly, 0 = Normal).
+    mean/std can be passed in when they were computed elsewhere (e.g. a reference window).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if mean is None:
+        mean = np.mean(values)
+    if std is None:
+        std = np.std(values)
+
+    # Prevent division by zero if all values are identical
+    if std == 0:
+        return np.zeros(len(values), dtype=np.int64)
+
+    z_scores = (values - mean) / std
+    return (np.abs(z_scores) > threshold).astype(np.int64)
+
+
+def risk_score_components(anomaly_score, stat_anomaly, amount):
+    """
+    Computes the Part 4 risk score from raw arrays.
+    Returns (ml_component, stat_component, value_boost, final_risk_score).
+    """
+    anomaly_score = np.asarray(anomaly_score)
+    stat_anomaly = np.asarray(stat_anomaly)
+    amount = np.asarray(amount)
+
+    ml_component = (1 - anomaly_score) * 25
+    stat_component = stat_anomaly * 30
+    value_boost = np.where(amount > HIGH_VALUE_AMOUNT, HIGH_VALUE_BOOST, 0)
+
+    final_risk_score = np.clip(ml_component + stat_component + value_boost, 0, 100)
+    return ml_component, stat_component, value_boost, final_risk_score
+
+
+def ensemble_risk_components(risks, weights, amount):
+    """
+    Part 4 risk score from a weighted ensemble instead of the fixed ML/stat blend.
+    risks is an (n_rows, n_detectors) array of 0-1 alert strengths (NaN counts
+    as 0) and weights one weight per detector; they are normalized to sum to 1.
+    Returns (ensemble_component, value_boost, final_risk_score).
+    """
+    risks = np.nan_to_num(np.asarray(risks, dtype=np.float64).reshape(len(amount), -1))
+    weights = np.asarray(weights, dtype=np.float64)
+    if weights.sum() <= 0:
+        raise ValueError("Ensemble weights must sum to a positive number.")
+    amount = np.asarray(amount)
+
+    ensemble_component = risks @ (weights / weights.sum()) * ENSEMBLE_POINTS
+    value_boost = np.where(amount > HIGH_VALUE_AMOUNT, HIGH_VALUE_BOOST, 0)
+    final_risk_score = np.clip(ensemble_component + value_boost, 0, 100)
+    return ensemble_component, value_boost, final_risk_score
+
+
+def priority_codes(final_risk_score):
+    """
+    Maps risk scores to int8 band codes (0 = CRITICAL ... 3 = LOW), the index
+    into PRIORITY_LABELS + [DEFAULT_PRIORITY].
+    NaN scores fall through to LOW, matching the original if/else chain.
+    """
+    final_risk_score = np.asarray(final_risk_score)
+    conditions = [final_risk_score > cutoff for cutoff in PRIORITY_CUTOFFS]
+    return np.select(conditions, np.arange(len(PRIORITY_LABELS), dtype=np.int8),
+                     default=np.int8(len(PRIORITY_LABELS)))
+
+
+def priority_labels(final_risk_score):
+    """
+    Maps risk scores to priority label strings: the band codes from
+    priority_codes() index a lookup table of labels.
+    """
+    return _PRIORITY_TABLE[priority_codes(final_risk_score)]
+
+
+# --- Local Testing ---
+if __name__ == "__main__":
+    scores = np.array([95.0, 60.0, 30.0, 5.0, np.nan])
+    print("Kernels - Priority Labels:")
+    for score, label in zip(scores, priority_labels(scores)):
+        print(f"Score: {score:<5} | Priority: {label}")
+    print(f"Z-Score flags: {z_score_flags([100, 110, 95, 105, 10000, 102], 2.0)}")
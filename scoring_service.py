@@ -0,0 +1,268 @@
+#Part 2-4 (Service)
+# Real-Time Scoring Service
+# scoring_service.py (Local asyncio HTTP endpoint that micro-batches requests through Parts 2, 3 and 4).
+#==============================================================================================
+#
+# Usage: python scoring_service.py [--port 8765] [--max-batch 64] [--max-wait-ms 1.0]
+#        python scoring_service.py --model isolation_forest.joblib [--reference credit_card_trans.zip]
+#
+# Without --model a demo model is fitted on the Part 1 pipeline output; with
+# it, the saved detector is served as-is and requests carry the extract's
+# fields ("Merchant Group", "Time", ..., with the amount as "Amount_Num") and
+# the caller's velocity/geo features (feature_engineering.py); a field left
+# out takes its training median.
+#
+#   POST /score   body: one transaction object or a list of them
+#                 e.g. {"transaction_id": "TXN-1", "amount": 950.0, "velocity_score": 0.9, "geo_score": 0.8,
+#                       "type": "online"}
+#   GET  /health
+
+import argparse
+import asyncio
+import json
+
+import numpy as np
+import pandas as pd
+
+from ml_model import MLPatternDetector
+from scoring_kernels import priority_labels, risk_score_components, z_score_flags
+
+
+class ScoringEngine:
+    """
+    Scores raw transaction dicts with a fitted MLPatternDetector (Part 3), a
+    Z-Score against a reference window (Part 2) and the AlertPrioritizer
+    formula (Part 4), all on NumPy arrays so a small batch costs well under a millisecond.
+    """
+
+    def __init__(self, detector, amount_mean, amount_std, z_threshold=2.5, amount_field='amount'):
+        self.detector = detector
+        self.amount_mean = amount_mean
+        self.amount_std = amount_std
+        self.z_threshold = z_threshold
+        self.amount_field = amount_field
+        detector.compile()
+
+    @classmethod
+    def from_reference(cls, df, contamination=0.10, z_threshold=2.5, features=None, amount_field='amount',
+                       transformer=None):
+        """Fits the detector (and its FeatureTransformer, if given) and the Z-Score baseline on a reference window."""
+        detector = MLPatternDetector(contamination=contamination, features=features, transformer=transformer).fit(df)
+        amounts = df[amount_field]
+        return cls(detector, float(np.mean(amounts)), float(np.std(amounts)),
+                   z_threshold=z_threshold, amount_field=amount_field)
+
+    @classmethod
+    def from_model(cls, path, reference, z_threshold=2.5, amount_field='Amount_Num'):
+        """
+        Serves a model saved by main.py / cli.py train (its FeatureTransformer
+        and vocabulary included), with the Z-Score baseline taken from a
+        reference window in the same layout; nothing is refitted.
+        """
+        detector = MLPatternDetector.load(path)
+        amounts = reference[amount_field].to_numpy(dtype=np.float64, na_value=np.nan)
+        return cls(detector, float(np.nanmean(amounts)), float(np.nanstd(amounts)),
+                   z_threshold=z_threshold, amount_field=amount_field)
+
+    def score_batch(self, transactions):
+        """Scores a list of transaction dicts; returns one result dict per input."""
+        if not transactions:
+            return []
+        if self.detector.transformer is not None:
+            # Raw fields go through the model's fitted FeatureTransformer in one pass
+            X = self.detector.transform(pd.DataFrame.from_records(transactions))
+        else:
+            features = self.detector.features
+            # Missing fields become NaN, which the trees route like sklearn does
+            X = np.array([[txn.get(f, np.nan) for f in features] for txn in transactions], dtype=np.float64)
+        amounts = np.array([txn.get(self.amount_field, np.nan) for txn in transactions], dtype=np.float64)
+
+        ml_anomaly, anomaly_score = self.detector.score_array(X)
+        stat_anomaly = z_score_flags(amounts, self.z_threshold, mean=self.amount_mean, std=self.amount_std)
+        _, _, _, final_risk_score = risk_score_components(anomaly_score, stat_anomaly, amounts)
+        priority = priority_labels(final_risk_score)
+
+        return [
+            {
+                'transaction_id': txn.get('transaction_id'),
+                'anomaly_score': float(anomaly_score[i]),
+                'ml_anomaly': int(ml_anomaly[i]),
+                'stat_anomaly': int(stat_anomaly[i]),
+                'final_risk_score': float(final_risk_score[i]),
+                'priority_level': priority[i],
+            }
+            for i, txn in enumerate(transactions)
+        ]
+
+
+class MicroBatcher:
+    """
+    Collects concurrent requests for up to max_wait_ms (or max_batch
+    transactions) and scores them in one vectorized engine call.
+    """
+
+    def __init__(self, engine, max_batch=64, max_wait_ms=1.0):
+        self.engine = engine
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.queue = asyncio.Queue()
+        self.batches_scored = 0
+        self.transactions_scored = 0
+
+    async def submit(self, transactions):
+        """Queues transactions and waits for their results."""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((transactions, future))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = [await self.queue.get()]
+            size = len(pending[0][0])
+            deadline = loop.time() + self.max_wait
+            while size < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                pending.append(item)
+                size += len(item[0])
+
+            batch = [txn for transactions, _ in pending for txn in transactions]
+            try:
+                results = self.engine.score_batch(batch)
+            except Exception:
+                # A malformed request must not fail its neighbours: retry one by one
+                self._score_individually(pending)
+                continue
+
+            self.batches_scored += 1
+            self.transactions_scored += len(batch)
+            start = 0
+            for transactions, future in pending:
+                if not future.done():
+                    future.set_result(results[start:start + len(transactions)])
+                start += len(transactions)
+
+    def _score_individually(self, pending):
+        for transactions, future in pending:
+            if future.done():
+                continue
+            try:
+                future.set_result(self.engine.score_batch(transactions))
+                self.batches_scored += 1
+                self.transactions_scored += len(transactions)
+            except Exception as exc:
+                future.set_exception(exc)
+
+
+async def _read_request(reader):
+    """Minimal HTTP/1.1 request parser: returns (method, path, headers, body) or None on EOF."""
+    try:
+        head = await reader.readuntil(b'\r\n\r\n')
+    except (asyncio.IncompleteReadError, ConnectionError):
+        return None
+    lines = head.decode('latin-1').split('\r\n')
+    method, path, _ = lines[0].split(' ', 2)
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers.get('content-length', 0)))
+    return method, path, headers, body
+
+
+def _response(status, payload, keep_alive=True):
+    body = json.dumps(payload).encode()
+    head = (f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode() + body
+
+
+def make_handler(batcher):
+    async def handle(reader, writer):
+        try:
+            while True:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                keep_alive = headers.get('connection', '').lower() != 'close'
+
+                if method == 'GET' and path == '/health':
+                    writer.write(_response('200 OK', {
+                        'status': 'ok',
+                        'batches_scored': batcher.batches_scored,
+                        'transactions_scored': batcher.transactions_scored,
+                    }, keep_alive))
+                elif method == 'POST' and path == '/score':
+                    try:
+                        payload = json.loads(body)
+                        single = isinstance(payload, dict)
+                        results = await batcher.submit([payload] if single else payload)
+                        writer.write(_response('200 OK', results[0] if single else results, keep_alive))
+                    except (ValueError, TypeError, AttributeError) as exc:
+                        writer.write(_response('400 Bad Request', {'error': str(exc)}, keep_alive))
+                else:
+                    writer.write(_response('404 Not Found', {'error': f"No route for {method} {path}"}, keep_alive))
+
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+    return handle
+
+
+async def serve(engine, host='127.0.0.1', port=8765, max_batch=64, max_wait_ms=1.0):
+    """Runs the scoring service until cancelled."""
+    batcher = MicroBatcher(engine, max_batch=max_batch, max_wait_ms=max_wait_ms)
+    worker = asyncio.create_task(batcher.run())
+    server = await asyncio.start_server(make_handler(batcher), host, port)
+    print(f"🚀 Scoring service listening on http://{host}:{port} "
+          f"(max_batch={max_batch}, max_wait={max_wait_ms}ms)", flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        worker.cancel()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Real-time transaction scoring service")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--max-batch', type=int, default=64)
+    parser.add_argument('--max-wait-ms', type=float, default=1.0)
+    parser.add_argument('--model', help="saved model (e.g. isolation_forest.joblib) to serve instead of the demo model")
+    parser.add_argument('--reference', default='credit_card_trans.zip',
+                        help="extract whose 'Amount_Num' is the Z-Score baseline for --model")
+    args = parser.parse_args()
+
+    if args.model:
+        import main
+
+        # Requests carry the extract's fields, with the cleaned amount as 'Amount_Num'
+        reference = main.run_pipeline(args.reference)
+        if reference is None:
+            raise SystemExit(1)
+        engine = ScoringEngine.from_model(args.model, reference)
+    else:
+        from data_pipeline import run_data_pipeline
+        from feature_transformer import DEMO_SPEC, FeatureTransformer
+
+        # Reference window: the Part 1 pipeline output the dashboard also uses
+        engine = ScoringEngine.from_reference(run_data_pipeline(),
+                                              transformer=FeatureTransformer.from_spec(DEMO_SPEC))
+    try:
+        asyncio.run(serve(engine, args.host, args.port, args.max_batch, args.max_wait_ms))
+    except KeyboardInterrupt:
+        pass
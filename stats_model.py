@@ -6,6 +6,8 @@
 import pandas as pd
 import numpy as np
 
+from scoring_kernels import z_score_flags
+
 class StatisticalDetector:
     """
     Part 2: Statistical Anomaly Detection Algorithms
@@ -27,15 +29,20 @@ class StatisticalDetector:
         # Calculate standard deviation (variance from the average)
         std = np.std(data_series)
         
-        # Prevent division by zero if all values are identical
-        if std == 0: 
-            return [0] * len(data_series)
-        
-        # Calculate how many standard deviations each point is from the mean
-        z_scores = [(x - mean) / std for x in data_series]
-        
-        # Flag as 1 (Anomaly) if the absolute z-score is higher than our threshold
-        return [1 if abs(z) > self.z_threshold else 0 for z in z_scores]
+        # Calculate how many standard deviations each point is from the mean and
+        # flag as 1 (Anomaly) if the absolute z-score is higher than our threshold.
+        # Runs as one vectorized NumPy pass; returns an int array (0 if std == 0).
+        return z_score_flags(data_series, self.z_threshold, mean=mean, std=std)
+
+    def calculate_online_z_score(self, store, keys, values):
+        """
+        Streaming version of calculate_z_score using an OnlineStatsStore.
+        The batch is folded into each entity's running mean/std first (so, like
+        the batch Z-Score, it counts towards its own baseline) and then scored.
+        """
+        store.update(keys, values)
+        z_scores = store.score(keys, values)
+        return (np.abs(z_scores) > self.z_threshold).astype(np.int64)
 
     def moving_average_check(self, df, window=5):
         """
@@ -0,0 +1,193 @@
+#Part 1 (Extension)
+# Synthetic Transaction Generator
+# synthetic_data.py (Seeded CreditCardData.csv-shaped data at any scale, with configurable fraud patterns).
+#==============================================================================================
+#
+# Usage:
+#   python synthetic_data.py 1000000 --output synthetic_1m.zip
+#   python synthetic_data.py 100000000 --output synthetic_100m.zip --fraud-rate 0.02
+#
+# The ZIP has the same layout as credit_card_trans.zip, so it can be passed
+# straight to main.py's run_pipeline / iter_pipeline_chunks.
+
+import argparse
+import io
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+CSV_NAME = 'CreditCardData.csv'
+
+# Category frequencies taken from the sample extract
+CARD_TYPES = {'Visa': 0.54, 'MasterCard': 0.46}
+ENTRY_MODES = {'PIN': 0.50, 'CVC': 0.335, 'Tap': 0.165}
+TRANSACTION_TYPES = {'Online': 0.335, 'ATM': 0.333, 'POS': 0.332}
+MERCHANT_GROUPS = ['Children', 'Restaurant', 'Services', 'Gaming', 'Fashion', 'Subscription', 'Food',
+                   'Entertainment', 'Products', 'Electronics']
+COUNTRIES = ['United Kingdom', 'USA', 'Russia', 'China', 'India']
+RESIDENCE = {'United Kingdom': 0.82, 'Russia': 0.045, 'USA': 0.045, 'China': 0.045, 'India': 0.045}
+BANKS = {'Barclays': 0.3, 'Monzo': 0.1, 'RBS': 0.1, 'Metro': 0.1, 'Barlcays': 0.1, 'Halifax': 0.1,
+         'Lloyds': 0.1, 'HSBC': 0.1}
+
+# How a fraudulent row differs from a normal one. Each fraud row gets one
+# pattern, picked with these default weights (override with `patterns=`).
+FRAUD_PATTERNS = {
+    'night_online': 0.35,      # card-not-present purchase between midnight and 5am
+    'foreign_shipping': 0.30,  # bought and shipped abroad, away from the country of residence
+    'card_testing': 0.20,      # small probing amounts (£5-£15)
+    'high_value': 0.15,        # amounts far above the normal £5-£400 range
+}
+
+# Fraction of rows with a blank Amount / Merchant Group / Shipping Address / Gender, as in the extract
+DEFAULT_MISSING_RATE = 1e-4
+
+
+def _choice(rng, options, n):
+    """Draws n values from a list (uniform) or a {value: probability} dict."""
+    if isinstance(options, dict):
+        values, p = list(options), np.array(list(options.values()))
+        return np.asarray(values, dtype=object)[rng.choice(len(values), n, p=p / p.sum())]
+    return np.asarray(options, dtype=object)[rng.integers(0, len(options), n)]
+
+
+def _apply_fraud_patterns(rng, frame, fraud, patterns):
+    """Rewrites the fraud rows of a chunk (in place) according to the pattern weights."""
+    rows = np.flatnonzero(fraud)
+    if len(rows) == 0:
+        return
+    names = list(patterns)
+    unknown = set(names) - set(FRAUD_PATTERNS)
+    if unknown:
+        raise ValueError(f"Unknown fraud patterns: {sorted(unknown)} (choose from {sorted(FRAUD_PATTERNS)})")
+    weights = np.array([patterns[name] for name in names], dtype=float)
+    assigned = np.asarray(names, dtype=object)[rng.choice(len(names), len(rows), p=weights / weights.sum())]
+
+    for name in names:
+        idx = rows[assigned == name]
+        if len(idx) == 0:
+            continue
+        if name == 'night_online':
+            frame['Time'][idx] = rng.integers(0, 6, len(idx))
+            frame['Type of Transaction'][idx] = 'Online'
+            frame['Entry Mode'][idx] = 'CVC'
+        elif name == 'foreign_shipping':
+            foreign = _choice(rng, COUNTRIES[1:], len(idx))
+            frame['Country of Transaction'][idx] = foreign
+            frame['Shipping Address'][idx] = foreign
+            frame['Country of Residence'][idx] = 'United Kingdom'
+        elif name == 'card_testing':
+            frame['amount'][idx] = rng.integers(5, 16, len(idx))
+        elif name == 'high_value':
+            frame['amount'][idx] = rng.integers(1000, 10000, len(idx))
+
+
+def iter_synthetic_chunks(n_rows, seed=42, chunksize=1_000_000, fraud_rate=0.072, patterns=None,
+                          missing_rate=DEFAULT_MISSING_RATE, start_date='2020-10-13', days=2):
+    """
+    Yields DataFrames with the CreditCardData.csv columns, chunksize rows at a time.
+
+    Every chunk has its own generator seeded from (seed, chunk number), so the
+    output is identical for a given seed and chunksize however the chunks are
+    consumed, and memory stays bounded by chunksize even at 10^8 rows.
+    """
+    patterns = FRAUD_PATTERNS if patterns is None else patterns
+    day_values = pd.date_range(start_date, periods=days, freq='D')
+    dates = np.asarray(day_values.strftime('%d-%b-%y'), dtype=object)
+    weekdays = np.asarray(day_values.day_name(), dtype=object)
+
+    for chunk_no, start in enumerate(range(0, n_rows, chunksize)):
+        rng = np.random.default_rng([seed, chunk_no])
+        n = min(chunksize, n_rows - start)
+
+        residence = _choice(rng, RESIDENCE, n)
+        # Most people buy and ship at home; the rest are spread over the other countries
+        abroad = rng.random(n) < 0.12
+        transaction_country = np.where(abroad, _choice(rng, COUNTRIES, n), residence)
+        shipping = np.where(rng.random(n) < 0.25, _choice(rng, COUNTRIES, n), transaction_country)
+
+        frame = {
+            'Time': rng.integers(0, 25, n),
+            'Type of Card': _choice(rng, CARD_TYPES, n),
+            'Entry Mode': _choice(rng, ENTRY_MODES, n),
+            # Long-tailed like the extract: median ~£30, capped at £400
+            'amount': np.clip(rng.lognormal(3.6, 1.1, n), 5, 400).round(),
+            'Type of Transaction': _choice(rng, TRANSACTION_TYPES, n),
+            'Merchant Group': _choice(rng, MERCHANT_GROUPS, n),
+            'Country of Transaction': transaction_country,
+            'Shipping Address': shipping,
+            'Country of Residence': residence,
+            'Gender': _choice(rng, ['M', 'F'], n),
+            'Age': np.clip(rng.normal(45, 10, n), 15, 86).round(1),
+            'Bank': _choice(rng, BANKS, n),
+        }
+        fraud = rng.random(n) < fraud_rate
+        _apply_fraud_patterns(rng, frame, fraud, patterns)
+
+        day = rng.integers(0, days, n)
+        ids = np.arange(start, start + n) + 2_000_000
+        transaction_ids = ('#' + pd.Series(ids // 1000).astype(str) + ' '
+                           + pd.Series(ids % 1000).astype(str).str.zfill(3))
+        df = pd.DataFrame({
+            'Transaction ID': transaction_ids.to_numpy(),
+            'Date': dates[day],
+            'Day of Week': weekdays[day],
+            'Time': frame['Time'],
+            'Type of Card': frame['Type of Card'],
+            'Entry Mode': frame['Entry Mode'],
+            'Amount': ('£' + pd.Series(frame['amount'].astype(np.int64)).astype(str)).to_numpy(),
+            'Type of Transaction': frame['Type of Transaction'],
+            'Merchant Group': frame['Merchant Group'],
+            'Country of Transaction': frame['Country of Transaction'],
+            'Shipping Address': frame['Shipping Address'],
+            'Country of Residence': frame['Country of Residence'],
+            'Gender': frame['Gender'],
+            'Age': frame['Age'],
+            'Bank': frame['Bank'],
+            'Fraud': fraud.astype(np.int64),
+        }, index=pd.RangeIndex(start, start + n))
+
+        if missing_rate:
+            for col in ('Amount', 'Merchant Group', 'Shipping Address', 'Gender'):
+                df.loc[rng.random(n) < missing_rate, col] = np.nan
+        yield df
+
+
+def generate_transactions(n_rows, **kwargs):
+    """The whole synthetic dataset as one DataFrame (see iter_synthetic_chunks for the options)."""
+    return pd.concat(iter_synthetic_chunks(n_rows, **kwargs))
+
+
+def write_synthetic_zip(path, n_rows, **kwargs):
+    """
+    Streams a synthetic CreditCardData.csv into a ZIP laid out like
+    credit_card_trans.zip, one chunk at a time.
+    """
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=1) as z:
+        with z.open(CSV_NAME, 'w', force_zip64=True) as raw:
+            out = io.TextIOWrapper(raw, encoding='utf-8', newline='')
+            for i, chunk in enumerate(iter_synthetic_chunks(n_rows, **kwargs)):
+                chunk.to_csv(out, header=i == 0, index=False)
+            out.flush()
+            out.detach()
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic CreditCardData.csv transactions")
+    parser.add_argument('n_rows', type=int)
+    parser.add_argument('--output', default='synthetic_transactions.zip')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--chunksize', type=int, default=1_000_000)
+    parser.add_argument('--fraud-rate', type=float, default=0.072)
+    parser.add_argument('--pattern', action='append', metavar='NAME=WEIGHT',
+                        help=f"fraud pattern weight, repeatable (patterns: {', '.join(FRAUD_PATTERNS)})")
+    args = parser.parse_args()
+
+    patterns = None
+    if args.pattern:
+        patterns = {name: float(weight) for name, weight in (p.split('=', 1) for p in args.pattern)}
+
+    write_synthetic_zip(args.output, args.n_rows, seed=args.seed, chunksize=args.chunksize,
+                        fraud_rate=args.fraud_rate, patterns=patterns)
+    print(f"Wrote {args.n_rows:,} synthetic transactions to {args.output}")
@@ -4,15 +4,126 @@
 #==============================================================================================
 
 
+import json
+import os
+import threading
+
 import pandas as pd
 
+# Time bucket of a resolution, as a prefix of its ISO timestamp
+WINDOW_KEY_LENGTH = {'month': 7, 'day': 10, 'hour': 13}
+
+FEEDBACK_VERSION = 2
+
+
+class FeedbackMetrics:
+    """
+    Part 6 Extension: Running alert / true positive / false positive counts
+    per (time window, priority tier, model version).
+
+    Register record() as a CaseManager listener and every resolution updates
+    one counter triple in O(1), so the FPR reflects the whole case history
+    without rescanning it. Re-resolving a case moves its count from the old
+    resolution to the new one in the window it was first counted in, so a
+    window's counts only ever describe the cases counted there.
+    """
+
+    def __init__(self, window='day'):
+        if window not in WINDOW_KEY_LENGTH:
+            raise ValueError(f"window must be one of {list(WINDOW_KEY_LENGTH)}.")
+        self.window = window
+        # (window, priority, model_version) -> [alerts, true_positives, false_positives]
+        self.counts = {}
+        # case_id -> the counts key its resolution was counted under
+        self.counted_in = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _increments(resolution):
+        return 1, int(resolution == 'Confirmed Fraud'), int(resolution == 'False Positive')
+
+    def record(self, event):
+        """Folds one resolution event (see CaseManager.add_listener) into the counts."""
+        key = (event['timestamp'][:WINDOW_KEY_LENGTH[self.window]], event.get('priority'),
+               event.get('model_version'))
+        total, tp, fp = self._increments(event['resolution'])
+        with self._lock:
+            if event.get('previous_resolution') is not None:
+                # Already counted once: swap the old outcome for the new one where it was counted
+                key = self.counted_in.get(event.get('case_id'), key)
+                old = self._increments(event['previous_resolution'])
+                total, tp, fp = total - old[0], tp - old[1], fp - old[2]
+            elif event.get('case_id') is not None:
+                self.counted_in[event['case_id']] = key
+            counts = self.counts.setdefault(key, [0, 0, 0])
+            counts[0] += total
+            counts[1] += tp
+            counts[2] += fp
+
+    @classmethod
+    def from_case_history(cls, manager, window='day'):
+        """Rebuilds the counts by replaying a CaseManager's resolution events once."""
+        metrics = cls(window)
+        last_resolution = {}
+        for event in manager.resolution_events().to_dict('records'):
+            event['previous_resolution'] = last_resolution.get(event['case_id'])
+            last_resolution[event['case_id']] = event['resolution']
+            metrics.record(event)
+        return metrics
+
+    def frame(self):
+        """The counts as a DataFrame, one row per window / priority / model version."""
+        with self._lock:
+            rows = [(*key, *counts) for key, counts in self.counts.items()]
+        return pd.DataFrame(rows, columns=['window', 'priority', 'model_version', 'total_alerts',
+                                           'true_positives', 'false_positives'])
+
+    def totals(self, priority=None, model_version=None, since=None):
+        """Summed counts, optionally for one priority tier / model version / windows from `since` on."""
+        totals = {'total_alerts': 0, 'true_positives': 0, 'false_positives': 0}
+        with self._lock:
+            for (window, tier, version), (total, tp, fp) in self.counts.items():
+                if ((priority is None or tier == priority) and (model_version is None or version == model_version)
+                        and (since is None or window >= since[:len(window)])):
+                    totals['total_alerts'] += total
+                    totals['true_positives'] += tp
+                    totals['false_positives'] += fp
+        return totals
+
+    # --- Persistence ---
+    def save(self, path):
+        """Writes the counts as JSON (atomically)."""
+        with self._lock:
+            data = {'feedback_version': FEEDBACK_VERSION, 'window': self.window,
+                    'counts': [[*key, *counts] for key, counts in self.counts.items()],
+                    'counted_in': [[case_id, *key] for case_id, key in self.counted_in.items()]}
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump(data, f)
+        os.replace(f'{path}.tmp', path)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        if data.get('feedback_version') != FEEDBACK_VERSION:
+            raise ValueError(f"Feedback metrics version {data.get('feedback_version')} is not supported "
+                             f"(expected {FEEDBACK_VERSION}).")
+        metrics = cls(data['window'])
+        metrics.counts = {tuple(row[:3]): list(row[3:]) for row in data['counts']}
+        metrics.counted_in = {row[0]: tuple(row[1:]) for row in data['counted_in']}
+        return metrics
+
+
 class ModelTuner:
     """
     Part 6: False Positive Tracking and Model Tuning
     Analyzes analyst decisions to optimize the detection engine's accuracy.
     """
 
-    def __init__(self):
+    def __init__(self, feedback=None):
+        # Running counts over the case history (see track_feedback)
+        self.feedback = feedback
         # Dictionary to store performance metrics
         self.performance_metrics = {
             'total_alerts': 0,
@@ -41,6 +152,17 @@ class ModelTuner:
             
         return fpr
 
+    def track_feedback(self, priority=None, model_version=None, since=None):
+        """
+        Same FPR as track_accuracy, but from the running FeedbackMetrics
+        counts (optionally one priority tier / model version / period) instead
+        of a Series of resolutions.
+        """
+        self.performance_metrics = self.feedback.totals(priority, model_version, since)
+        if self.performance_metrics['total_alerts'] > 0:
+            return (self.performance_metrics['false_positives'] / self.performance_metrics['total_alerts']) * 100
+        return 0
+
     def suggest_tuning(self, current_contamination, fpr):
         """
         Recommends a new 'contamination' setting for the ML model in Part 3.
@@ -66,6 +188,21 @@ class ModelTuner:
             
         return suggested_setting, reason
 
+    def suggest_from_calibration(self, calibrator, max_fpr=20):
+        """
+        Jumps straight to the highest contamination whose share of false alerts
+        (the FPR above, in %) stays within max_fpr, using a ThresholdCalibrator's
+        curve instead of nudging by 1% per review round.
+        """
+        curve = calibrator.curve().dropna(subset=['precision'])
+        if curve.empty:
+            return None, "No labelled alerts yet. Resolve some cases to calibrate the threshold."
+
+        within = curve.index[(1 - curve['precision']) * 100 <= max_fpr]
+        if len(within) == 0:
+            return float(curve.index.min()), "Even the strictest threshold exceeds the FPR target. Using the minimum."
+        return float(within.max()), f"Highest sensitivity with at most {max_fpr}% false alerts."
+
 # --- Local Testing ---
 if __name__ == "__main__":
     # Mock data: Analyst reviewed 10 alerts, 4 were False Positives (40% FPR)